@@ -0,0 +1,136 @@
+import copy
+import json
+import threading
+import time
+
+# Cache local das listagens pedidas ao servidor (lojas, produtos, nomes, categorias, ...).
+# Cada entrada guarda o resultado e a 'versao' devolvida pelo servidor:
+#  - até ao fim do TTL do comando, o resultado é usado sem contactar o servidor;
+#  - depois, durante JANELA_DESATUALIZADA_SEGUNDOS, ainda é usado, mas é pedida uma
+#    atualização em segundo plano (stale-while-revalidate);
+#  - fora disso, ou depois de uma invalidação, o pedido vai ao servidor com a
+#    'versao_conhecida', e a resposta pode ser apenas "não modificado".
+class CacheCliente:
+    # Segundos durante os quais uma listagem é usada sem perguntar ao servidor
+    TTL_POR_COMANDO = {
+        'listar_lojas': 60,
+        'list_products': 15,
+        'listar_produtos': 15,
+        'listar_nomes_produtos': 60,
+        'listar_categorias': 60,
+        'listar_descricoes': 60,
+        'sugerir_nomes_produtos': 30,
+        'sugerir_categorias': 30,
+        'sugerir_descricoes': 30
+    }
+    JANELA_DESATUALIZADA_SEGUNDOS = 300
+
+    # Comando que altera dados -> listagens que deixam de ser válidas quando o próprio cliente o executa
+    _PRODUTOS = (
+        'list_products', 'listar_produtos', 'listar_nomes_produtos', 'listar_categorias', 'listar_descricoes',
+        'sugerir_nomes_produtos', 'sugerir_categorias', 'sugerir_descricoes'
+    )
+    INVALIDACOES = {
+        'criar_loja': ('listar_lojas',),
+        'editar_loja': ('listar_lojas', 'list_products', 'listar_produtos'),
+        'apagar_loja': ('listar_lojas', 'list_products', 'listar_produtos'),
+        'adicionar_produto': _PRODUTOS,
+        'add_product': _PRODUTOS,
+        'editar_produto': _PRODUTOS,
+        'apagar_produto': _PRODUTOS,
+        'deletar_produto': _PRODUTOS,
+        'realizar_encomenda': ('list_products', 'listar_produtos'),  # O stock mudou
+        'carrinho_adicionar': ('list_products', 'listar_produtos'),  # Stock reservado
+        'carrinho_remover': ('list_products', 'listar_produtos')
+    }
+
+    CREDENCIAIS = ('token_sessao', 'username', 'password', 'versao_conhecida')
+
+    def __init__(self, maximo_entradas=100):
+        self.maximo_entradas = maximo_entradas
+        self._entradas = {}  # chave -> {'acao', 'versao', 'resultado', 'valido_ate'}
+        self._a_revalidar = set()  # chaves com uma atualização em segundo plano em curso
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(acao, parametros, utilizador=None):
+        # As credenciais não fazem parte da chave (a mesma listagem pedida com outro token é igual),
+        # mas o utilizador sim: as listagens dependem do cargo de quem as pede
+        parametros_pedido = {}
+        for nome, valor in (parametros or {}).items():
+            if nome not in CacheCliente.CREDENCIAIS:
+                parametros_pedido[nome] = valor
+        return json.dumps(utilizador) + ' ' + acao + ' ' + json.dumps(parametros_pedido, sort_keys=True, default=str)
+
+    def versao_conhecida(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            return entrada['versao']
+
+    def obter(self, chave):
+        # Devolve (resultado, precisa_revalidar) ou None se o pedido tem de ir ao servidor
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada['valido_ate'] is None:
+                return None
+
+            agora = time.monotonic()
+            if agora < entrada['valido_ate']:
+                return copy.deepcopy(entrada['resultado']), False
+            if agora < entrada['valido_ate'] + CacheCliente.JANELA_DESATUALIZADA_SEGUNDOS:
+                return copy.deepcopy(entrada['resultado']), True
+            return None
+
+    def resultado_conhecido(self, chave):
+        # Resultado guardado, mesmo expirado: usado quando o servidor responde "não modificado"
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            self._renovar(entrada)
+            return copy.deepcopy(entrada['resultado'])
+
+    def guardar(self, chave, acao, versao, resultado):
+        with self._lock:
+            entrada = {'acao': acao, 'versao': versao, 'resultado': copy.deepcopy(resultado), 'valido_ate': None}
+            self._renovar(entrada)
+            self._entradas.pop(chave, None)
+            self._entradas[chave] = entrada
+            while len(self._entradas) > self.maximo_entradas:
+                del self._entradas[next(iter(self._entradas))]
+
+    def _renovar(self, entrada):
+        ttl = CacheCliente.TTL_POR_COMANDO.get(entrada['acao'])
+        if ttl is None:
+            # Sem TTL (ex: listagens de utilizadores): só se guarda a versão para o pedido condicional
+            entrada['valido_ate'] = None
+        else:
+            entrada['valido_ate'] = time.monotonic() + ttl
+
+    def invalidar_por_comando(self, acao):
+        # Mantém a versão das entradas: o próximo pedido vai ao servidor, mas condicional
+        acoes_afetadas = CacheCliente.INVALIDACOES.get(acao)
+        if acoes_afetadas is None:
+            return
+        with self._lock:
+            for entrada in self._entradas.values():
+                if entrada['acao'] in acoes_afetadas:
+                    entrada['valido_ate'] = None
+
+    def iniciar_revalidacao(self, chave):
+        # True se quem chama deve fazer a atualização (evita duas atualizações da mesma chave)
+        with self._lock:
+            if chave in self._a_revalidar:
+                return False
+            self._a_revalidar.add(chave)
+            return True
+
+    def terminar_revalidacao(self, chave):
+        with self._lock:
+            self._a_revalidar.discard(chave)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
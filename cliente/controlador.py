@@ -1,3 +1,4 @@
+import secrets
 import consola
 from enums import Cores, Mensagem
 from cliente.interface_cliente import Interface
@@ -14,6 +15,9 @@ class ControladorGenerico:
             parametros_completos.update(parametros)
         return self.rede.enviar_comando(acao, parametros_completos)
 
+    def enviar_lote_com_token(self, comandos, transacao=False):
+        return self.rede.enviar_lote(comandos, self.sessao.obter_credenciais(), transacao)
+
     def executar_comando(self, nome_comando, parametros_predefinidos=None):
         info_comando = self.sessao.comandos_por_nome.get(nome_comando)
 
@@ -51,6 +55,7 @@ class ControladorAutenticacao:
     def __init__(self, rede, sessao):
         self.rede = rede
         self.sessao = sessao
+        self._ultima_ajuda = None  # (versao, comandos por nome) da última lista recebida
 
     def enviar_com_token(self, acao, parametros=None):
         parametros_completos = self.sessao.obter_credenciais()
@@ -61,10 +66,12 @@ class ControladorAutenticacao:
     def _carregar_comandos_disponiveis(self, token_sessao):
         # Após autenticação, pede ao servidor a lista de comandos disponíveis
         # para o utilizador autenticado e guarda-os na sessão.
-        resposta_help = self.rede.enviar_comando(
-            'help',
-            {'token_sessao': token_sessao}
-        )
+        parametros_help = {'token_sessao': token_sessao}
+        if self._ultima_ajuda is not None:
+            # O servidor responde 'nao_modificado' se a lista for a mesma que já temos
+            parametros_help['versao_conhecida'] = self._ultima_ajuda[0]
+
+        resposta_help = self.rede.enviar_comando('help', parametros_help)
 
         if resposta_help is None:
             consola.aviso("Não foi possível carregar comandos do servidor.")
@@ -75,6 +82,11 @@ class ControladorAutenticacao:
             return
 
         resultado = resposta_help.get('resultado', {})
+        if resultado.get('nao_modificado') is True and self._ultima_ajuda is not None:
+            self.sessao.definir_comandos_disponiveis(dict(self._ultima_ajuda[1]))
+            consola.info_adicional(f"Carregados {len(self._ultima_ajuda[1])} comandos disponíveis.")
+            return
+
         comandos_agrupados = resultado.get('comandos', {})
 
         comandos_por_nome = {}
@@ -86,6 +98,9 @@ class ControladorAutenticacao:
                 if nome_comando is not None and len(nome_comando) > 0:
                     comandos_por_nome[nome_comando] = informacao_comando
 
+        if resultado.get('versao') is not None:
+            self._ultima_ajuda = (resultado['versao'], dict(comandos_por_nome))
+
         self.sessao.definir_comandos_disponiveis(comandos_por_nome)
         consola.info_adicional(f"Carregados {len(comandos_por_nome)} comandos disponíveis.")
 
@@ -684,45 +699,88 @@ class ControladorLoja:
                 f"€{produto['preco']} (Stock: {produto['stock']})"
             )
 
-        # 4. Permitir adicionar múltiplos itens ao carrinho
-        itens = {}
-        
+        # 4. O carrinho fica no servidor: cada produto adicionado reserva logo o stock,
+        # por isso a falta de stock é detetada aqui e não só ao finalizar
+        self._mostrar_carrinho()
+
         while True:
             id_produto = consola.ler_texto(
-                "\nID do produto a adicionar (Enter para finalizar):",
+                "\nID do produto a adicionar, -ID para remover (Enter para finalizar):",
                 obrigatorio=False
             )
 
             if not id_produto or len(id_produto) == 0:
                 break
 
+            remover = id_produto.startswith('-')
+            id_produto = id_produto.lstrip('-')
+
             if not id_produto.isdigit():
                 consola.erro("ID inválido.")
                 continue
 
+            if remover:
+                resposta = self.controlador_generico.enviar_com_token(
+                    'carrinho_remover',
+                    {'id_produto': int(id_produto)}
+                )
+                if resposta is not None and resposta.get('ok') is True:
+                    consola.sucesso(f"Produto {id_produto} removido do carrinho.")
+                else:
+                    consola.erro(self._erro_resposta(resposta))
+                continue
+
             quantidade = consola.ler_texto("Quantidade:")
 
             if not quantidade or not quantidade.isdigit() or int(quantidade) <= 0:
                 consola.erro("Quantidade inválida.")
                 continue
 
-            itens[id_produto] = int(quantidade)
-            consola.sucesso(f"Produto {id_produto} adicionado com quantidade {quantidade}.")
+            resposta = self.controlador_generico.enviar_com_token(
+                'carrinho_adicionar',
+                {'id_produto': int(id_produto), 'quantidade': int(quantidade)}
+            )
+            if resposta is not None and resposta.get('ok') is True:
+                consola.sucesso(f"Produto {id_produto} reservado com quantidade {quantidade}.")
+            else:
+                consola.erro(self._erro_resposta(resposta))
 
-        if len(itens) == 0:
+        if self._mostrar_carrinho() == 0:
             consola.aviso("Nenhum produto foi adicionado.")
             return
 
-        # 5. Realizar encomenda
-        parametros = {
-            'itens': itens
-        }
+        if not consola.sim_ou_nao("Finalizar a encomenda?"):
+            consola.info("O carrinho fica guardado até as reservas expirarem.")
+            return
 
+        # 5. Finalizar. A chave de idempotência permite reenviar o pedido depois de
+        # perder a ligação sem arriscar uma encomenda em duplicado
         self.controlador_generico.executar_comando(
-            'realizar_encomenda',
-            parametros
+            'carrinho_finalizar',
+            {'chave_idempotencia': secrets.token_hex(16)}
         )
 
+    def _mostrar_carrinho(self):
+        # Mostra o carrinho guardado no servidor e devolve o número de produtos
+        resposta = self.controlador_generico.enviar_com_token('carrinho_ver')
+        if resposta is None or resposta.get('ok') is not True:
+            return 0
+
+        carrinho = resposta.get('resultado', [])
+        if len(carrinho) > 0:
+            consola.info("\nCarrinho:")
+            for item in carrinho:
+                consola.info(
+                    f"  {item['produto_id']}. {item['nome']} x{item['quantidade']} - "
+                    f"€{item['preco']} (reservado até {item['expira_em']})"
+                )
+        return len(carrinho)
+
+    def _erro_resposta(self, resposta):
+        if resposta is None:
+            return "Falha na comunicação com o servidor."
+        return resposta.get('erro', 'Erro desconhecido')
+
 
 class ControladorVendedor:
     def __init__(self, controlador_generico):
@@ -775,6 +833,33 @@ class ControladorVendedor:
             {'id_encomenda': pedido_id}
         )
 
+    def concluir_pedidos_em_lote(self):
+        Interface.mostrar_cabecalho("Concluir Pedidos em Lote")
+
+        ids_texto = consola.ler_texto(
+            "IDs dos pedidos separados por vírgulas (Enter para concluir por antiguidade):",
+            obrigatorio=False
+        )
+
+        if ids_texto:
+            ids_encomendas = []
+            for id_texto in ids_texto.split(','):
+                id_texto = id_texto.strip()
+                if not id_texto.isdigit():
+                    consola.erro(f"ID inválido: {id_texto}")
+                    return
+                ids_encomendas.append(int(id_texto))
+            parametros = {'ids_encomendas': ids_encomendas}
+        else:
+            horas = consola.ler_texto("Concluir os pedidos pendentes há mais de quantas horas?")
+            try:
+                parametros = {'mais_antigas_que_horas': float(horas)}
+            except (TypeError, ValueError):
+                consola.erro("Número de horas inválido.")
+                return
+
+        self.controlador_generico.executar_comando('concluir_encomendas_em_lote', parametros)
+
     def verificar_stock_baixo(self):
         self.controlador_generico.executar_comando('verificar_stock_baixo')
 
@@ -782,6 +867,7 @@ class ControladorVendedor:
         opcoes = [
             ("Listar Pedidos da Loja", self.listar_pedidos_loja),
             ("Concluir Pedido", self.concluir_pedido),
+            ("Concluir Pedidos em Lote", self.concluir_pedidos_em_lote),
             ("Verificar Stock Baixo", self.verificar_stock_baixo),
             (
                 "Concluir Encomenda Pendente",
@@ -816,15 +902,30 @@ class ControladorAdministracao:
     def __init__(self, controlador_generico):
         self.controlador_generico = controlador_generico
 
+    @staticmethod
+    def _lista_da_resposta(resposta):
+        if resposta is not None and resposta.get('ok') is True:
+            return resposta.get('resultado', [])
+        return []
+
     def adicionar_produto(self):
         Interface.mostrar_cabecalho("Novo Produto")
+
+        # Sugestões e lojas chegam todas num único pedido
+        respostas = self.controlador_generico.enviar_lote_com_token([
+            ('sugerir_nomes_produtos', {'limite': 10}),
+            ('sugerir_categorias', {'limite': 10}),
+            ('sugerir_descricoes', {'limite': 10}),
+            ('listar_lojas', None)
+        ])
         
         # Nome do produto com sugestões
         nome = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Nome do Produto",
-            "listar_nomes_produtos",
-            permitir_vazio=False
+            "sugerir_nomes_produtos",
+            permitir_vazio=False,
+            sugestoes=self._lista_da_resposta(respostas[0])
         )
         
         if not nome:
@@ -835,8 +936,9 @@ class ControladorAdministracao:
         categoria = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Categoria",
-            "listar_categorias",
-            permitir_vazio=False
+            "sugerir_categorias",
+            permitir_vazio=False,
+            sugestoes=self._lista_da_resposta(respostas[1])
         )
         
         if not categoria:
@@ -847,8 +949,9 @@ class ControladorAdministracao:
         descricao = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Descrição",
-            "listar_descricoes",
-            permitir_vazio=False
+            "sugerir_descricoes",
+            permitir_vazio=False,
+            sugestoes=self._lista_da_resposta(respostas[2])
         )
         
         if not descricao:
@@ -859,10 +962,7 @@ class ControladorAdministracao:
         stock = consola.ler_texto("Stock:")
         
         # Listar lojas para escolher
-        resposta_lojas = self.controlador_generico.rede.enviar_comando(
-            'listar_lojas',
-            self.controlador_generico.sessao.obter_credenciais()
-        )
+        resposta_lojas = respostas[3]
         
         if resposta_lojas is None or resposta_lojas.get('ok') is False:
             consola.erro("Erro ao carregar lojas.")
@@ -897,11 +997,19 @@ class ControladorAdministracao:
     def editar_produto(self):
         Interface.mostrar_cabecalho("Editar Produto")
         
-        # Listar produtos antes de pedir o ID
-        resposta_produtos = self.controlador_generico.rede.enviar_comando(
-            'list_products',
-            self.controlador_generico.sessao.obter_credenciais()
-        )
+        # Produtos, sugestões e lojas chegam todos num único pedido
+        comandos = [
+            ('list_products', None),
+            ('sugerir_nomes_produtos', {'limite': 10}),
+            ('sugerir_categorias', {'limite': 10}),
+            ('sugerir_descricoes', {'limite': 10})
+        ]
+        eh_admin = self.controlador_generico.sessao.cargo == 'admin'
+        if eh_admin:
+            comandos.append(('listar_lojas', None))
+
+        respostas = self.controlador_generico.enviar_lote_com_token(comandos)
+        resposta_produtos = respostas[0]
         
         if resposta_produtos is None or resposta_produtos.get('ok') is False:
             consola.erro("Erro ao listar produtos.")
@@ -934,8 +1042,9 @@ class ControladorAdministracao:
         novo_nome = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Nome do Produto",
-            "listar_nomes_produtos",
-            permitir_vazio=True
+            "sugerir_nomes_produtos",
+            permitir_vazio=True,
+            sugestoes=self._lista_da_resposta(respostas[1])
         )
         
         # Categoria com sugestões
@@ -943,8 +1052,9 @@ class ControladorAdministracao:
         nova_categoria = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Categoria",
-            "listar_categorias",
-            permitir_vazio=True
+            "sugerir_categorias",
+            permitir_vazio=True,
+            sugestoes=self._lista_da_resposta(respostas[2])
         )
         
         # Descrição com sugestões
@@ -952,8 +1062,9 @@ class ControladorAdministracao:
         nova_descricao = Interface.ler_com_sugestoes(
             self.controlador_generico.rede,
             "Descrição",
-            "listar_descricoes",
-            permitir_vazio=True
+            "sugerir_descricoes",
+            permitir_vazio=True,
+            sugestoes=self._lista_da_resposta(respostas[3])
         )
         
         novo_preco = consola.ler_texto("\nNovo Preço:", obrigatorio=False)
@@ -972,9 +1083,9 @@ class ControladorAdministracao:
         if nova_descricao:
             parametros['nova_descricao'] = nova_descricao
         
-        if self.controlador_generico.sessao.cargo == 'admin':
+        if eh_admin:
             # Listar lojas
-            resposta_lojas = self.controlador_generico.rede.enviar_comando('listar_lojas')
+            resposta_lojas = respostas[4]
             
             if resposta_lojas is not None and resposta_lojas.get('ok') is True:
                 lojas = resposta_lojas.get('resultado', [])
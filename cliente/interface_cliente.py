@@ -7,46 +7,63 @@ class Interface:
         consola.importante_destacado(f"\n{texto}")
 
     @staticmethod
-    def ler_com_sugestoes(rede, label, acao_listar, permitir_vazio=False):
-        # Procurar sugestões do servidor
-        resposta = rede.enviar_comando(acao_listar)
-        sugestoes = []
-        
-        if resposta is not None and resposta.get('ok') is True:
-            sugestoes = resposta.get('resultado', [])
-        
-        if len(sugestoes) > 0:
-            consola.info(f"\n{Cores.CIANO}Valores existentes de {label}:{Cores.NORMAL}")
-            # Mostrar apenas os primeiros 10
-            for i, sugestao in enumerate(sugestoes[:10], 1):
-                consola.info(f"  {i}. {sugestao}")
-            consola.aviso("\nDica: Digite o número para selecionar ou escreva um novo valor")
-        
+    def ler_com_sugestoes(rede, label, acao_sugerir, permitir_vazio=False, sugestoes=None):
+        # acao_sugerir é um dos comandos sugerir_* do servidor, que devolve apenas os valores
+        # começados pelo prefixo pedido (nunca a tabela inteira)
+        credenciais = {}
+        if rede.sessao is not None:
+            credenciais = rede.sessao.obter_credenciais()
+
+        def procurar(prefixo):
+            resposta = rede.enviar_comando(acao_sugerir, {**credenciais, 'prefixo': prefixo, 'limite': 10})
+            if resposta is not None and resposta.get('ok') is True:
+                return resposta.get('resultado', [])
+            return []
+
+        # Procurar sugestões do servidor (a não ser que já tenham sido obtidas, ex: num lote)
+        if sugestoes is None:
+            sugestoes = procurar('')
+
         if not permitir_vazio:
             prompt = f"\n{label}:"
         else:
             prompt = f"\n{label} (vazio para manter):"
-        
-        entrada = consola.ler_texto(prompt, obrigatorio=not permitir_vazio)
-        
-        # Se permitir vazio e entrada for vazia ou None, retorna None
-        if permitir_vazio and (entrada is None or len(entrada) == 0):
-            return None
-        
-        # Se entrada é None (cancelado), retorna None
-        if entrada is None:
-            return None
-        
-        # Se for número, tentar selecionar da lista
-        if entrada.isdigit():
-            indice = int(entrada) - 1
-            if 0 <= indice < len(sugestoes):
-                valor_selecionado = sugestoes[indice]
-                consola.sucesso(f"Selecionado: {valor_selecionado}")
-                return valor_selecionado
-        
-        # Caso contrário, retornar o valor digitado
-        return entrada
+
+        while True:
+            if len(sugestoes) > 0:
+                consola.info(f"\n{Cores.CIANO}Valores existentes de {label}:{Cores.NORMAL}")
+                # Mostrar apenas os primeiros 10
+                for i, sugestao in enumerate(sugestoes[:10], 1):
+                    consola.info(f"  {i}. {sugestao}")
+                consola.aviso("\nDica: Digite o número para selecionar, o início seguido de * para procurar, ou escreva um novo valor")
+
+            entrada = consola.ler_texto(prompt, obrigatorio=not permitir_vazio)
+
+            # Se permitir vazio e entrada for vazia ou None, retorna None
+            if permitir_vazio and (entrada is None or len(entrada) == 0):
+                return None
+
+            # Se entrada é None (cancelado), retorna None
+            if entrada is None:
+                return None
+
+            # "Cam*": procurar valores começados por "Cam" e voltar a perguntar
+            if len(entrada) > 1 and entrada.endswith('*'):
+                sugestoes = procurar(entrada[:-1])
+                if len(sugestoes) == 0:
+                    consola.aviso(f"Nenhum valor de {label} começa por '{entrada[:-1]}'.")
+                continue
+
+            # Se for número, tentar selecionar da lista
+            if entrada.isdigit():
+                indice = int(entrada) - 1
+                if 0 <= indice < len(sugestoes):
+                    valor_selecionado = sugestoes[indice]
+                    consola.sucesso(f"Selecionado: {valor_selecionado}")
+                    return valor_selecionado
+
+            # Caso contrário, retornar o valor digitado
+            return entrada
     
     @staticmethod
     def mostrar_tabela(lista_dados, configuracao_colunas):
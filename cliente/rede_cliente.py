@@ -1,7 +1,9 @@
 import json
 import socket
+import threading
 import time
 import consola
+from cliente.cache_cliente import CacheCliente
 
 class ClienteRede:
     def __init__(self, endereco, porta, depuracao=False, sessao=None):
@@ -9,9 +11,20 @@ class ClienteRede:
         self.porta = porta
         self.depuracao = depuracao
         self.timeout = 10
+        self.tentativas_servidor_ocupado = 3
+        self.tentativas_reenvio_idempotente = 2  # Reenvios, depois de reconectar, de pedidos com chave de idempotência
+        self.pedidos_simultaneos = 8  # Igual a PEDIDOS_SIMULTANEOS_POR_LIGACAO do servidor
         self.sessao = sessao
         self.ligacao = None
         self.conectado = False
+        self.buffer_rececao = b''
+        self.ultimo_id = 0
+        self.respostas_pendentes = {}  # id -> resposta recebida mas ainda não recolhida
+        self.cache = CacheCliente()  # Listagens já recebidas (ver cache_cliente.py)
+        self.chaves_pendentes = {}  # id -> (chave na cache, ação) dos pedidos ainda sem resposta
+        self.utilizador_cache = None  # Utilizador a quem pertencem as entradas da cache
+        # Uma troca de mensagens de cada vez: a cache atualiza entradas numa thread própria
+        self.lock_ligacao = threading.RLock()
 
     def conectar(self, tentativas_maximas=3):
         if self.conectado and self.ligacao is not None:
@@ -24,6 +37,7 @@ class ClienteRede:
                     (self.endereco, self.porta),
                     timeout=self.timeout
                 )
+                self.buffer_rececao = b''
                 self.conectado = True
                 return True
                 
@@ -57,6 +71,10 @@ class ClienteRede:
             finally:
                 self.ligacao = None
                 self.conectado = False
+                # O que ficou por ler pertence à ligação antiga
+                self.buffer_rececao = b''
+                self.respostas_pendentes = {}
+                self.chaves_pendentes = {}
 
     def reconectar(self, tentativas_maximas=3):
         consola.aviso("A tentar reconectar ao servidor...")
@@ -64,109 +82,394 @@ class ClienteRede:
         return self.conectar(tentativas_maximas)
 
     def enviar_comando(self, acao, parametros=None):
-        if parametros is None:
-            parametros = {}
+        em_cache = self._obter_da_cache(acao, parametros, parametros)
+        if em_cache is not None:
+            return em_cache
+
+        with self.lock_ligacao:
+            if parametros is not None and parametros.get('chave_idempotencia') is not None:
+                return self._enviar_com_reenvio(acao, parametros)
+            return self._enviar_ao_servidor(acao, parametros)
+
+    def _enviar_com_reenvio(self, acao, parametros):
+        # Sem resposta não se sabe se o servidor executou o pedido. Com uma chave de idempotência
+        # o servidor devolve o resultado original se já o executou, por isso é seguro reconectar
+        # e enviar o mesmo pedido (com a mesma chave) outra vez.
+        for tentativa in range(self.tentativas_reenvio_idempotente + 1):
+            resposta = self._enviar_ao_servidor(acao, parametros)
+            sem_resposta = resposta.get('reconectar') is True or resposta.get('tempo_esgotado') is True
+            if not sem_resposta or tentativa == self.tentativas_reenvio_idempotente:
+                return resposta
+
+            consola.aviso(f"Sem resposta do servidor: {resposta.get('erro')}")
+            # Depois de um tempo esgotado a ligação já foi substituída por uma nova
+            if not self.conectado and self.reconectar() is False:
+                return resposta
+
+    def _chave_cache(self, acao, parametros):
+        # Ao mudar de utilizador (login, logout, troca de conta) a cache é esvaziada
+        utilizador = None
+        if self.sessao is not None:
+            utilizador = self.sessao.nome_utilizador
+        if utilizador != self.utilizador_cache:
+            self.cache.limpar()
+            self.utilizador_cache = utilizador
+        return CacheCliente.chave(acao, parametros, utilizador)
+
+    def _obter_da_cache(self, acao, parametros, parametros_revalidacao):
+        # Resposta construída a partir da cache, ou None se o pedido tem de ir ao servidor
+        if acao not in CacheCliente.TTL_POR_COMANDO:
+            return None
+
+        chave = self._chave_cache(acao, parametros)
+        em_cache = self.cache.obter(chave)
+        if em_cache is None:
+            return None
+
+        resultado, precisa_revalidar = em_cache
+        if precisa_revalidar:
+            self._revalidar_em_segundo_plano(chave, acao, parametros_revalidacao)
+        return {'ok': True, 'resultado': resultado}
+
+    def _enviar_ao_servidor(self, acao, parametros):
+        # Um pedido recusado por "servidor ocupado" nunca chegou a ser executado,
+        # por isso é seguro reenviá-lo depois do tempo sugerido pelo servidor.
+        for tentativa in range(self.tentativas_servidor_ocupado + 1):
+            parametros_pedido, chave = self._preparar_condicional(acao, parametros)
+            resposta = self._aplicar_condicional(chave, acao, self._trocar_mensagem(acao, parametros_pedido))
+            espera = resposta.get('tentar_novamente_em')
+
+            if espera is None or tentativa == self.tentativas_servidor_ocupado:
+                return resposta
+
+            if self.depuracao is True:
+                consola.info_adicional(f"Servidor ocupado. A tentar novamente em {espera}s...")
+            time.sleep(espera)
+
+    def enviar_lote(self, comandos, credenciais=None, transacao=False):
+        # Executa vários comandos num único pedido 'lote': o servidor autentica uma só vez e,
+        # com transacao=True, grava tudo ou nada. Devolve uma resposta por comando.
+        # Fora de uma transação, as listagens ainda válidas na cache nem chegam a ser enviadas.
+        respostas = [None] * len(comandos)
+        parametros = dict(credenciais or {})
+        parametros['pedidos'] = []
+        enviados = []  # (índice do comando, chave na cache, ação)
+        for indice, (acao, parametros_comando) in enumerate(comandos):
+            if not transacao:
+                parametros_revalidacao = dict(credenciais or {})
+                parametros_revalidacao.update(parametros_comando or {})
+                respostas[indice] = self._obter_da_cache(acao, parametros_comando, parametros_revalidacao)
+                if respostas[indice] is not None:
+                    continue
+
+            parametros_pedido, chave = self._preparar_condicional(acao, parametros_comando)
+            parametros['pedidos'].append({'acao': acao, 'parametros': parametros_pedido})
+            enviados.append((indice, chave, acao))
+        parametros['transacao'] = transacao
+
+        if len(enviados) == 0:
+            return respostas
+
+        resposta = self.enviar_comando('lote', parametros)
+        if resposta.get('ok') is not True:
+            # O lote inteiro falhou (ex: ligação perdida): o erro vale para todos os comandos enviados
+            for indice, _, _ in enviados:
+                respostas[indice] = resposta
+            return respostas
+
+        for (indice, chave, acao), resultado in zip(enviados, resposta.get('resultado', [])):
+            respostas[indice] = self._aplicar_condicional(chave, acao, resultado)
+        return respostas
+
+    def enviar_comandos(self, comandos):
+        # Envia vários comandos de uma vez (pipelining) e devolve as respostas pela mesma ordem.
+        # `comandos` é uma lista de (acao, parametros). Em vez de um ida-e-volta por comando,
+        # cada bloco de comandos custa apenas um.
+        with self.lock_ligacao:
+            return self._enviar_comandos(comandos)
+
+    def _enviar_comandos(self, comandos):
+        respostas = [None] * len(comandos)
+        por_enviar = list(range(len(comandos)))
+
+        for tentativa in range(self.tentativas_servidor_ocupado + 1):
+            # Blocos do tamanho do limite do servidor: assim o servidor lê o bloco inteiro
+            # e nenhum dos lados fica bloqueado a escrever enquanto o outro também escreve
+            for inicio in range(0, len(por_enviar), self.pedidos_simultaneos):
+                bloco = por_enviar[inicio:inicio + self.pedidos_simultaneos]
+                ids = self.enviar_pedidos([comandos[indice] for indice in bloco])
+                respostas_bloco = self.recolher_respostas(ids)
+                for indice, id_pedido in zip(bloco, ids):
+                    respostas[indice] = respostas_bloco[id_pedido]
+
+            # Pedidos recusados por "servidor ocupado" nunca foram executados: reenviam-se
+            ocupados = [indice for indice in por_enviar if respostas[indice].get('tentar_novamente_em') is not None]
+            if len(ocupados) == 0 or tentativa == self.tentativas_servidor_ocupado:
+                break
+
+            espera = max(respostas[indice]['tentar_novamente_em'] for indice in ocupados)
+            if self.depuracao is True:
+                consola.info_adicional(f"Servidor ocupado. A reenviar {len(ocupados)} pedido(s) em {espera}s...")
+            time.sleep(espera)
+            por_enviar = ocupados
+
+        return respostas
+
+    def enviar_pedidos(self, comandos):
+        # Envia os pedidos sem esperar pelas respostas e devolve os seus ids,
+        # a usar depois com recolher_respostas.
+        with self.lock_ligacao:
+            return self._enviar_pedidos(comandos)
+
+    def _enviar_pedidos(self, comandos):
+        pacotes = []
+        for acao, parametros in comandos:
+            self.ultimo_id += 1
+            parametros_pedido, chave = self._preparar_condicional(acao, parametros)
+            pacote = self._criar_pacote(acao, parametros_pedido)
+            pacote['id'] = self.ultimo_id
+            pacotes.append(pacote)
+            self.chaves_pendentes[self.ultimo_id] = (chave, acao)
+        ids = [pacote['id'] for pacote in pacotes]
 
-        # Verifica se está conectado
         if not self.conectado or self.ligacao is None:
-            return {
+            erro = self._resposta_sem_ligacao()
+        else:
+            try:
+                self._enviar_pacotes(pacotes)
+                return ids
+            except Exception as excecao:
+                erro = self._resposta_erro_comunicacao(excecao)
+
+        # O envio falhou: a resposta de cada pedido é o próprio erro
+        for id_pedido in ids:
+            self.respostas_pendentes[id_pedido] = dict(erro, id=id_pedido)
+        return ids
+
+    def recolher_respostas(self, ids):
+        # Lê respostas até ter as de todos os ids pedidos (chegam pela ordem em que o servidor
+        # as termina). Respostas a outros ids ficam guardadas para uma recolha posterior.
+        with self.lock_ligacao:
+            return self._recolher_respostas(ids)
+
+    def _recolher_respostas(self, ids):
+        respostas = {}
+        erro = None
+        tempo_esgotado = False
+
+        try:
+            while True:
+                for id_pedido in ids:
+                    if id_pedido in self.respostas_pendentes:
+                        chave, acao = self.chaves_pendentes.pop(id_pedido, (None, None))
+                        respostas[id_pedido] = self._aplicar_condicional(
+                            chave,
+                            acao,
+                            self.respostas_pendentes.pop(id_pedido)
+                        )
+                if len(respostas) == len(ids):
+                    return respostas
+
+                resposta = self._ler_resposta()
+                if 'id' not in resposta:
+                    # Erro da ligação (ou do protocolo): vale para todos os pedidos em falta
+                    erro = resposta
+                    break
+                self.respostas_pendentes[resposta['id']] = resposta
+
+        except socket.timeout:
+            tempo_esgotado = True
+            erro = {
                 'ok': False,
-                'erro': 'Não há conexão ativa com o servidor.',
-                'reconectar': True
+                'erro': 'O servidor demorou demasiado a responder.',
+                'tempo_esgotado': True
             }
+        except Exception as excecao:
+            erro = self._resposta_erro_comunicacao(excecao)
 
-        pacote = {'acao': acao, 'parametros': parametros}
-        dados_serializados = json.dumps(pacote) + '\n'
+        for id_pedido in ids:
+            if id_pedido not in respostas:
+                self.chaves_pendentes.pop(id_pedido, None)
+                respostas[id_pedido] = dict(erro, id=id_pedido)
 
-        try:
-            # Envia o comando
-            self.ligacao.sendall(dados_serializados.encode('utf-8'))
+        if tempo_esgotado is True:
+            self._substituir_ligacao(erro)
+        return respostas
 
-            if self.depuracao is True:
-                consola.info_adicional(f">> {dados_serializados.strip()}")
+    def _preparar_condicional(self, acao, parametros):
+        # Devolve (parâmetros a enviar, chave do pedido na cache)
+        chave = self._chave_cache(acao, parametros)
+        parametros = dict(parametros or {})
+        versao = self.cache.versao_conhecida(chave)
+        if versao is not None:
+            parametros['versao_conhecida'] = versao
+        return parametros, chave
 
-            # Recebe a resposta
-            resposta_bytes = b''
+    def _aplicar_condicional(self, chave, acao, resposta):
+        if chave is None or resposta.get('ok') is not True:
+            return resposta
 
-            while True:
-                try:
-                    parte = self.ligacao.recv(4096)
-                    if len(parte) == 0:
-                        # Servidor fechou a conexão
-                        self.conectado = False
-                        return {
-                            'ok': False,
-                            'erro': 'O servidor fechou a ligação.',
-                            'reconectar': True
-                        }
-                    
-                    resposta_bytes += parte
-                    
-                    # Protocolo simples: cada resposta termina com '\n'
-                    if b'\n' in parte:
-                        break
-                        
-                except socket.timeout:
-                    return {
-                        'ok': False,
-                        'erro': 'O servidor demorou demasiado a responder.'
-                    }
-
-            resposta_texto = resposta_bytes.decode('utf-8').strip()
-
-            if len(resposta_texto) == 0:
-                self.conectado = False
-                return {
-                    'ok': False,
-                    'erro': 'O servidor fechou a ligação sem resposta.',
-                    'reconectar': True
-                }
+        # O próprio cliente alterou dados: as listagens afetadas deixam de ser usadas sem perguntar
+        self.cache.invalidar_por_comando(acao)
 
-            if self.depuracao is True:
-                consola.info_adicional(f"<< {resposta_texto}")
+        if resposta.get('nao_modificado') is True:
+            resultado = self.cache.resultado_conhecido(chave)
+            if resultado is not None:
+                # A lista não mudou: usa a cópia local
+                resposta = dict(resposta, resultado=resultado)
+                del resposta['nao_modificado']
+            return resposta
+
+        versao = resposta.get('versao')
+        if versao is not None:
+            self.cache.guardar(chave, acao, versao, resposta.get('resultado'))
+        return resposta
 
+    def _revalidar_em_segundo_plano(self, chave, acao, parametros):
+        # Atualiza uma entrada desatualizada da cache sem fazer esperar quem a pediu
+        if not self.cache.iniciar_revalidacao(chave):
+            return
+
+        def revalidar():
             try:
-                resposta = json.loads(resposta_texto)
-            except json.JSONDecodeError:
+                with self.lock_ligacao:
+                    # Se entretanto outro utilizador iniciou sessão, a entrada já não lhe pertence
+                    if self.conectado and self._chave_cache(acao, parametros) == chave:
+                        self._enviar_ao_servidor(acao, parametros)
+            finally:
+                self.cache.terminar_revalidacao(chave)
+
+        threading.Thread(target=revalidar, name="revalidar_cache", daemon=True).start()
+
+    def _trocar_mensagem(self, acao, parametros=None):
+        # Verifica se está conectado
+        if not self.conectado or self.ligacao is None:
+            return self._resposta_sem_ligacao()
+
+        try:
+            self._enviar_pacotes([self._criar_pacote(acao, parametros)])
+
+            # Um pedido sem 'id' recebe a primeira resposta sem 'id'; as respostas a pedidos
+            # enviados com enviar_pedidos e ainda não recolhidos ficam guardadas
+            while True:
+                resposta = self._ler_resposta()
+                if 'id' not in resposta:
+                    return resposta
+                self.respostas_pendentes[resposta['id']] = resposta
+
+        except socket.timeout:
+            return self._substituir_ligacao({
+                'ok': False,
+                'erro': 'O servidor demorou demasiado a responder.',
+                'tempo_esgotado': True
+            })
+
+        except Exception as erro:
+            return self._resposta_erro_comunicacao(erro)
+
+    def _substituir_ligacao(self, erro):
+        # A resposta a um pedido que esgotou o tempo pode ainda chegar e seria lida como a
+        # resposta do pedido seguinte: a ligação é fechada (com o que ficou por ler) e aberta
+        # outra. Os pedidos com 'id' ainda por recolher recebem o mesmo erro.
+        por_responder = list(self.chaves_pendentes)
+        self.desconectar()
+        self.conectar(tentativas_maximas=1)
+        for id_pedido in por_responder:
+            self.respostas_pendentes[id_pedido] = dict(erro, id=id_pedido)
+        return erro
+
+    def _criar_pacote(self, acao, parametros):
+        if parametros is None:
+            parametros = {}
+        return {'acao': acao, 'parametros': parametros}
+
+    def _enviar_pacotes(self, pacotes):
+        linhas = [json.dumps(pacote) + '\n' for pacote in pacotes]
+        # Todos os pedidos seguem no mesmo envio
+        self.ligacao.sendall(''.join(linhas).encode('utf-8'))
+
+        if self.depuracao is True:
+            for linha in linhas:
+                consola.info_adicional(f">> {linha.strip()}")
+
+    def _ler_resposta(self):
+        # Protocolo simples: cada resposta é uma linha terminada com '\n'.
+        # O que vier a seguir à linha fica no buffer para a próxima leitura.
+        while b'\n' not in self.buffer_rececao:
+            parte = self.ligacao.recv(4096)
+            if len(parte) == 0:
+                # Servidor fechou a conexão
+                self.conectado = False
                 return {
                     'ok': False,
-                    'erro': 'Resposta inválida do servidor (JSON inválido).'
+                    'erro': 'O servidor fechou a ligação.',
+                    'reconectar': True
                 }
+            self.buffer_rececao += parte
 
-            return resposta
+        linha, _, self.buffer_rececao = self.buffer_rececao.partition(b'\n')
+        resposta_texto = linha.decode('utf-8').strip()
 
-        except ConnectionRefusedError:
+        if len(resposta_texto) == 0:
             self.conectado = False
             return {
                 'ok': False,
-                'erro': 'Ligação recusada. O servidor pode estar offline.',
+                'erro': 'O servidor fechou a ligação sem resposta.',
                 'reconectar': True
             }
-            
-        except socket.gaierror:
-            self.conectado = False
-            return {
-                'ok': False,
-                'erro': f'Não foi possível encontrar o endereço: {self.endereco}'
-            }
 
-        except (ConnectionResetError, BrokenPipeError, OSError) as erro:
-            # Conexão foi perdida
-            self.conectado = False
-            return {
-                'ok': False,
-                'erro': f'Conexão perdida: {erro}',
-                'reconectar': True
-            }
-            
-        except Exception as erro:
-            self.conectado = False
+        if self.depuracao is True:
+            consola.info_adicional(f"<< {resposta_texto}")
+
+        try:
+            return json.loads(resposta_texto)
+        except json.JSONDecodeError:
             return {
                 'ok': False,
-                'erro': f'Erro de comunicação inesperado: {erro}',
-                'reconectar': True
+                'erro': 'Resposta inválida do servidor (JSON inválido).'
             }
 
+    def _resposta_sem_ligacao(self):
+        return {
+            'ok': False,
+            'erro': 'Não há conexão ativa com o servidor.',
+            'reconectar': True
+        }
+
+    def _resposta_erro_comunicacao(self, erro):
+        match erro:
+            case ConnectionRefusedError():
+                self.conectado = False
+                return {
+                    'ok': False,
+                    'erro': 'Ligação recusada. O servidor pode estar offline.',
+                    'reconectar': True
+                }
+
+            case socket.gaierror():
+                self.conectado = False
+                return {
+                    'ok': False,
+                    'erro': f'Não foi possível encontrar o endereço: {self.endereco}'
+                }
+
+            case ConnectionResetError() | BrokenPipeError() | OSError():
+                # Conexão foi perdida
+                self.conectado = False
+                return {
+                    'ok': False,
+                    'erro': f'Conexão perdida: {erro}',
+                    'reconectar': True
+                }
+
+            case _:
+                self.conectado = False
+                return {
+                    'ok': False,
+                    'erro': f'Erro de comunicação inesperado: {erro}',
+                    'reconectar': True
+                }
+
     @property
     def tokens_locais(self):
         if self.sessao:
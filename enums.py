@@ -57,6 +57,12 @@ class Mensagem(Enum):
     ALERTA_STOCK_BAIXO = "Alerta: Stock baixo"
     COMANDO_NAO_ENCONTRADO = "Comando não encontrado"
     PARAMETROS_INVALIDOS = "Parâmetros inválidos"
+    SERVIDOR_OCUPADO = "Servidor ocupado, tente novamente dentro de momentos"
+    LOTE_ANULADO = "Não executado: o lote foi anulado"
+    DEMASIADAS_TENTATIVAS = "Demasiadas tentativas falhadas, tente novamente mais tarde"
+    NAO_MODIFICADO = "Sem alterações desde a versão conhecida"
+    CARRINHO_VAZIO = "O carrinho está vazio"
+    RESERVAS_EXPIRADAS = "Algumas reservas do carrinho expiraram e foram devolvidas ao stock; reveja o carrinho"
     
     def __str__(self):
         return self.value
\ No newline at end of file
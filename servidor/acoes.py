@@ -1,6 +1,16 @@
+import os
 from servidor.entidades import Admin, Vendedor, Cliente, Produto, Utilizador, Sessao
 from enums import Mensagem
 from servidor.configuracao import ConfiguracaoServidor
+from servidor.agendador import agendador_tarefas_global
+from servidor.cache_sessoes import cache_sessoes_global
+from servidor.cache_catalogo import cache_catalogo_global
+from servidor.indice_prefixos import indices_prefixos_global
+from servidor.indice_trigramas import indice_trigramas_global
+from servidor.limitador_falhas import limitador_falhas_global
+from servidor.repeticao_transacoes import repetidor_transacoes_global
+from servidor.execucao import executor_pedidos_global
+from servidor.pool_conexoes import pool_conexoes_global
 
 class Acoes:
     @staticmethod
@@ -8,28 +18,97 @@ class Acoes:
         return Mensagem.PONG
 
     @staticmethod
-    def help(gestor_comandos, utilizador_atual=None):
-        comandos_agrupados = {}
-        for comando_atual in gestor_comandos.comandos.values():
-            pode_executar = comando_atual.validar_permissao(utilizador_atual)
-            
-            if pode_executar:
-                categoria = comando_atual.categoria or 'outros'
-                if categoria not in comandos_agrupados:
-                    comandos_agrupados[categoria] = []
-                
-                # Adiciona apenas se não existe comando com mesmo nome na categoria
-                existe = False
-                for comando_existente in comandos_agrupados[categoria]:
-                    if comando_existente.get('nome') == comando_atual.nome:
-                        existe = True
-                        break
-                if existe is False:
-                    comandos_agrupados[categoria].append(comando_atual.para_json())
-        return {'comandos': comandos_agrupados}
+    def help(gestor_comandos, utilizador_atual=None, parametros=None):
+        # Importação local: protocolo importa este módulo
+        from servidor.protocolo import ResultadoSerializado
+
+        ajuda = gestor_comandos.ajuda(getattr(utilizador_atual, 'cargo', None))
+
+        if parametros is not None and parametros.get('versao_conhecida') == ajuda['versao']:
+            return (Mensagem.NAO_MODIFICADO, {'nao_modificado': True, 'versao': ajuda['versao']})
+
+        return (Mensagem.SUCESSO, ResultadoSerializado(ajuda['conteudo'], ajuda['serializado']))
     
     @staticmethod
-    def autenticar(base_de_dados=None, parametros=None, **kwargs):        
+    def lote(base_de_dados, utilizador_atual, parametros, gestor_comandos, sessao_ligacao=None):
+        # Importações locais: comandos e protocolo importam este módulo
+        from servidor.comandos import ProcessadorComandos
+        from servidor.protocolo import Protocolo
+
+        pedidos = parametros.get('pedidos')
+        if not isinstance(pedidos, list) or len(pedidos) > ConfiguracaoServidor.LOTE_MAXIMO_PEDIDOS:
+            return Mensagem.PARAMETROS_INVALIDOS
+
+        # A autenticação foi feita uma vez para o lote; as credenciais seguem para cada
+        # comando, para as ações que as leem dos parâmetros
+        credenciais = {}
+        for chave in ('token_sessao', 'username', 'password'):
+            if chave in parametros:
+                credenciais[chave] = parametros[chave]
+
+        # Com 'transacao', o lote é tudo ou nada: o primeiro comando que falhar anula os anteriores
+        transacional = parametros.get('transacao', False) is True
+        if transacional:
+            bd = base_de_dados.transacao()
+        else:
+            bd = base_de_dados
+
+        resultados = []
+        for pedido in pedidos:
+            if not isinstance(pedido, dict):
+                pacote = Protocolo.criar_pacote(False, erro=str(Mensagem.PARAMETROS_INVALIDOS))
+            else:
+                comando = gestor_comandos.obter(pedido.get('acao'))
+                parametros_pedido = pedido.get('parametros') or {}
+
+                if comando is None or comando.acao is Acoes.lote:
+                    pacote = Protocolo.criar_pacote(False, erro=str(Mensagem.COMANDO_NAO_ENCONTRADO))
+                elif not isinstance(parametros_pedido, dict):
+                    pacote = Protocolo.criar_pacote(False, erro=str(Mensagem.PARAMETROS_INVALIDOS))
+                else:
+                    resultado = ProcessadorComandos.executar_comando(
+                        bd,
+                        gestor_comandos,
+                        comando,
+                        utilizador_atual,
+                        {**credenciais, **parametros_pedido},
+                        sessao_ligacao
+                    )
+                    pacote = Protocolo.pacote_do_resultado(comando, resultado)
+                    if comando.condicional and pacote['ok'] is True:
+                        pacote = Protocolo.pacote_condicional(pacote, parametros_pedido.get('versao_conhecida'))
+            resultados.append(pacote)
+
+            if transacional and (pacote['ok'] is False or bd.anulada):
+                break
+
+        if transacional:
+            if len(resultados) == len(pedidos) and not bd.anulada:
+                bd.confirmar()
+            else:
+                bd.anular()
+                # Valores novos (nomes, categorias, descrições) inseridos pelo lote já entraram nos índices
+                for indice_sugestoes in indices_prefixos_global.values():
+                    indice_sugestoes.invalidar()
+                indice_trigramas_global.invalidar()
+                # Nada do lote ficou gravado: os comandos que correram bem e os que não
+                # chegaram a correr são marcados como anulados
+                resultados_finais = []
+                for indice in range(len(pedidos)):
+                    if indice < len(resultados) and resultados[indice]['ok'] is False:
+                        resultados_finais.append(resultados[indice])
+                    else:
+                        resultados_finais.append(Protocolo.criar_pacote(False, erro=str(Mensagem.LOTE_ANULADO)))
+                resultados = resultados_finais
+
+            # As escritas no catálogo invalidam a cache antes do fim da transação: uma listagem
+            # lida entretanto (mesmo dentro do lote, antes de ser anulado) pode ter ficado em cache
+            cache_catalogo_global.invalidar()
+
+        return (Mensagem.SUCESSO, resultados)
+
+    @staticmethod
+    def autenticar(base_de_dados=None, parametros=None, utilizador_atual=None, sessao_ligacao=None, **kwargs):        
         if parametros is None:
             parametros = {}
         
@@ -39,38 +118,37 @@ class Acoes:
         username = parametros.get('username')
         password = parametros.get('password')
         token_sessao = parametros.get('token_sessao')
+        endereco = None
+        if sessao_ligacao is not None:
+            endereco = sessao_ligacao.endereco
 
         # Autenticação por token (sessão existente)
         if token_sessao is not None:
-            if not Sessao.validar_token(base_de_dados, token_sessao):
-                return Mensagem.CREDENCIAIS_INVALIDAS
-            
-            # Busca o utilizador associado ao token
-            base_de_dados.cursor.execute("SELECT nome_utilizador FROM sessoes WHERE token = %s", (token_sessao,))
-            resultado_sessao = base_de_dados.cursor.fetchone()
-            
-            if resultado_sessao is None:
+            sessao_valida = Sessao.resolver_token(base_de_dados, token_sessao, endereco)
+            if sessao_valida is Mensagem.DEMASIADAS_TENTATIVAS:
+                return sessao_valida
+            if sessao_valida is None:
                 return Mensagem.CREDENCIAIS_INVALIDAS
             
-            nome_utilizador_token = resultado_sessao['nome_utilizador']
-            
-            # Busca o utilizador completo
-            base_de_dados.cursor.execute("SELECT id, cargo FROM utilizadores WHERE nome_utilizador = %s", (nome_utilizador_token,))
-            dados_utilizador = base_de_dados.cursor.fetchone()
-            
-            if dados_utilizador is None:
-                return Mensagem.CREDENCIAIS_INVALIDAS
+            dados_utilizador, _ = sessao_valida
             
             # Retorna informações da sessão válida
             return {
                 'cargo': dados_utilizador['cargo'],
                 'token': token_sessao,
-                'username': nome_utilizador_token
+                'username': dados_utilizador['nome_utilizador']
             }
 
         # Autenticação por username e password (novo login)
         if username is not None and password is not None:
-            resultado = Utilizador.autenticar(base_de_dados, username, password)
+            # As credenciais já foram verificadas ao processar o pedido; reutiliza o resultado
+            # para a mesma falha não contar duas vezes no limitador
+            if isinstance(utilizador_atual, Mensagem):
+                resultado = utilizador_atual
+            elif utilizador_atual is not None and utilizador_atual.nome_utilizador == username:
+                resultado = utilizador_atual
+            else:
+                resultado = Utilizador.autenticar(base_de_dados, username, password, endereco)
 
             # Se retornou uma Mensagem, há erro
             if isinstance(resultado, Mensagem):
@@ -151,6 +229,23 @@ class Acoes:
             case _:
                 return Mensagem.CARGO_INVALIDO
         
+    @staticmethod
+    def estado_servidor():
+        # No modo multi-processo, os valores são os do processo que atendeu esta ligação
+        # (as tarefas periódicas correm só no primeiro trabalhador)
+        return (Mensagem.SUCESSO, {
+            'pid': os.getpid(),
+            'tarefas_periodicas': agendador_tarefas_global.estatisticas(),
+            'execucao_pedidos': executor_pedidos_global.estatisticas(),
+            'cache_sessoes': cache_sessoes_global.estatisticas(),
+            'cache_catalogo': cache_catalogo_global.estatisticas(),
+            'indices_sugestoes': {tabela: indice.estatisticas() for tabela, indice in indices_prefixos_global.items()},
+            'indice_pesquisa': indice_trigramas_global.estatisticas(),
+            'falhas_autenticacao': limitador_falhas_global.estatisticas(),
+            'repeticoes_transacoes': repetidor_transacoes_global.estatisticas(),
+            'pool_conexoes': pool_conexoes_global.estatisticas()
+        })
+
     @staticmethod
     def listar_utilizadores(utilizador_atual, parametros):
         filtro_cargo = parametros.get('filtro_cargo')
@@ -181,8 +276,30 @@ class Acoes:
     @staticmethod
     def realizar_encomenda(utilizador_atual, parametros):
         itens = parametros.get('itens')
-        return utilizador_atual.realizar_encomenda(itens)
+        chave_idempotencia = parametros.get('chave_idempotencia')
+        return utilizador_atual.realizar_encomenda(itens, chave_idempotencia=chave_idempotencia)
     
+    @staticmethod
+    def carrinho_adicionar(utilizador_atual, parametros):
+        id_produto = parametros.get('id_produto')
+        quantidade = parametros.get('quantidade')
+        return utilizador_atual.adicionar_ao_carrinho(id_produto, quantidade, ConfiguracaoServidor.RESERVAS_DURACAO_SEGUNDOS)
+
+    @staticmethod
+    def carrinho_remover(utilizador_atual, parametros):
+        id_produto = parametros.get('id_produto')
+        quantidade = parametros.get('quantidade')
+        return utilizador_atual.remover_do_carrinho(id_produto, quantidade)
+
+    @staticmethod
+    def carrinho_ver(utilizador_atual):
+        return utilizador_atual.ver_carrinho()
+
+    @staticmethod
+    def carrinho_finalizar(utilizador_atual, parametros):
+        chave_idempotencia = parametros.get('chave_idempotencia')
+        return utilizador_atual.finalizar_carrinho(chave_idempotencia)
+
     @staticmethod
     def ver_historico_compras(utilizador_atual):
         return utilizador_atual.ver_historico_compras()
@@ -214,6 +331,12 @@ class Acoes:
     def concluir_encomenda(utilizador_atual, parametros):
         id_encomenda = parametros.get('id_encomenda')
         return utilizador_atual.concluir_encomenda(id_encomenda)
+
+    @staticmethod
+    def concluir_encomendas_em_lote(utilizador_atual, parametros):
+        ids_encomendas = parametros.get('ids_encomendas')
+        mais_antigas_que_horas = parametros.get('mais_antigas_que_horas')
+        return utilizador_atual.concluir_encomendas_em_lote(ids_encomendas, mais_antigas_que_horas)
     
     @staticmethod
     def listar_encomendas(utilizador_atual, parametros):
@@ -269,6 +392,32 @@ class Acoes:
     def listar_descricoes(base_de_dados):
         return Produto.listar_descricoes(base_de_dados)
 
+    @staticmethod
+    def _sugerir(base_de_dados, parametros, tabela):
+        prefixo = parametros.get('prefixo', '')
+        limite = parametros.get('limite', ConfiguracaoServidor.SUGESTOES_LIMITE_PREDEFINIDO)
+        try:
+            limite = int(limite)
+        except (TypeError, ValueError):
+            return Mensagem.PARAMETROS_INVALIDOS
+
+        if prefixo is None or limite < 1:
+            return Mensagem.PARAMETROS_INVALIDOS
+        limite = min(limite, ConfiguracaoServidor.SUGESTOES_LIMITE_MAXIMO)
+        return Produto.sugerir(base_de_dados, tabela, prefixo, limite)
+
+    @staticmethod
+    def sugerir_nomes_produtos(base_de_dados, parametros):
+        return Acoes._sugerir(base_de_dados, parametros, 'nomes_produtos')
+
+    @staticmethod
+    def sugerir_categorias(base_de_dados, parametros):
+        return Acoes._sugerir(base_de_dados, parametros, 'categorias')
+
+    @staticmethod
+    def sugerir_descricoes(base_de_dados, parametros):
+        return Acoes._sugerir(base_de_dados, parametros, 'descricoes')
+
     @staticmethod
     def procurar_produto_por_nome(base_de_dados, parametros):
         nome_produto = parametros.get('nome_produto')
@@ -292,14 +441,23 @@ class Acoes:
             return Mensagem.PARAMETROS_INVALIDOS
         
         try:
-            # Procura na tabela de nomes primeiro
-            sql = """
-                SELECT DISTINCT p.id, p.preco, p.quantidade, p.loja_id, pn.nome
+            # Os nomes que contêm o termo vêm do índice de trigramas, já ordenados por relevância;
+            # o MySQL só aplica os filtros de loja e preço aos produtos desses nomes
+            nomes_encontrados = indice_trigramas_global.procurar(base_de_dados, nome_busca)
+            if len(nomes_encontrados) == 0:
+                return Mensagem.NAO_ENCONTRADO
+
+            ordem_nomes = {}
+            for ordem, (id_nome, nome) in enumerate(nomes_encontrados):
+                ordem_nomes[id_nome] = (ordem, nome)
+
+            marcadores = ', '.join(['%s'] * len(ordem_nomes))
+            sql = f"""
+                SELECT p.id, p.preco, p.stock AS quantidade, p.loja_id, p.nome_produto_id
                 FROM produtos p
-                JOIN nomes_produtos pn ON p.nome_produto_id = pn.id
-                WHERE pn.nome LIKE %s
+                WHERE p.nome_produto_id IN ({marcadores})
             """
-            params = [f"%{nome_busca}%"]
+            params = list(ordem_nomes.keys())
 
             # Adicionar filtros conforme necessário
             if loja_id:
@@ -314,20 +472,21 @@ class Acoes:
                 sql += " AND p.preco <= %s"
                 params.append(str(preco_max))
 
-            sql += " ORDER BY pn.nome ASC"
-
             base_de_dados.cursor.execute(sql, params)
             resultados = base_de_dados.cursor.fetchall()
 
             if not resultados:
                 return Mensagem.NAO_ENCONTRADO
 
+            # Mais relevantes primeiro; produtos com o mesmo nome pela ordem do id
+            resultados.sort(key=lambda linha: (ordem_nomes[linha['nome_produto_id']][0], linha['id']))
+
             # Converte para dicionários com informações relevantes
             produtos_encontrados = []
             for linha in resultados:
                 produtos_encontrados.append({
                     'id': linha['id'],
-                    'nome': linha['nome'],
+                    'nome': ordem_nomes[linha['nome_produto_id']][1],
                     'preco': float(linha['preco']),
                     'quantidade': linha['quantidade'],
                     'loja_id': linha['loja_id']
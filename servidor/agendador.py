@@ -0,0 +1,107 @@
+import heapq
+import threading
+import time
+import consola
+
+# Tarefas periódicas do servidor (ex: limpeza de sessões expiradas), fora do caminho dos pedidos.
+# Uma única thread dorme até à próxima tarefa da heap; registar ou parar acordam-na.
+class AgendadorTarefas:
+    def __init__(self):
+        self._heap = []  # (instante monotónico da próxima execução, sequência, tarefa)
+        self._tarefas = {}  # nome -> {'nome', 'funcao', 'intervalo_segundos', 'estatisticas'}
+        self._sequencia = 0
+        self._condicao = threading.Condition()
+        self._thread = None
+        self._parar = False
+
+    def registar(self, nome, funcao, intervalo_segundos, atraso_inicial_segundos=0):
+        with self._condicao:
+            # Registar de novo o mesmo nome substitui a tarefa anterior
+            tarefa = {
+                'nome': nome,
+                'funcao': funcao,
+                'intervalo_segundos': intervalo_segundos,
+                'estatisticas': {
+                    'intervalo_segundos': intervalo_segundos,
+                    'execucoes': 0,
+                    'falhas': 0,
+                    'ultima_execucao': None,
+                    'ultima_duracao_segundos': None,
+                    'ultimo_resultado': None,
+                    'ultimo_erro': None
+                }
+            }
+            self._tarefas[nome] = tarefa
+            self._agendar(tarefa, time.monotonic() + atraso_inicial_segundos)
+            self._condicao.notify()
+
+    def _agendar(self, tarefa, instante):
+        self._sequencia += 1
+        heapq.heappush(self._heap, (instante, self._sequencia, tarefa))
+
+    def iniciar(self):
+        with self._condicao:
+            if self._thread is not None:
+                return
+            self._parar = False
+            self._thread = threading.Thread(target=self._executar, name="agendador_tarefas", daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        with self._condicao:
+            thread = self._thread
+            self._thread = None
+            self._parar = True
+            self._condicao.notify()
+
+        if thread is not None:
+            thread.join()
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._parar:
+                    if len(self._heap) > 0:
+                        espera = self._heap[0][0] - time.monotonic()
+                        if espera <= 0:
+                            break
+                        self._condicao.wait(espera)
+                    else:
+                        self._condicao.wait()
+
+                if self._parar:
+                    return
+                _, _, tarefa = heapq.heappop(self._heap)
+
+            # Entrada de uma tarefa que entretanto foi substituída
+            if self._tarefas.get(tarefa['nome']) is not tarefa:
+                continue
+
+            self._executar_tarefa(tarefa)
+
+            with self._condicao:
+                # A próxima execução conta a partir do fim desta, para nunca se sobreporem
+                if self._tarefas.get(tarefa['nome']) is tarefa:
+                    self._agendar(tarefa, time.monotonic() + tarefa['intervalo_segundos'])
+
+    def _executar_tarefa(self, tarefa):
+        estatisticas = tarefa['estatisticas']
+        inicio = time.monotonic()
+        try:
+            resultado = tarefa['funcao']()
+            estatisticas['ultimo_resultado'] = resultado
+            estatisticas['ultimo_erro'] = None
+        except Exception as erro:
+            estatisticas['falhas'] += 1
+            estatisticas['ultimo_erro'] = str(erro)
+            consola.erro(f"Tarefa periódica '{tarefa['nome']}' falhou: {erro}")
+        finally:
+            estatisticas['execucoes'] += 1
+            estatisticas['ultima_execucao'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            estatisticas['ultima_duracao_segundos'] = round(time.monotonic() - inicio, 3)
+
+    def estatisticas(self):
+        with self._condicao:
+            return {nome: dict(tarefa['estatisticas']) for nome, tarefa in self._tarefas.items()}
+
+agendador_tarefas_global = AgendadorTarefas()
@@ -2,10 +2,48 @@ import mysql.connector
 from mysql.connector import Error
 import time
 import consola
+from servidor.migracoes import GestorMigracoes
 
 class ErroConexaoBD(Exception):
     pass
 
+# Conexão usada pelos comandos de um lote transacional: os commits das entidades não têm
+# efeito, para que o lote inteiro seja confirmado (ou anulado) de uma só vez no fim.
+class ConexaoTransacao:
+    def __init__(self, conexao):
+        self._conexao = conexao
+        self.anulada = False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.anulada = True
+        self._conexao.rollback()
+
+    def __getattr__(self, nome):
+        return getattr(self._conexao, nome)
+
+class GestorTransacao:
+    def __init__(self, gestor_bd):
+        self.gestor_bd = gestor_bd
+        self.cursor = gestor_bd.cursor
+        self.conexao = ConexaoTransacao(gestor_bd.conexao)
+        self.em_transacao = True  # Os erros anulam o lote inteiro: não se repete uma operação isolada
+
+    @property
+    def anulada(self):
+        return self.conexao.anulada
+
+    def confirmar(self):
+        self.gestor_bd.conexao.commit()
+
+    def anular(self):
+        self.conexao.rollback()
+
+    def __getattr__(self, nome):
+        return getattr(self.gestor_bd, nome)
+
 class GestorBaseDados:
     def __init__(self, host='localhost', utilizador='root', palavra_passe='', nome_banco='sistema_vendas', limpar_base_dados=False):
         # Configuração inicial para conexão (dicionário interno mantendo chaves em inglês exigidas pela biblioteca)
@@ -17,31 +55,41 @@ class GestorBaseDados:
         self.nome_banco = nome_banco 
         self.conexao = None
         self.cursor = None
+        self.em_transacao = False
         self.__limpar_base_dados = limpar_base_dados
 
-    def conectar(self, tentativas_maximas=10):
+    def conectar(self, tentativas_maximas=10, preparar_esquema=True, silencioso=False):
+        # preparar_esquema=False é o caminho rápido usado pela pool: a base de dados e as
+        # tabelas já foram preparadas no arranque, por isso não se executa nenhum DDL.
+        # silencioso=True é usado nas conexões abertas durante um pedido: não escreve na
+        # consola nem espera entre tentativas, o erro é simplesmente propagado ao pedido.
         tentativas = 0
         while tentativas < tentativas_maximas:
             tentativas += 1
             try:
-                erro = self.verificar_criar_base_dados()
-                if erro is not None:
-                    raise ErroConexaoBD(erro)
+                if preparar_esquema is True:
+                    erro = self.verificar_criar_base_dados()
+                    if erro is not None:
+                        raise ErroConexaoBD(erro)
 
                 # Adiciona a base de dados à configuração antes de conectar
                 self.configuracao['database'] = self.nome_banco
                 self.conexao = mysql.connector.connect(**self.configuracao)
                 self.cursor = self.conexao.cursor(dictionary=True)
                 
-                self.criar_tabelas()
+                if preparar_esquema is True:
+                    self.aplicar_migracoes()
                 
-                consola.sucesso(f"Conectado com sucesso a: {self.nome_banco}")
+                if silencioso is False:
+                    consola.sucesso(f"Conectado com sucesso a: {self.nome_banco}")
                 return True
             except (Error, ErroConexaoBD) as erro:
-                self.exibir_erro_conexao(erro, tempo_espera_segundos=3)
+                if silencioso is False:
+                    self.exibir_erro_conexao(erro, tempo_espera_segundos=3)
         
         # Se chegou aqui, excedeu as tentativas
-        consola.erro(f"\nFalha crítica: Não foi possível conectar após {tentativas_maximas} tentativas.")
+        if silencioso is False:
+            consola.erro(f"\nFalha crítica: Não foi possível conectar após {tentativas_maximas} tentativas.")
         raise ErroConexaoBD(f"Falha ao conectar após {tentativas_maximas} tentativas")
     
     def exibir_erro_conexao(self, erro, tempo_espera_segundos=5):
@@ -83,70 +131,10 @@ class GestorBaseDados:
         except Error as erro:
             return erro
 
-    def criar_tabelas(self):
-        # Lista de comandos SQL para criar a estrutura da base de dados.
-        comandos = [
-            "CREATE TABLE IF NOT EXISTS categorias (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(50) UNIQUE)",
-            "CREATE TABLE IF NOT EXISTS nomes_produtos (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(100) UNIQUE)",
-            "CREATE TABLE IF NOT EXISTS descricoes (id INT AUTO_INCREMENT PRIMARY KEY, texto TEXT)",
-            "CREATE TABLE IF NOT EXISTS lojas (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(50) UNIQUE, localizacao VARCHAR(100))",
-            
-            """CREATE TABLE IF NOT EXISTS utilizadores (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nome_utilizador VARCHAR(50) UNIQUE,
-                palavra_passe VARCHAR(255),
-                cargo ENUM('admin', 'vendedor', 'cliente'),
-                loja_id INT NULL,
-                FOREIGN KEY (loja_id) REFERENCES lojas(id)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS sessoes (
-                token CHAR(64) PRIMARY KEY,
-                nome_utilizador VARCHAR(50),
-                palavra_passe VARCHAR(255),
-                data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS produtos (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                loja_id INT,
-                nome_produto_id INT,
-                categoria_id INT,
-                descricao_id INT,
-                preco DECIMAL(10, 2),
-                stock INT,
-                FOREIGN KEY (loja_id) REFERENCES lojas(id),
-                FOREIGN KEY (nome_produto_id) REFERENCES nomes_produtos(id),
-                FOREIGN KEY (categoria_id) REFERENCES categorias(id),
-                FOREIGN KEY (descricao_id) REFERENCES descricoes(id),
-                UNIQUE KEY unique_prod_store (loja_id, nome_produto_id)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS encomendas (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                comprador_id INT,
-                loja_id INT,
-                vendedor_id INT NULL,
-                estado ENUM('pendente', 'concluida') DEFAULT 'pendente',
-                preco_total DECIMAL(10,2) DEFAULT 0,
-                data_encomenda DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (comprador_id) REFERENCES utilizadores(id),
-                FOREIGN KEY (loja_id) REFERENCES lojas(id),
-                FOREIGN KEY (vendedor_id) REFERENCES utilizadores(id)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS itens_encomenda (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                encomenda_id INT,
-                produto_id INT,
-                quantidade INT,
-                preco_unitario DECIMAL(10,2),
-                FOREIGN KEY (encomenda_id) REFERENCES encomendas(id) ON DELETE CASCADE,
-                FOREIGN KEY (produto_id) REFERENCES produtos(id),
-                UNIQUE KEY unique_product_per_order (encomenda_id, produto_id)
-            )""",
-        ]
-        
+    def transacao(self):
+        return GestorTransacao(self)
+
+    def aplicar_migracoes(self):
         # Garante que o cursor existe antes de executar
         if self.cursor is None:
             if self.conexao is not None:
@@ -154,12 +142,4 @@ class GestorBaseDados:
             else:
                 raise Exception("A conexão com a base de dados não está estabelecida.")
         
-        # Executa cada consulta sequencialmente
-        for comando in comandos:
-            try:
-                self.cursor.execute(comando)
-            except Error as erro_sql:
-                consola.erro(f"Erro ao criar tabela: {erro_sql}")
-        
-        if self.conexao is not None:
-            self.conexao.commit()
\ No newline at end of file
+        return GestorMigracoes(self).aplicar()
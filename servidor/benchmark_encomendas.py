@@ -0,0 +1,139 @@
+import secrets
+import sys
+import threading
+import time
+import consola
+from enums import Mensagem
+from servidor.configuracao import ConfiguracaoServidor
+from servidor.base_de_dados import GestorBaseDados
+from servidor.entidades import Cliente, Produto, Utilizador
+from servidor.cache_catalogo import cache_catalogo_global
+from servidor.indice_prefixos import indices_prefixos_global
+from servidor.indice_trigramas import indice_trigramas_global
+
+# Mede encomendas por segundo com 1, 10 e 50 compradores simultâneos a comprar o mesmo
+# produto (o pior caso para os bloqueios de Cliente.realizar_encomenda), e confirma que
+# o stock final é igual ao inicial menos o vendido (nenhuma venda a mais).
+# Usa a base de dados de ConfiguracaoServidor e apaga no fim os dados que criou; cada execução
+# usa nomes próprios, para que os restos de uma execução interrompida não façam falhar a seguinte.
+#
+#   python -m servidor.benchmark_encomendas [segundos por ensaio]
+
+PREFIXO = 'benchmark_encomendas'
+COMPRADORES = (1, 10, 50)
+STOCK_INICIAL = 1000000
+
+def _nova_conexao(preparar_esquema=False):
+    bd = GestorBaseDados(
+        host=ConfiguracaoServidor.BD_ENDERECO,
+        utilizador=ConfiguracaoServidor.BD_UTILIZADOR,
+        palavra_passe=ConfiguracaoServidor.BD_PALAVRA_PASSE,
+        nome_banco=ConfiguracaoServidor.BD_NOME
+    )
+    if not bd.conectar(preparar_esquema=preparar_esquema):
+        raise RuntimeError("Não foi possível ligar à base de dados.")
+    return bd
+
+def _padrao_compradores(nome):
+    # Padrão LIKE dos nomes f"{nome}_{indice}" ('_' é um caráter especial no LIKE)
+    return nome.replace('_', '\\_') + '\\_%'
+
+def _preparar(bd, nome, numero_compradores):
+    # nome identifica os dados desta execução: loja, produto (nome, categoria e descrição) e compradores
+    bd.cursor.execute("INSERT INTO lojas (nome, localizacao) VALUES (%s, %s)", (nome, nome))
+    bd.conexao.commit()
+    id_loja = bd.cursor.lastrowid
+
+    if Produto.criar(bd, id_loja, nome, nome, nome, 1.0, STOCK_INICIAL) != Mensagem.ADICIONADO:
+        raise RuntimeError("Não foi possível criar o produto de teste.")
+    id_produto = Produto.obter_id_pelo_nome_e_loja(bd, nome, id_loja)
+
+    for indice in range(numero_compradores):
+        Cliente.registar(bd, f"{nome}_{indice}", nome)
+    bd.cursor.execute(
+        "SELECT id, nome_utilizador, cargo, loja_id FROM utilizadores WHERE nome_utilizador LIKE %s ORDER BY id",
+        (_padrao_compradores(nome),)
+    )
+    compradores = bd.cursor.fetchall()
+    return id_loja, id_produto, compradores
+
+def _limpar(bd, nome, id_loja):
+    # itens_encomenda é apagado em cascata com as encomendas
+    bd.cursor.execute("DELETE FROM encomendas WHERE loja_id = %s", (id_loja,))
+    bd.cursor.execute("DELETE FROM produtos WHERE loja_id = %s", (id_loja,))
+    bd.cursor.execute("DELETE FROM lojas WHERE id = %s", (id_loja,))
+    bd.cursor.execute("DELETE FROM utilizadores WHERE nome_utilizador LIKE %s", (_padrao_compradores(nome),))
+    # Valores partilhados criados por Produto.criar
+    bd.cursor.execute("DELETE FROM nomes_produtos WHERE nome = %s", (nome,))
+    bd.cursor.execute("DELETE FROM categorias WHERE nome = %s", (nome,))
+    bd.cursor.execute("DELETE FROM descricoes WHERE texto = %s", (nome,))
+    bd.conexao.commit()
+
+    # Os índices e a cache em memória ainda têm os valores apagados
+    for indice in indices_prefixos_global.values():
+        indice.invalidar()
+    indice_trigramas_global.invalidar()
+    cache_catalogo_global.invalidar()
+
+def _stock(bd, id_produto):
+    bd.conexao.commit()  # Termina a transação atual para ler o valor mais recente
+    bd.cursor.execute("SELECT stock FROM produtos WHERE id = %s", (id_produto,))
+    return bd.cursor.fetchone()['stock']
+
+def _ensaio(dados_compradores, id_produto, segundos):
+    contagens = []
+    fim = time.monotonic() + segundos
+
+    def comprar(dados_comprador, resultado):
+        bd = _nova_conexao()
+        comprador = Utilizador.reconstruir(bd, dict(dados_comprador))
+        try:
+            while time.monotonic() < fim:
+                resposta = comprador.realizar_encomenda({id_produto: 1})
+                if isinstance(resposta, tuple) and resposta[0] == Mensagem.PENDENTE:
+                    resultado['encomendas'] += 1
+                else:
+                    resultado['falhas'] += 1
+        finally:
+            bd.conexao.close()
+
+    threads = []
+    for dados_comprador in dados_compradores:
+        resultado = {'encomendas': 0, 'falhas': 0}
+        contagens.append(resultado)
+        threads.append(threading.Thread(target=comprar, args=(dados_comprador, resultado)))
+
+    inicio = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.monotonic() - inicio
+
+    encomendas = sum(resultado['encomendas'] for resultado in contagens)
+    falhas = sum(resultado['falhas'] for resultado in contagens)
+    return encomendas, falhas, duracao
+
+def executar(segundos=10):
+    bd = _nova_conexao(preparar_esquema=True)
+    nome = f"{PREFIXO}_{secrets.token_hex(4)}"
+    id_loja, id_produto, compradores = _preparar(bd, nome, max(COMPRADORES))
+    try:
+        consola.info(f"{'Compradores':>12} {'Encomendas':>11} {'Falhas':>7} {'Enc./s':>9} {'Stock OK':>9}")
+        for numero_compradores in COMPRADORES:
+            stock_antes = _stock(bd, id_produto)
+            encomendas, falhas, duracao = _ensaio(compradores[:numero_compradores], id_produto, segundos)
+            stock_ok = _stock(bd, id_produto) == stock_antes - encomendas
+            consola.info(
+                f"{numero_compradores:>12} {encomendas:>11} {falhas:>7} "
+                f"{encomendas / duracao:>9.1f} {'sim' if stock_ok else 'NÃO':>9}"
+            )
+    finally:
+        _limpar(bd, nome, id_loja)
+        bd.conexao.close()
+
+if __name__ == '__main__':
+    segundos_por_ensaio = 10
+    if len(sys.argv) > 1:
+        segundos_por_ensaio = float(sys.argv[1])
+    executar(segundos_por_ensaio)
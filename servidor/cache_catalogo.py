@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from servidor.configuracao import ConfiguracaoServidor
+
+# Cache das listagens de produtos, por loja e filtros, partilhada pelas ligações do processo.
+# Cada escrita no catálogo (produtos, stock, lojas) incrementa a versão global; as entradas
+# de uma versão anterior deixam de ser usadas. As listas guardadas são partilhadas entre
+# pedidos e não podem ser alteradas por quem as recebe.
+class CacheCatalogo:
+    def __init__(self, tamanho_maximo=None, ttl_segundos=None):
+        if tamanho_maximo is None:
+            tamanho_maximo = ConfiguracaoServidor.CACHE_CATALOGO_TAMANHO_MAXIMO
+
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_segundos = ttl_segundos  # None = até à próxima escrita no catálogo
+        self.versao = 0
+        self._entradas = OrderedDict()  # chave -> (versão, instante monotónico de expiração, produtos)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    @staticmethod
+    def chave(id_loja, filtros):
+        # Os parâmetros chegam do JSON como texto ou número: '1' e 1 são a mesma loja
+        if filtros is None:
+            filtros = {}
+
+        def normalizar(valor):
+            if valor is None:
+                return None
+            return str(valor)
+
+        return (normalizar(id_loja), normalizar(filtros.get('categoria')), normalizar(filtros.get('preco_max')))
+
+    def obter(self, chave):
+        # Devolve (versão, produtos) ou None
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                return None
+
+            versao, expira_em, produtos = entrada
+            if versao != self.versao or (expira_em is not None and time.monotonic() >= expira_em):
+                del self._entradas[chave]
+                self.falhas += 1
+                return None
+
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return versao, produtos
+
+    def versao_atual(self):
+        with self._lock:
+            return self.versao
+
+    def guardar(self, chave, versao_lida, produtos):
+        # versao_lida é a versão obtida antes da consulta: se houve uma escrita entretanto,
+        # o resultado pode já estar desatualizado e não é guardado
+        with self._lock:
+            if versao_lida != self.versao:
+                return
+
+            expira_em = None
+            if self.ttl_segundos is not None:
+                expira_em = time.monotonic() + self.ttl_segundos
+
+            self._entradas[chave] = (versao_lida, expira_em, produtos)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+            self._entradas.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'versao': self.versao,
+                'entradas': len(self._entradas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'acertos': self.acertos,
+                'falhas': self.falhas
+            }
+
+cache_catalogo_global = CacheCatalogo()
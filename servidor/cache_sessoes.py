@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from servidor.configuracao import ConfiguracaoServidor
+
+# Cache token -> dados do utilizador, partilhada por todas as ligações do processo.
+# Cada entrada vale até a sessão expirar; acima do tamanho máximo sai a menos usada (LRU).
+# Tem de ser invalidada sempre que uma sessão termina ou os dados do utilizador mudam.
+# Guarda também, por pouco tempo, os tokens que não existem (cache negativa), para que um
+# terminal a repetir um token antigo não vá à base de dados em cada pedido.
+class CacheSessoes:
+    def __init__(self, tamanho_maximo=None, ttl_maximo_segundos=None):
+        if tamanho_maximo is None:
+            tamanho_maximo = ConfiguracaoServidor.CACHE_SESSOES_TAMANHO_MAXIMO
+
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_maximo_segundos = ttl_maximo_segundos  # None = até ao fim da sessão
+        self._entradas = OrderedDict()  # token -> (dados do utilizador, instante monotónico de expiração)
+        self._tokens_por_utilizador = {}  # id do utilizador -> set de tokens
+        self._tokens_invalidos = OrderedDict()  # token -> instante monotónico de expiração
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, token):
+        # Devolve (dados do utilizador, segundos até a sessão expirar) ou None
+        with self._lock:
+            entrada = self._entradas.get(token)
+            if entrada is None:
+                self.falhas += 1
+                return None
+
+            dados_utilizador, expira_em = entrada
+            segundos_restantes = expira_em - time.monotonic()
+            if segundos_restantes <= 0:
+                self._remover(token)
+                self.falhas += 1
+                return None
+
+            self._entradas.move_to_end(token)
+            self.acertos += 1
+            return dados_utilizador, segundos_restantes
+
+    def guardar(self, token, dados_utilizador, segundos_restantes):
+        if self.ttl_maximo_segundos is not None:
+            segundos_restantes = min(segundos_restantes, self.ttl_maximo_segundos)
+
+        with self._lock:
+            self._remover(token)
+            self._entradas[token] = (dados_utilizador, time.monotonic() + segundos_restantes)
+            self._tokens_por_utilizador.setdefault(dados_utilizador['id'], set()).add(token)
+
+            while len(self._entradas) > self.tamanho_maximo:
+                token_antigo = next(iter(self._entradas))
+                self._remover(token_antigo)
+
+    def _remover(self, token):
+        entrada = self._entradas.pop(token, None)
+        if entrada is None:
+            return
+
+        id_utilizador = entrada[0]['id']
+        tokens = self._tokens_por_utilizador.get(id_utilizador)
+        if tokens is not None:
+            tokens.discard(token)
+            if len(tokens) == 0:
+                del self._tokens_por_utilizador[id_utilizador]
+
+    def token_invalido(self, token):
+        with self._lock:
+            expira_em = self._tokens_invalidos.get(token)
+            if expira_em is None:
+                return False
+            if time.monotonic() >= expira_em:
+                del self._tokens_invalidos[token]
+                return False
+            return True
+
+    def marcar_token_invalido(self, token):
+        with self._lock:
+            self._tokens_invalidos[token] = time.monotonic() + ConfiguracaoServidor.CACHE_TOKENS_INVALIDOS_SEGUNDOS
+            self._tokens_invalidos.move_to_end(token)
+            while len(self._tokens_invalidos) > self.tamanho_maximo:
+                self._tokens_invalidos.popitem(last=False)
+
+    def remover_token(self, token):
+        with self._lock:
+            self._remover(token)
+
+    def remover_utilizador(self, id_utilizador):
+        with self._lock:
+            for token in list(self._tokens_por_utilizador.get(id_utilizador, ())):
+                self._remover(token)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._tokens_por_utilizador.clear()
+            self._tokens_invalidos.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'tokens_invalidos': len(self._tokens_invalidos),
+                'tamanho_maximo': self.tamanho_maximo,
+                'acertos': self.acertos,
+                'falhas': self.falhas
+            }
+
+cache_sessoes_global = CacheSessoes()
@@ -1,12 +1,21 @@
+import inspect
 from enums import Mensagem
 
+# Argumentos que o processador de comandos sabe injetar nas funções de ação
+ARGUMENTOS_INJETAVEIS = ('base_de_dados', 'utilizador_atual', 'parametros', 'gestor_comandos', 'sessao_ligacao')
+
 class Comando:
-    def __init__(self, nome, acao, descricao='', permissao_minima=None, categoria=None, mensagens_sucesso=None, parametros=None):
+    def __init__(self, nome, acao, descricao='', permissao_minima=None, categoria=None, mensagens_sucesso=None, parametros=None, altera_utilizador=False, condicional=False):
         self.nome = nome
         self.acao = acao  # A função a ser executada
         self.descricao = descricao
         self.permissao_minima = permissao_minima  # Níveis: None (público), 'cliente', 'vendedor', 'admin'
         self.categoria = categoria
+        self.altera_utilizador = altera_utilizador  # Se True, o utilizador associado à ligação volta a ser validado
+        self.condicional = condicional  # Se True, a resposta leva 'versao' e aceita 'versao_conhecida'
+        self._argumentos_acao = None  # Nomes dos argumentos que a ação recebe; calculado por preparar()
+        self._chamar_acao = None  # Recebe os ARGUMENTOS_INJETAVEIS e chama a ação só com os que ela usa; criado por preparar()
+        self.mascara_cargos = 0  # Bits dos cargos que podem executar o comando; definida pelo GestorComandos
         
         if parametros is None:
             self.parametros = {}
@@ -28,6 +37,31 @@ class Comando:
         else:
             self.mensagens_sucesso = []
 
+    def preparar(self):
+        # inspect é usado uma só vez, no registo do comando, para saber que argumentos a ação
+        # recebe. Exemplo: se a ação não precisa de base_de_dados, não o passamos.
+        # Uma ação com **kwargs recebe todos os argumentos disponíveis.
+        assinatura = inspect.signature(self.acao)
+        argumentos = []
+        for nome_parametro, param in assinatura.parameters.items():
+            if param.kind == inspect.Parameter.VAR_KEYWORD:
+                argumentos = list(ARGUMENTOS_INJETAVEIS)
+                break
+            if nome_parametro in ARGUMENTOS_INJETAVEIS:
+                argumentos.append(nome_parametro)
+        self._argumentos_acao = tuple(argumentos)
+
+        # A chamada também fica preparada aqui: as posições dos argumentos usados são calculadas
+        # uma só vez e executar() só tem de os recolher por essa ordem
+        acao = self.acao
+        posicoes = tuple((nome, ARGUMENTOS_INJETAVEIS.index(nome)) for nome in self._argumentos_acao)
+        self._chamar_acao = lambda *valores: acao(**{nome: valores[indice] for nome, indice in posicoes})
+
+    def executar(self, base_de_dados, utilizador_atual, parametros, gestor_comandos, sessao_ligacao):
+        if self._chamar_acao is None:
+            self.preparar()
+        return self._chamar_acao(base_de_dados, utilizador_atual, parametros, gestor_comandos, sessao_ligacao)
+
     def validar_parametros(self, parametros_recebidos):
         # Verifica se todos os parâmetros obrigatórios foram recebidos.
         # Por enquanto, não valida o tipo, para manter a simplicidade.
@@ -36,30 +70,6 @@ class Comando:
                 return False
         return True
 
-    def validar_permissao(self, utilizador):
-        # Se não há permissão mínima, qualquer um pode executar.
-        if self.permissao_minima is None:
-            return True
-        
-        # Se o comando requer permissão, mas não há utilizador, nega o acesso.
-        if utilizador is None:
-            return False
-
-        cargo_utilizador = getattr(utilizador, 'cargo', None)
-        niveis_permissao = {
-            'cliente': ['cliente', 'vendedor', 'admin'],
-            'vendedor': ['vendedor', 'admin'],
-            'admin': ['admin']
-        }
-        
-        # Verifica se o cargo do utilizador está na lista de cargos permitidos
-        # para a permissão mínima exigida.
-        if self.permissao_minima in niveis_permissao:
-            if cargo_utilizador in niveis_permissao[self.permissao_minima]:
-                return True
-        
-        return False
-
     def para_json(self):
         # Converte os metadados do comando para um formato JSON-serializável.
         mensagens_sucesso_str = []
@@ -1,53 +1,81 @@
+import hashlib
+import json
 from enums import Mensagem
 from servidor.acoes import Acoes
 from servidor.comando import Comando # Utiliza a nova versão de comando.py
 from servidor.entidades import Sessao
-import inspect
 
 class GestorComandos:
+    # Cargos conhecidos (None = utilizador não autenticado) e o bit de cada um
+    CARGOS = (None, 'cliente', 'vendedor', 'admin')
+    BIT_CARGO = {None: 1, 'cliente': 2, 'vendedor': 4, 'admin': 8}
+
+    # Permissão mínima -> máscara dos cargos que a têm (hierarquia cliente < vendedor < admin)
+    MASCARA_PERMISSAO = {
+        None: 1 | 2 | 4 | 8,
+        'cliente': 2 | 4 | 8,
+        'vendedor': 4 | 8,
+        'admin': 8
+    }
+
     def __init__(self):
         self.comandos = {}
+        self._comandos_por_bit = {}  # bit do cargo -> lista dos comandos que esse cargo pode executar
+        for bit in GestorComandos.BIT_CARGO.values():
+            self._comandos_por_bit[bit] = []
+        self._ajuda_por_cargo = None  # cargo -> {'versao', 'conteudo', 'serializado'}
         self._registar_comandos_predefinidos()
+        self._preparar_ajuda()
 
     def _registar_comandos_predefinidos(self):
         
         # Utilidades
         self.registar(Comando('ping', Acoes.ping, 'Retorna pong', None, 'utilidades', [Mensagem.PONG]))
-        self.registar(Comando('help', Acoes.help, 'Lista todos os comandos disponíveis', None, 'utilidades', [Mensagem.SUCESSO]))
+        self.registar(Comando('help', Acoes.help, 'Lista todos os comandos disponíveis', None, 'utilidades', [Mensagem.SUCESSO, Mensagem.NAO_MODIFICADO]))
+        self.registar(Comando('lote', Acoes.lote, 'Executa vários comandos num só pedido', None, 'utilidades', [Mensagem.SUCESSO], {'pedidos': {'obrigatorio': True}}))
         
         # Conta e Autenticação
         self.registar(Comando('autenticar', Acoes.autenticar, 'Autentica o utilizador', None, 'minha conta', [Mensagem.SUCESSO]))
         self.registar(Comando('registar', Acoes.registar, 'Regista um novo cliente', None, 'minha conta', [Mensagem.UTILIZADOR_CRIADO], parametros={'username': {'obrigatorio': True}, 'password': {'obrigatorio': True}}))
-        self.registar(Comando('editar_senha', Acoes.editar_senha, 'Edita a senha do utilizador', 'cliente', 'minha conta', [Mensagem.ATUALIZADO], {'nova_senha': {'obrigatorio': True}}))
-        self.registar(Comando('editar_nome_utilizador', Acoes.editar_nome_utilizador, 'Edita o nome do utilizador', 'cliente', 'minha conta', [Mensagem.ATUALIZADO], {'novo_username': {'obrigatorio': True}}))
-        self.registar(Comando('apagar_utilizador', Acoes.apagar_utilizador, 'Remove a conta do cliente logado', 'cliente', 'minha conta', [Mensagem.REMOVIDO]))
-        self.registar(Comando('promover_para_admin', Acoes.promover_para_admin, 'Promove o utilizador a admin', 'cliente', 'minha conta', [Mensagem.SUCESSO], {'chave': {'obrigatorio': True}}))
+        self.registar(Comando('editar_senha', Acoes.editar_senha, 'Edita a senha do utilizador', 'cliente', 'minha conta', [Mensagem.ATUALIZADO], {'nova_senha': {'obrigatorio': True}}, altera_utilizador=True))
+        self.registar(Comando('editar_nome_utilizador', Acoes.editar_nome_utilizador, 'Edita o nome do utilizador', 'cliente', 'minha conta', [Mensagem.ATUALIZADO], {'novo_username': {'obrigatorio': True}}, altera_utilizador=True))
+        self.registar(Comando('apagar_utilizador', Acoes.apagar_utilizador, 'Remove a conta do cliente logado', 'cliente', 'minha conta', [Mensagem.REMOVIDO], altera_utilizador=True))
+        self.registar(Comando('promover_para_admin', Acoes.promover_para_admin, 'Promove o utilizador a admin', 'cliente', 'minha conta', [Mensagem.SUCESSO], {'chave': {'obrigatorio': True}}, altera_utilizador=True))
         
         # Compras
-        self.registar(Comando('realizar_encomenda', Acoes.realizar_encomenda, 'Realiza uma encomenda', 'cliente', 'compras', [Mensagem.CONCLUIDA, Mensagem.PENDENTE], {'itens': {'obrigatorio': True}}))
+        self.registar(Comando('realizar_encomenda', Acoes.realizar_encomenda, 'Realiza uma encomenda', 'cliente', 'compras', [Mensagem.CONCLUIDA, Mensagem.PENDENTE], {'itens': {'obrigatorio': True}, 'chave_idempotencia': {'obrigatorio': False}}))
+        self.registar(Comando('carrinho_adicionar', Acoes.carrinho_adicionar, 'Adiciona um produto ao carrinho (reserva o stock)', 'cliente', 'compras', [Mensagem.ADICIONADO], {'id_produto': {'obrigatorio': True}, 'quantidade': {'obrigatorio': True}}))
+        self.registar(Comando('carrinho_remover', Acoes.carrinho_remover, 'Remove um produto do carrinho (sem quantidade, remove tudo)', 'cliente', 'compras', [Mensagem.REMOVIDO], {'id_produto': {'obrigatorio': True}, 'quantidade': {'obrigatorio': False}}))
+        self.registar(Comando('carrinho_ver', Acoes.carrinho_ver, 'Mostra o carrinho e o prazo das reservas', 'cliente', 'compras', [Mensagem.SUCESSO]))
+        self.registar(Comando('carrinho_finalizar', Acoes.carrinho_finalizar, 'Converte o carrinho numa encomenda', 'cliente', 'compras', [Mensagem.PENDENTE], {'chave_idempotencia': {'obrigatorio': False}}))
         self.registar(Comando('ver_historico_compras', Acoes.ver_historico_compras, 'Exibe o histórico de compras', 'cliente', 'compras', [Mensagem.SUCESSO]))
 
         # Lojas
-        self.registar(Comando('listar_lojas', Acoes.listar_lojas, 'Lista todas as lojas', 'cliente', 'lojas', [Mensagem.SUCESSO]))
+        self.registar(Comando('listar_lojas', Acoes.listar_lojas, 'Lista todas as lojas', 'cliente', 'lojas', [Mensagem.SUCESSO], condicional=True))
         
         # Produtos
-        self.registar(Comando('list_products', Acoes.listar_produtos, 'Lista produtos disponíveis', 'cliente', 'produtos', [Mensagem.SUCESSO]))
-        self.registar(Comando('listar_produtos', Acoes.listar_produtos, 'Lista produtos disponíveis', 'cliente', 'produtos', [Mensagem.SUCESSO]))
+        self.registar(Comando('list_products', Acoes.listar_produtos, 'Lista produtos disponíveis', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('listar_produtos', Acoes.listar_produtos, 'Lista produtos disponíveis', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
         self.registar(Comando('procurar_produto_por_nome', Acoes.procurar_produto_por_nome, 'Busca um produto pelo nome', 'cliente', 'produtos', [Mensagem.SUCESSO], {'nome_produto': {'obrigatorio': True}}))
         self.registar(Comando('pesquisar_produtos', Acoes.pesquisar_produtos, 'Pesquisa produtos por nome (busca parcial)', 'cliente', 'produtos', [Mensagem.SUCESSO], {'nome': {'obrigatorio': True}}))
-        self.registar(Comando('listar_nomes_produtos', Acoes.listar_nomes_produtos, 'Lista nomes de produtos existentes', 'cliente', 'produtos', [Mensagem.SUCESSO]))
-        self.registar(Comando('listar_categorias', Acoes.listar_categorias, 'Lista categorias de produtos', 'cliente', 'produtos', [Mensagem.SUCESSO]))
-        self.registar(Comando('listar_descricoes', Acoes.listar_descricoes, 'Lista descrições de produtos', 'cliente', 'produtos', [Mensagem.SUCESSO]))
+        self.registar(Comando('listar_nomes_produtos', Acoes.listar_nomes_produtos, 'Lista nomes de produtos existentes', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('listar_categorias', Acoes.listar_categorias, 'Lista categorias de produtos', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('listar_descricoes', Acoes.listar_descricoes, 'Lista descrições de produtos', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('sugerir_nomes_produtos', Acoes.sugerir_nomes_produtos, 'Sugere nomes de produtos começados por um prefixo', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('sugerir_categorias', Acoes.sugerir_categorias, 'Sugere categorias começadas por um prefixo', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
+        self.registar(Comando('sugerir_descricoes', Acoes.sugerir_descricoes, 'Sugere descrições começadas por um prefixo', 'cliente', 'produtos', [Mensagem.SUCESSO], condicional=True))
         self.registar(Comando('editar_produto', Acoes.editar_produto, 'Edita um produto', 'vendedor', 'produtos', [Mensagem.ATUALIZADO], {'id_produto': {'obrigatorio': True}}))
         self.registar(Comando('verificar_stock_baixo', Acoes.verificar_stock_baixo, 'Verifica produtos com baixo stock', 'vendedor', 'produtos', [Mensagem.ALERTA_STOCK_BAIXO, Mensagem.SUCESSO]))
         
         # Encomendas (Vendedor)
         self.registar(Comando('concluir_encomenda', Acoes.concluir_encomenda, 'Conclui uma encomenda pendente', 'vendedor', 'encomendas', [Mensagem.CONCLUIDA], {'id_encomenda': {'obrigatorio': True}}))
+        self.registar(Comando('concluir_encomendas_em_lote', Acoes.concluir_encomendas_em_lote, 'Conclui várias encomendas pendentes (por ids ou pendentes há mais de X horas)', 'vendedor', 'encomendas', [Mensagem.SUCESSO], {'ids_encomendas': {'obrigatorio': False}, 'mais_antigas_que_horas': {'obrigatorio': False}}))
         self.registar(Comando('listar_encomendas', Acoes.listar_encomendas, 'Lista encomendas da loja', 'vendedor', 'encomendas', [Mensagem.SUCESSO]))
         self.registar(Comando('concluir_pedido', Acoes.concluir_encomenda, 'Conclui um pedido pendente', 'vendedor', 'encomendas', [Mensagem.CONCLUIDA], {'order_id': {'obrigatorio': True}}))
         self.registar(Comando('listar_pedidos', Acoes.listar_encomendas, 'Lista pedidos da loja', 'vendedor', 'encomendas', [Mensagem.SUCESSO]))
         
         # Gestão (Admin)
+        self.registar(Comando('estado_servidor', Acoes.estado_servidor, 'Mostra o estado interno do servidor', 'admin', 'gestao', [Mensagem.SUCESSO]))
         self.registar(Comando('criar_funcionario', Acoes.criar_funcionario, 'Cria um novo funcionário', 'admin', 'gestao', [Mensagem.UTILIZADOR_CRIADO], {'nome_utilizador_novo': {'obrigatorio': True}, 'palavra_passe_nova': {'obrigatorio': True}, 'cargo': {'obrigatorio': True}}))
         self.registar(Comando('listar_utilizadores', Acoes.listar_utilizadores, 'Lista todos os utilizadores', 'admin', 'gestao', [Mensagem.SUCESSO]))
         self.registar(Comando('adicionar_produto', Acoes.adicionar_produto, 'Adiciona um novo produto a uma loja', 'admin', 'gestao', [Mensagem.ADICIONADO], {'nome':True, 'categoria':True, 'descricao':True, 'preco':True, 'stock':True, 'id_loja':True}))
@@ -60,7 +88,60 @@ class GestorComandos:
         self.registar(Comando('apagar_loja', Acoes.apagar_loja, 'Apaga uma loja do sistema', 'admin', 'gestao', [Mensagem.REMOVIDO], {'id_loja': {'obrigatorio': True}}))
         
     def registar(self, comando):
+        comando.preparar()
+        # Uma permissão mínima desconhecida não dá acesso a ninguém
+        comando.mascara_cargos = GestorComandos.MASCARA_PERMISSAO.get(comando.permissao_minima, 0)
+
+        comando_anterior = self.comandos.get(comando.nome)
         self.comandos[comando.nome] = comando
+        for bit, lista_comandos in self._comandos_por_bit.items():
+            if comando_anterior is not None and comando_anterior in lista_comandos:
+                lista_comandos.remove(comando_anterior)
+            if comando.mascara_cargos & bit:
+                lista_comandos.append(comando)
+        self._ajuda_por_cargo = None  # Volta a ser preparada no próximo pedido de ajuda
+
+    def _preparar_ajuda(self):
+        # A lista de comandos de cada cargo só muda quando se regista um comando, por isso é
+        # construída e serializada uma vez, em vez de a cada 'help' (um por cada login).
+        # A versão é um hash do conteúdo: o cliente envia-a para não voltar a receber a lista.
+        ajuda_por_cargo = {}
+        for cargo in GestorComandos.CARGOS:
+            comandos_agrupados = {}
+            for comando in self.comandos_por_cargo(cargo):
+                categoria = comando.categoria or 'outros'
+                comandos_agrupados.setdefault(categoria, []).append(comando.para_json())
+
+            conteudo_json = json.dumps(comandos_agrupados, ensure_ascii=False, sort_keys=True, default=str)
+            versao = hashlib.sha1(conteudo_json.encode('utf-8')).hexdigest()[:12]
+            conteudo = {'versao': versao, 'comandos': comandos_agrupados}
+            ajuda_por_cargo[cargo] = {
+                'versao': versao,
+                'conteudo': conteudo,
+                'serializado': json.dumps(conteudo, ensure_ascii=False, default=str).encode('utf-8')
+            }
+        self._ajuda_por_cargo = ajuda_por_cargo
+        return ajuda_por_cargo
+
+    def ajuda(self, cargo):
+        ajuda_por_cargo = self._ajuda_por_cargo
+        if ajuda_por_cargo is None:
+            ajuda_por_cargo = self._preparar_ajuda()
+        return ajuda_por_cargo.get(cargo, ajuda_por_cargo[None])
+
+    @staticmethod
+    def bit_do_utilizador(utilizador):
+        # Sem utilizador, com credenciais inválidas ou com um cargo desconhecido, só os
+        # comandos públicos podem ser executados
+        cargo = getattr(utilizador, 'cargo', None)
+        return GestorComandos.BIT_CARGO.get(cargo, GestorComandos.BIT_CARGO[None])
+
+    def pode_executar(self, comando, utilizador):
+        return (comando.mascara_cargos & GestorComandos.bit_do_utilizador(utilizador)) != 0
+
+    def comandos_por_cargo(self, cargo):
+        # Comandos que o cargo pode executar, pela ordem de registo
+        return list(self._comandos_por_bit[GestorComandos.BIT_CARGO.get(cargo, GestorComandos.BIT_CARGO[None])])
 
     def obter(self, nome):
         return self.comandos.get(nome)
@@ -73,49 +154,38 @@ class GestorComandos:
 
 class ProcessadorComandos:
     @staticmethod
-    def processar_pedido(base_de_dados, gestor_comandos, acao, parametros):
-        utilizador_atual = Sessao.obter_utilizador(base_de_dados, parametros)
-        
-        Sessao.remover_expiradas(base_de_dados)
-
+    def processar_pedido(base_de_dados, gestor_comandos, acao, parametros, sessao_ligacao=None):
+        # Devolve (comando, resultado); o comando é None se a ação não existir
         comando = gestor_comandos.obter(acao)
         if comando is None:
-            return Mensagem.COMANDO_NAO_ENCONTRADO
+            return None, Mensagem.COMANDO_NAO_ENCONTRADO
+
+        utilizador_atual = Sessao.obter_utilizador(base_de_dados, parametros, sessao_ligacao)
+        if utilizador_atual is Mensagem.DEMASIADAS_TENTATIVAS:
+            return comando, utilizador_atual
+
+        return comando, ProcessadorComandos.executar_comando(base_de_dados, gestor_comandos, comando, utilizador_atual, parametros, sessao_ligacao)
+
+    @staticmethod
+    def executar_comando(base_de_dados, gestor_comandos, comando, utilizador_atual, parametros, sessao_ligacao=None):
+        # Executa um comando para um utilizador já autenticado (usado também pelo comando 'lote')
+        resultado = ProcessadorComandos._executar_acao(base_de_dados, gestor_comandos, comando, utilizador_atual, parametros, sessao_ligacao)
 
-        if comando.validar_permissao(utilizador_atual) is False:
+        # O nome, a senha ou o cargo podem ter mudado: o próximo pedido volta a validar o token
+        if comando.altera_utilizador and sessao_ligacao is not None:
+            sessao_ligacao.invalidar()
+        return resultado
+
+    @staticmethod
+    def _executar_acao(base_de_dados, gestor_comandos, comando, utilizador_atual, parametros, sessao_ligacao):
+        if gestor_comandos.pode_executar(comando, utilizador_atual) is False:
             return Mensagem.PERMISSAO_NEGADA
 
         if comando.validar_parametros(parametros) is False:
             return Mensagem.PARAMETROS_INVALIDOS
 
-        argumentos_acao = {
-            'base_de_dados': base_de_dados,
-            'utilizador_atual': utilizador_atual,
-            'parametros': parametros,
-            'gestor_comandos': gestor_comandos
-        }
-
-        # inspect é usado para verificar os parâmetros da função de ação
-        # exemplo: se a ação não precisa de base_de_dados, não o passamos
-
         try:
-            assinatura = inspect.signature(comando.acao)
-            argumentos_para_passar = {}
-
-            for nome_parametro in assinatura.parameters:
-                param = assinatura.parameters[nome_parametro]
-                # Se o parâmetro é **kwargs, passa todos os argumentos disponíveis
-                if param.kind == inspect.Parameter.VAR_KEYWORD:
-                    argumentos_para_passar.update(argumentos_acao)
-                # Se o parâmetro está disponível, passa-o
-                elif nome_parametro in argumentos_acao:
-                    argumentos_para_passar[nome_parametro] = argumentos_acao[nome_parametro]
-            
-            if len(argumentos_para_passar) == 0:
-                return comando.acao()
-
-            return comando.acao(**argumentos_para_passar)
-
+            return comando.executar(base_de_dados, utilizador_atual, parametros, gestor_comandos, sessao_ligacao)
         except Exception:
             return Mensagem.ERRO_GENERICO
         
@@ -3,3 +3,68 @@ class ConfiguracaoServidor:
     PORTA_PADRAO = 5000
     MODO_DEPURACAO: bool = False
     CHAVE_SECRETA_ADMIN = "ESTA_SENHA_É_USADA_NA_CRIAÇÃO_DE_NOVOS_ADMIN_PROVAVELMENTE_SERÁ_REMOVIDA_DEPOIS__POIS_ESTA_SENHA_É_MUITO_GRANDE!_OK?"
+
+    # Base de dados
+    BD_ENDERECO = 'localhost'
+    BD_UTILIZADOR = 'root'
+    BD_PALAVRA_PASSE = ''
+    BD_NOME = 'sistema_vendas'
+
+    # Pool de conexões partilhado por todos os pedidos do processo
+    POOL_TAMANHO_MAXIMO = 10
+    POOL_TEMPO_ESPERA_SEGUNDOS = 5  # Tempo máximo à espera de uma conexão livre
+    POOL_VERIFICAR_APOS_SEGUNDOS = 30  # Conexões paradas há mais tempo são testadas (ping) antes de serem emprestadas
+    POOL_TENTATIVAS_CONEXAO = 1  # Tentativas ao abrir uma conexão nova durante um pedido
+
+    # Motor do servidor: 'threading' (uma thread por ligação) ou 'asyncio' (um ciclo de eventos para todas)
+    MOTOR_PADRAO = 'threading'
+    MOTORES_DISPONIVEIS = ('threading', 'asyncio')
+    TAMANHO_MAXIMO_PEDIDO = 1024 * 1024  # Bytes por linha de pedido
+
+    # Execução dos pedidos (comum aos dois motores)
+    TRABALHADORES_PEDIDOS = 10  # Threads que executam comandos; não faz sentido exceder POOL_TAMANHO_MAXIMO
+    TAMANHO_FILA_PEDIDOS = 100  # Pedidos à espera de uma thread livre; acima disto o servidor responde "ocupado"
+    SEGUNDOS_TENTAR_NOVAMENTE = 1  # Sugestão enviada ao cliente quando o servidor está ocupado
+    LOTE_MAXIMO_PEDIDOS = 50  # Comandos aceites num único pedido 'lote'
+    PEDIDOS_SIMULTANEOS_POR_LIGACAO = 8  # Pedidos com 'id' em curso ao mesmo tempo numa ligação
+    ENVIO_PRAZO_SEGUNDOS = 10  # Tempo máximo a enviar uma resposta; um cliente que não lê mais do que isto é desligado
+    ENCERRAMENTO_PRAZO_SEGUNDOS = 5  # Tempo dado aos pedidos em curso para terminarem ao encerrar
+
+    # Cache de sessões (tokens já validados)
+    CACHE_SESSOES_TAMANHO_MAXIMO = 10000  # Tokens guardados em memória por processo
+    CACHE_SESSOES_TTL_MULTIPROCESSO_SEGUNDOS = 60  # As invalidações não passam entre processos: limita o tempo em cache
+    CACHE_TOKENS_INVALIDOS_SEGUNDOS = 30  # Tempo durante o qual um token inexistente é recusado sem consultar o MySQL
+    SESSAO_LIGACAO_REVALIDAR_SEGUNDOS = 60  # Tempo máximo sem voltar a validar o token de uma ligação
+
+    # Limite de tentativas de autenticação falhadas
+    FALHAS_AUTENTICACAO_MAXIMO = 5  # Falhas (por endereço ou por utilizador) antes de bloquear novas tentativas
+    FALHAS_AUTENTICACAO_JANELA_SEGUNDOS = 60  # Janela em que as falhas são contadas (e duração do bloqueio)
+    FALHAS_AUTENTICACAO_MAXIMO_ENTRADAS = 10000  # Endereços/utilizadores seguidos em memória
+
+    # Cache do catálogo de produtos
+    CACHE_CATALOGO_TAMANHO_MAXIMO = 1000  # Listagens de produtos (loja + filtros) guardadas em memória por processo
+    CACHE_CATALOGO_TTL_MULTIPROCESSO_SEGUNDOS = 5  # Escritas noutro processo só são vistas quando a entrada expira
+
+    # Sugestões (pesquisa por prefixo)
+    SUGESTOES_LIMITE_PREDEFINIDO = 10  # Sugestões devolvidas por sugerir_* quando o cliente não indica o limite
+    SUGESTOES_LIMITE_MAXIMO = 50
+    SUGESTOES_TTL_MULTIPROCESSO_SEGUNDOS = 30  # Valores inseridos noutro processo aparecem quando o índice é recarregado
+
+    # Repetição de transações anuladas pelo MySQL
+    TRANSACOES_TENTATIVAS_MAXIMAS = 3  # Tentativas de uma transação anulada por deadlock ou espera por bloqueio
+    TRANSACOES_ESPERA_BASE_SEGUNDOS = 0.05  # Espera máxima antes da 2.ª tentativa; duplica a cada tentativa
+    TRANSACOES_ESPERA_MAXIMA_SEGUNDOS = 1
+
+    # Reservas de stock dos carrinhos
+    RESERVAS_DURACAO_SEGUNDOS = 900  # Tempo durante o qual o stock de um carrinho fica reservado (renovado a cada alteração)
+
+    # Tarefas periódicas (no modo multi-processo correm apenas no primeiro trabalhador)
+    SESSOES_LIMPEZA_INTERVALO_SEGUNDOS = 300  # De quanto em quanto tempo as sessões expiradas são apagadas
+    SESSOES_LIMPEZA_TAMANHO_LOTE = 1000  # Sessões apagadas por DELETE
+    RESERVAS_LIMPEZA_INTERVALO_SEGUNDOS = 30  # De quanto em quanto tempo o stock das reservas expiradas é devolvido
+    RESERVAS_LIMPEZA_TAMANHO_LOTE = 500  # Reservas devolvidas por transação
+
+    # Modo multi-processo (apenas sistemas com fork e SO_REUSEPORT, ex: Linux)
+    PROCESSOS_TRABALHADORES = 1  # 1 = processo único (comportamento normal)
+    PROCESSOS_PRAZO_ENCERRAMENTO_SEGUNDOS = 10  # Tempo dado aos trabalhadores antes de SIGKILL (maior que ENCERRAMENTO_PRAZO_SEGUNDOS)
+    PROCESSOS_ESPERA_REINICIO_SEGUNDOS = 1  # Tempo mínimo de vida antes de um reinício imediato
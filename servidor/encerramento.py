@@ -0,0 +1,68 @@
+import selectors
+import socket
+import threading
+from contextlib import contextmanager
+
+# Coordena o encerramento do motor threading sem polling: cada ligação espera por dados do
+# cliente ou pelo "despertador" (um par de sockets). Ao encerrar, é escrito um byte no
+# despertador, que nunca é lido, e por isso acorda de imediato todas as ligações paradas.
+class ControloEncerramento:
+    def __init__(self):
+        self._despertar_leitura, self._despertar_escrita = socket.socketpair()
+        self._despertar_leitura.setblocking(False)
+        self._despertar_escrita.setblocking(False)
+        self._encerrando = threading.Event()
+        self._condicao = threading.Condition()
+        self._pedidos_em_curso = 0
+
+    @property
+    def encerrando(self):
+        return self._encerrando.is_set()
+
+    def criar_seletor(self, sock):
+        # O PollSelector não tem o limite de descritores do select() e não gasta um descritor
+        # por ligação (ao contrário do epoll); no Windows fica o SelectSelector.
+        if hasattr(selectors, 'PollSelector'):
+            seletor = selectors.PollSelector()
+        else:
+            seletor = selectors.SelectSelector()
+        seletor.register(sock, selectors.EVENT_READ)
+        seletor.register(self._despertar_leitura, selectors.EVENT_READ)
+        return seletor
+
+    def sinalizar(self):
+        if self._encerrando.is_set():
+            return
+        self._encerrando.set()
+        try:
+            self._despertar_escrita.send(b'\0')
+        except OSError:
+            pass
+
+    def iniciar_pedido(self):
+        with self._condicao:
+            self._pedidos_em_curso += 1
+
+    def terminar_pedido(self):
+        with self._condicao:
+            self._pedidos_em_curso -= 1
+            if self._pedidos_em_curso == 0:
+                self._condicao.notify_all()
+
+    @contextmanager
+    def pedido_em_curso(self):
+        self.iniciar_pedido()
+        try:
+            yield
+        finally:
+            self.terminar_pedido()
+
+    def aguardar_pedidos(self, prazo_segundos):
+        # Devolve o número de pedidos que ainda não terminaram quando o prazo acabou
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._pedidos_em_curso == 0, timeout=prazo_segundos)
+            return self._pedidos_em_curso
+
+    def fechar(self):
+        self._despertar_leitura.close()
+        self._despertar_escrita.close()
@@ -2,6 +2,12 @@ import secrets
 import datetime
 import mysql.connector
 from enums import Mensagem
+from servidor.cache_sessoes import cache_sessoes_global
+from servidor.limitador_falhas import limitador_falhas_global
+from servidor.cache_catalogo import cache_catalogo_global, CacheCatalogo
+from servidor.indice_prefixos import indices_prefixos_global
+from servidor.indice_trigramas import indice_trigramas_global
+from servidor.repeticao_transacoes import repetidor_transacoes_global
 
 class Sessao:
     _SEGUNDOS_POR_DIA = 86400  # 24h * 60m * 60s
@@ -16,39 +22,81 @@ class Sessao:
             self._carregar()
 
     @staticmethod
-    def obter_utilizador(bd, parametros):        
+    def obter_utilizador(bd, parametros, sessao_ligacao=None):
         token_sessao = parametros.get('token_sessao')
         nome_utilizador = parametros.get('username')
         palavra_passe = parametros.get('password')
-
-        cargo_para_classe = {
-            'admin': Admin,
-            'vendedor': Vendedor,
-            'cliente': Cliente
-        }
+        endereco = None
+        if sessao_ligacao is not None:
+            endereco = sessao_ligacao.endereco
 
         if token_sessao is not None:
-            sql = "SELECT nome_utilizador FROM sessoes WHERE token = %s"
-            bd.cursor.execute(sql, (token_sessao,))
-            resultado = bd.cursor.fetchone()
-            
-            if resultado is not None and Sessao.validar_token(bd, token_sessao):
-                utilizador_do_token = resultado['nome_utilizador']
-                bd.cursor.execute("SELECT id, cargo FROM utilizadores WHERE nome_utilizador = %s", (utilizador_do_token,))
-                dados_utilizador = bd.cursor.fetchone()
-                
+            # Token já validado nesta ligação: não é preciso consultar a base de dados
+            if sessao_ligacao is not None:
+                dados_utilizador = sessao_ligacao.obter(token_sessao)
                 if dados_utilizador is not None:
-                    cargo = dados_utilizador['cargo']
-                    id_util = dados_utilizador['id']
-                    classe = cargo_para_classe.get(cargo)
-                    if classe: # Se a classe correspondente ao cargo existir
-                        return classe(id_util, bd) 
+                    return Utilizador.reconstruir(bd, dados_utilizador)
+
+            sessao_valida = Sessao.resolver_token(bd, token_sessao, endereco)
+            if sessao_valida is Mensagem.DEMASIADAS_TENTATIVAS:
+                return sessao_valida
+            if sessao_valida is not None:
+                dados_utilizador, segundos_restantes = sessao_valida
+                utilizador = Utilizador.reconstruir(bd, dados_utilizador)
+                if utilizador is not None:
+                    if sessao_ligacao is not None:
+                        sessao_ligacao.associar(token_sessao, dados_utilizador, segundos_restantes)
+                    return utilizador
 
         if nome_utilizador is not None and palavra_passe is not None:
-            return Utilizador.autenticar(bd, nome_utilizador, palavra_passe)
+            return Utilizador.autenticar(bd, nome_utilizador, palavra_passe, endereco)
             
         return None
 
+    @staticmethod
+    def resolver_token(bd, token, endereco=None):
+        # Valida o token e obtém o utilizador da sessão: da cache, ou com uma só consulta.
+        # Devolve (dados do utilizador, segundos até a sessão expirar), ou None se o token não é
+        # válido, ou Mensagem.DEMASIADAS_TENTATIVAS se não é válido e o endereço está bloqueado.
+        # O bloqueio só se aplica a tokens inválidos: uma sessão válida continua a funcionar.
+        sessao_em_cache = cache_sessoes_global.obter(token)
+        if sessao_em_cache is not None:
+            return sessao_em_cache
+
+        # Tokens que já se sabe não existirem são recusados sem consultar a base de dados
+        if cache_sessoes_global.token_invalido(token):
+            if limitador_falhas_global.bloqueado(endereco=endereco):
+                return Mensagem.DEMASIADAS_TENTATIVAS
+            return None
+
+        sql = """
+            SELECT u.id, u.nome_utilizador, u.cargo, u.loja_id, s.data_criacao
+            FROM sessoes s
+            JOIN utilizadores u ON u.nome_utilizador = s.nome_utilizador
+            WHERE s.token = %s
+        """
+        bd.cursor.execute(sql, (token,))
+        resultado = bd.cursor.fetchone()
+        if resultado is None:
+            cache_sessoes_global.marcar_token_invalido(token)
+            if limitador_falhas_global.bloqueado(endereco=endereco):
+                return Mensagem.DEMASIADAS_TENTATIVAS
+            limitador_falhas_global.registar_falha(endereco=endereco)
+            return None
+
+        data_criacao = resultado.pop('data_criacao')
+        if isinstance(data_criacao, str): 
+            data_criacao = datetime.datetime.fromisoformat(data_criacao)
+
+        delta = datetime.datetime.now() - data_criacao
+        segundos_restantes = Sessao._SEGUNDOS_POR_DIA - delta.total_seconds()
+        if segundos_restantes <= 0:
+            cache_sessoes_global.marcar_token_invalido(token)
+            return None
+
+        cache_sessoes_global.guardar(token, resultado, segundos_restantes)
+        return resultado, segundos_restantes
+
     @staticmethod
     def criar_token(): # cria um token de 32 bytes (64 caracteres hexadecimais)
         return secrets.token_hex(32) # hexadecimais = maicusculos + minúsculos + números
@@ -90,6 +138,7 @@ class Sessao:
         if self.token is not None:
             self.bd.cursor.execute("DELETE FROM sessoes WHERE token = %s", (self.token,))
             self.bd.conexao.commit()
+            cache_sessoes_global.remover_token(self.token)
             
         self.token = None
         self.nome_utilizador = None
@@ -97,23 +146,62 @@ class Sessao:
 
     @staticmethod
     def validar_token(bd, token):
-        sql = "SELECT data_criacao FROM sessoes WHERE token = %s"
-        bd.cursor.execute(sql, (token,))
-        resultado = bd.cursor.fetchone()
-        if resultado is None: 
-            return False
-        
-        data_criacao = resultado['data_criacao']
-        if isinstance(data_criacao, str): 
-            data_criacao = datetime.datetime.fromisoformat(data_criacao)
+        return isinstance(Sessao.resolver_token(bd, token), tuple)
 
-        delta = datetime.datetime.now() - data_criacao
-        return delta.total_seconds() < Sessao._SEGUNDOS_POR_DIA
+    @staticmethod
+    def remover_expiradas(bd, tamanho_lote=1000):
+        # Apaga em lotes pequenos (cada um com o seu commit) para não bloquear a tabela sessoes
+        # durante muito tempo; o índice em data_criacao evita percorrer a tabela inteira.
+        total_removidas = 0
+        while True:
+            bd.cursor.execute("DELETE FROM sessoes WHERE data_criacao < (NOW() - INTERVAL 1 DAY) LIMIT %s", (tamanho_lote,))
+            removidas = bd.cursor.rowcount
+            bd.conexao.commit()
+            total_removidas += removidas
+            if removidas < tamanho_lote:
+                return total_removidas
 
+class Reserva:
     @staticmethod
-    def remover_expiradas(bd):
-        bd.cursor.execute("DELETE FROM sessoes WHERE data_criacao < (NOW() - INTERVAL 1 DAY)")
-        bd.conexao.commit()
+    def devolver(bd, ids_reservas):
+        # Devolve ao stock e apaga reservas já bloqueadas (FOR UPDATE) pela transação atual
+        marcadores = ', '.join(['%s'] * len(ids_reservas))
+        # Um só UPDATE devolve o stock, somando as reservas de cada produto
+        bd.cursor.execute(f"""
+            UPDATE produtos p
+            JOIN (SELECT produto_id, SUM(quantidade) AS quantidade FROM reservas WHERE id IN ({marcadores}) GROUP BY produto_id) r
+                ON r.produto_id = p.id
+            SET p.stock = p.stock + r.quantidade
+        """, tuple(ids_reservas))
+        bd.cursor.execute(f"DELETE FROM reservas WHERE id IN ({marcadores})", tuple(ids_reservas))
+
+    @staticmethod
+    def remover_expiradas(bd, tamanho_lote=1000):
+        # Devolve ao stock as reservas de carrinho expiradas e apaga-as, em lotes com o seu commit.
+        # O FOR UPDATE e o prazo (expira_em) impedem que uma reserva a ser convertida numa
+        # encomenda (Cliente.finalizar_carrinho) seja devolvida ao mesmo tempo.
+        total_removidas = 0
+        while True:
+            def remover_lote():
+                bd.cursor.execute(
+                    "SELECT id FROM reservas WHERE expira_em <= NOW() ORDER BY id LIMIT %s FOR UPDATE",
+                    (tamanho_lote,)
+                )
+                ids_reservas = [linha['id'] for linha in bd.cursor.fetchall()]
+                if len(ids_reservas) == 0:
+                    bd.conexao.commit()
+                    return 0
+
+                Reserva.devolver(bd, ids_reservas)
+                bd.conexao.commit()
+                return len(ids_reservas)
+
+            removidas = repetidor_transacoes_global.executar(bd, 'remover_reservas_expiradas', remover_lote)
+            if removidas > 0:
+                cache_catalogo_global.invalidar()  # O stock disponível mudou
+            total_removidas += removidas
+            if removidas < tamanho_lote:
+                return total_removidas
 
 class Produto:
     @staticmethod
@@ -126,7 +214,11 @@ class Produto:
         
         bd.cursor.execute(f"INSERT INTO {tabela} ({coluna}) VALUES (%s)", (valor,))
         bd.conexao.commit()
-        return bd.cursor.lastrowid
+        id_novo = bd.cursor.lastrowid
+        indices_prefixos_global[tabela].adicionar(valor)
+        if tabela == 'nomes_produtos':
+            indice_trigramas_global.adicionar(id_novo, valor)
+        return id_novo
 
     @staticmethod
     def criar(bd, id_loja, nome, categoria, descricao, preco, stock):
@@ -138,6 +230,7 @@ class Produto:
             sql = "INSERT INTO produtos (loja_id, nome_produto_id, categoria_id, descricao_id, preco, stock) VALUES (%s, %s, %s, %s, %s, %s)"
             bd.cursor.execute(sql, (id_loja, id_nome, id_categoria, id_descricao, preco, stock))
             bd.conexao.commit()
+            cache_catalogo_global.invalidar()
             return Mensagem.ADICIONADO
         except mysql.connector.IntegrityError:
             return Mensagem.ERRO_DUPLICADO
@@ -146,6 +239,13 @@ class Produto:
 
     @staticmethod
     def listar_todos(bd, id_loja=None, filtros=None):
+        # O catálogo muda pouco: as listagens são servidas da cache até à próxima escrita
+        chave = CacheCatalogo.chave(id_loja, filtros)
+        em_cache = cache_catalogo_global.obter(chave)
+        if em_cache is not None:
+            return em_cache[1]
+
+        versao_lida = cache_catalogo_global.versao_atual()
         sql = """
             SELECT p.id, pn.nome, c.nome as categoria, d.texto as descricao, p.preco, p.stock, l.nome as loja
             FROM produtos p
@@ -174,11 +274,20 @@ class Produto:
         
         for linha in resultados: 
             linha['preco'] = float(linha['preco'])
-            
+
+        cache_catalogo_global.guardar(chave, versao_lida, resultados)
         return resultados
 
     @staticmethod
     def atualizar_produto(bd, id_produto, novo_preco=None, novo_stock=None, nova_descricao=None, nova_categoria=None, novo_id_loja=None, novo_nome=None):
+        # O UPDATE do stock disputa a linha do produto com as encomendas: repete-se em caso de deadlock
+        return repetidor_transacoes_global.executar(
+            bd, 'atualizar_produto',
+            lambda: Produto._atualizar_produto(bd, id_produto, novo_preco, novo_stock, nova_descricao, nova_categoria, novo_id_loja, novo_nome)
+        )
+
+    @staticmethod
+    def _atualizar_produto(bd, id_produto, novo_preco, novo_stock, nova_descricao, nova_categoria, novo_id_loja, novo_nome):
         bd.cursor.execute("SELECT loja_id FROM produtos WHERE id = %s", (id_produto,))
         if bd.cursor.fetchone() is None: # fetchone retorna o valor do ultimo execute do cursor
             return Mensagem.NAO_ENCONTRADO
@@ -218,6 +327,7 @@ class Produto:
         sql = f"UPDATE produtos SET {', '.join(campos)} WHERE id=%s"
         bd.cursor.execute(sql, tuple(valores))
         bd.conexao.commit()
+        cache_catalogo_global.invalidar()
         
         if bd.cursor.rowcount > 0: # Se alguma linha foi afetada
             return Mensagem.ATUALIZADO
@@ -233,6 +343,7 @@ class Produto:
             
             bd.cursor.execute("DELETE FROM produtos WHERE id=%s", (id_produto,))
             bd.conexao.commit()
+            cache_catalogo_global.invalidar()
 
             if bd.cursor.rowcount > 0: # Se alguma linha foi afetada
                 return Mensagem.REMOVIDO 
@@ -269,6 +380,10 @@ class Produto:
             
         return descricoes
 
+    @staticmethod
+    def sugerir(bd, tabela, prefixo, limite):
+        return indices_prefixos_global[tabela].sugerir(bd, prefixo, limite)
+
     @staticmethod
     def obter_id_pelo_nome_e_loja(bd, nome_produto, id_loja):
         sql = "SELECT p.id FROM produtos p JOIN nomes_produtos pn ON p.nome_produto_id = pn.id WHERE pn.nome = %s AND p.loja_id = %s"
@@ -289,6 +404,32 @@ class Utilizador:
         self.id_loja = None
         self._carregar()
 
+    @staticmethod
+    def reconstruir(bd, dados_utilizador):
+        # Cria o objeto do cargo certo a partir de uma linha de utilizadores já lida,
+        # sem repetir a consulta feita por _carregar
+        cargo_para_classe = {
+            'admin': Admin,
+            'vendedor': Vendedor,
+            'cliente': Cliente
+        }
+
+        classe = cargo_para_classe.get(dados_utilizador['cargo'])
+        if classe is None:
+            return None
+
+        utilizador = classe.__new__(classe)
+        utilizador.id = dados_utilizador['id']
+        utilizador.bd = bd
+        utilizador.nome_utilizador = dados_utilizador['nome_utilizador']
+        utilizador.cargo = dados_utilizador['cargo']
+        utilizador.id_loja = dados_utilizador['loja_id']
+
+        if isinstance(utilizador, Admin):
+            utilizador._remover_associacao_loja_bd()
+            dados_utilizador['loja_id'] = None  # Os dados podem estar guardados numa SessaoLigacao
+        return utilizador
+
     def _carregar(self):
         self.bd.cursor.execute("SELECT nome_utilizador, cargo, loja_id FROM utilizadores WHERE id = %s", (self.id,))
         resultado = self.bd.cursor.fetchone() # fetchone retorna o valor do ultimo execute do cursor
@@ -298,7 +439,11 @@ class Utilizador:
             self.id_loja = resultado['loja_id']
     
     @staticmethod
-    def autenticar(bd, nome_utilizador, palavra_passe):
+    def autenticar(bd, nome_utilizador, palavra_passe, endereco=None):
+        # Depois de várias falhas seguidas, recusa sem consultar a base de dados
+        if limitador_falhas_global.bloqueado(endereco, nome_utilizador):
+            return Mensagem.DEMASIADAS_TENTATIVAS
+
         # Verifica se o nome de utilizador e senha estão corretos
         sql = "SELECT id, cargo FROM utilizadores WHERE nome_utilizador = %s AND palavra_passe = %s"
         bd.cursor.execute(sql, (nome_utilizador, palavra_passe))
@@ -306,7 +451,10 @@ class Utilizador:
         
         if resultado is None:
             # Credenciais inválidas (utilizador não existe ou senha incorreta)
+            limitador_falhas_global.registar_falha(endereco, nome_utilizador)
             return Mensagem.CREDENCIAIS_INVALIDAS
+
+        limitador_falhas_global.registar_sucesso(nome_utilizador)
         
         # classe do cargo
         cargo_para_classe = {
@@ -336,6 +484,7 @@ class Utilizador:
             self.bd.cursor.execute("DELETE FROM utilizadores WHERE id = %s", (self.id,))
             self.bd.conexao.commit()
             if self.bd.cursor.rowcount > 0: # Se alguma linha foi afetada
+                cache_sessoes_global.remover_utilizador(self.id)
                 return Mensagem.REMOVIDO
             
             return Mensagem.NAO_ENCONTRADO
@@ -359,6 +508,8 @@ class Utilizador:
             self.bd.conexao.commit()
             if self.bd.cursor.rowcount > 0: # Se alguma linha foi afetada
                 self.nome_utilizador = novo_nome_limpo
+                # As sessões estão associadas ao nome antigo
+                cache_sessoes_global.remover_utilizador(self.id)
                 return Mensagem.ATUALIZADO
             
             return Mensagem.ERRO_PROCESSAMENTO
@@ -395,6 +546,7 @@ class Utilizador:
             # Atualizar senha
             self.bd.cursor.execute("UPDATE utilizadores SET palavra_passe = %s WHERE id = %s", (nova_senha, self.id))
             self.bd.conexao.commit()
+            cache_sessoes_global.remover_utilizador(self.id)
             
             # Sempre retorna sucesso se não houve erro, mesmo que a senha seja igual
             return Mensagem.ATUALIZADO
@@ -412,6 +564,8 @@ class Utilizador:
 
 # Cliente herda de Utilizador. Representa um cliente/comprador.	
 class Cliente(Utilizador):
+    TAMANHO_MAXIMO_CHAVE_IDEMPOTENCIA = 64  # Tamanho da coluna encomendas.chave_idempotencia
+
     def __init__(self, id, bd):
         super().__init__(id, bd)
     
@@ -432,6 +586,7 @@ class Cliente(Utilizador):
             self.bd.cursor.execute("UPDATE utilizadores SET cargo = 'admin' WHERE id = %s", (self.id,))
             self.bd.conexao.commit()
             if self.bd.cursor.rowcount > 0: # Se alguma linha foi afetada
+                cache_sessoes_global.remover_utilizador(self.id)
                 return Mensagem.SUCESSO
             
             return Mensagem.ERRO_PROCESSAMENTO
@@ -439,57 +594,347 @@ class Cliente(Utilizador):
             self.bd.conexao.rollback()
             return Mensagem.ERRO_GENERICO
 
-    def realizar_encomenda(self, itens, estado_inicial='pendente'):
+    def realizar_encomenda(self, itens, estado_inicial='pendente', chave_idempotencia=None):
         if itens is None or not isinstance(itens, dict) or len(itens) == 0:
             return Mensagem.ERRO_PROCESSAMENTO
-        
+
+        # As chaves chegam do JSON como texto: {"12": 2}
+        quantidades = {}
+        try:
+            for id_produto, quantidade in itens.items():
+                quantidades[int(id_produto)] = quantidades.get(int(id_produto), 0) + int(quantidade)
+        except (TypeError, ValueError):
+            return Mensagem.ERRO_PROCESSAMENTO
+
+        for quantidade in quantidades.values():
+            if quantidade <= 0:
+                return Mensagem.ERRO_PROCESSAMENTO
+
+        # Ordenados, para que encomendas simultâneas bloqueiem as linhas sempre pela mesma ordem
+        ids_produtos = sorted(quantidades)
+        return self._executar_encomenda(
+            'realizar_encomenda',
+            lambda: self._registar_encomenda(ids_produtos, quantidades, estado_inicial, chave_idempotencia),
+            estado_inicial, chave_idempotencia
+        )
+
+    def _executar_encomenda(self, operacao, registar, estado_inicial, chave_idempotencia):
+        # A chave é gerada pelo cliente e repetida quando ele reenvia a mesma encomenda (ex: depois
+        # de perder a ligação sem saber se a encomenda foi registada)
+        if chave_idempotencia is not None:
+            if not isinstance(chave_idempotencia, str) or not 0 < len(chave_idempotencia) <= Cliente.TAMANHO_MAXIMO_CHAVE_IDEMPOTENCIA:
+                return Mensagem.ERRO_PROCESSAMENTO
+            try:
+                encomenda_original = self._encomenda_pela_chave(chave_idempotencia, estado_inicial)
+            except mysql.connector.Error:
+                return Mensagem.ERRO_PROCESSAMENTO
+            if encomenda_original is not None:
+                return encomenda_original
+
+        try:
+            # Um deadlock entre encomendas simultâneas anula a transação no MySQL: volta a tentar-se
+            return repetidor_transacoes_global.executar(self.bd, operacao, registar)
+        except mysql.connector.IntegrityError:
+            # Outro pedido com a mesma chave registou a encomenda entretanto
+            self.bd.conexao.rollback()
+            if chave_idempotencia is not None:
+                try:
+                    encomenda_original = self._encomenda_pela_chave(chave_idempotencia, estado_inicial)
+                except mysql.connector.Error:
+                    encomenda_original = None
+                if encomenda_original is not None:
+                    return encomenda_original
+            return Mensagem.ERRO_PROCESSAMENTO
+        except mysql.connector.Error:
+            self.bd.conexao.rollback()
+            return Mensagem.ERRO_PROCESSAMENTO
+
+    def _resultado_encomenda(self, id_encomenda, preco_total, estado_inicial):
+        if estado_inicial == 'pendente':
+            return (Mensagem.PENDENTE, {'id_encomenda': id_encomenda, 'preco_total': preco_total})
+        return Mensagem.CONCLUIDA
+
+    def _encomenda_pela_chave(self, chave_idempotencia, estado_inicial):
+        # Resultado igual ao do pedido original, ou None se a chave ainda não foi usada
+        sql = "SELECT id, preco_total FROM encomendas WHERE comprador_id = %s AND chave_idempotencia = %s"
+        self.bd.cursor.execute(sql, (self.id, chave_idempotencia))
+        encomenda = self.bd.cursor.fetchone()
+        if encomenda is None:
+            return None
+        return self._resultado_encomenda(encomenda['id'], float(encomenda['preco_total']), estado_inicial)
+
+    # As consultas com um número variável de produtos são montadas por estas funções, que
+    # devolvem (sql, parâmetros) e não precisam da base de dados.
+    @staticmethod
+    def _sql_bloquear_produtos(ids_produtos):
+        # Uma só consulta lê e bloqueia (FOR UPDATE) todos os produtos do carrinho até ao
+        # commit: duas compras simultâneas do mesmo produto não podem vender o mesmo stock
+        marcadores = ', '.join(['%s'] * len(ids_produtos))
+        sql = f"SELECT id, stock, preco, loja_id FROM produtos WHERE id IN ({marcadores}) ORDER BY id FOR UPDATE"
+        return sql, tuple(ids_produtos)
+
+    @staticmethod
+    def _sql_inserir_itens(id_encomenda, produtos_info):
+        # Todos os itens num único INSERT; produtos_info: [(id do produto, quantidade, preço unitário)]
+        valores_itens = []
+        for id_prod, quant, preco_un in produtos_info:
+            valores_itens.extend((id_encomenda, id_prod, quant, preco_un))
+        sql = "INSERT INTO itens_encomenda (encomenda_id, produto_id, quantidade, preco_unitario) VALUES " + ', '.join(['(%s, %s, %s, %s)'] * len(produtos_info))
+        return sql, tuple(valores_itens)
+
+    @staticmethod
+    def _sql_retirar_stock(ids_produtos, quantidades):
+        # Todo o stock num único UPDATE. A condição stock >= quantidade é uma segunda
+        # garantia: se alguma linha não for atualizada, a encomenda é anulada
+        marcadores = ', '.join(['%s'] * len(ids_produtos))
+        casos_quantidade = ' '.join(['WHEN %s THEN %s'] * len(ids_produtos))
+        valores_quantidade = []
+        for id_produto in ids_produtos:
+            valores_quantidade.extend((id_produto, quantidades[id_produto]))
+        sql = (
+            f"UPDATE produtos SET stock = stock - (CASE id {casos_quantidade} END) "
+            f"WHERE id IN ({marcadores}) AND stock >= (CASE id {casos_quantidade} END)"
+        )
+        return sql, tuple(valores_quantidade) + tuple(ids_produtos) + tuple(valores_quantidade)
+
+    def _inserir_encomenda(self, id_loja, produtos_info, preco_total, estado_inicial, chave_idempotencia):
+        # produtos_info: [(id do produto, quantidade, preço unitário)]
+        sql_encomenda = "INSERT INTO encomendas (comprador_id, loja_id, estado, preco_total, chave_idempotencia) VALUES (%s, %s, %s, %s, %s)"
+        self.bd.cursor.execute(sql_encomenda, (self.id, id_loja, estado_inicial, preco_total, chave_idempotencia))
+        id_encomenda = self.bd.cursor.lastrowid # ID da encomenda recém-criada
+
+        self.bd.cursor.execute(*Cliente._sql_inserir_itens(id_encomenda, produtos_info))
+        return id_encomenda
+
+    def _registar_encomenda(self, ids_produtos, quantidades, estado_inicial, chave_idempotencia):
+        self.bd.cursor.execute(*Cliente._sql_bloquear_produtos(ids_produtos))
+        produtos_bd = {}
+        for linha in self.bd.cursor.fetchall():
+            produtos_bd[linha['id']] = linha
+
+        if len(produtos_bd) != len(ids_produtos):
+            self.bd.conexao.rollback()
+            return Mensagem.PRODUTO_NAO_ENCONTRADO
+
         id_loja_encomenda = None
         preco_total = 0.0
         produtos_info = []
+        for id_produto in ids_produtos:
+            produto_bd = produtos_bd[id_produto]
+            quantidade = quantidades[id_produto]
+
+            if produto_bd['stock'] < quantidade:
+                self.bd.conexao.rollback()
+                return Mensagem.STOCK_INSUFICIENTE
+
+            # Acontece na primeira iteração para definir a loja da encomenda
+            if id_loja_encomenda is None:
+                id_loja_encomenda = produto_bd['loja_id']
+
+            # Garante que todos os produtos no carrinho são da mesma loja
+            elif id_loja_encomenda != produto_bd['loja_id']:
+                self.bd.conexao.rollback()
+                return Mensagem.ERRO_PROCESSAMENTO
+
+            preco_unitario = float(produto_bd['preco'])
+            produtos_info.append((id_produto, quantidade, preco_unitario))
+            preco_total += preco_unitario * quantidade
+
+        id_encomenda = self._inserir_encomenda(id_loja_encomenda, produtos_info, preco_total, estado_inicial, chave_idempotencia)
+
+        self.bd.cursor.execute(*Cliente._sql_retirar_stock(ids_produtos, quantidades))
+        if self.bd.cursor.rowcount != len(ids_produtos):
+            self.bd.conexao.rollback()
+            return Mensagem.STOCK_INSUFICIENTE
+
+        self.bd.conexao.commit()
+        cache_catalogo_global.invalidar()  # O stock dos produtos mudou
+        return self._resultado_encomenda(id_encomenda, preco_total, estado_inicial)
+
+    # Carrinho no servidor: cada produto adicionado fica reservado (retirado de produtos.stock)
+    # até expirar, ser removido ou ser convertido numa encomenda. Assim a falta de stock é
+    # detetada ao adicionar, e finalizar não precisa de voltar a verificar nem de mexer no stock.
+    def adicionar_ao_carrinho(self, id_produto, quantidade, duracao_segundos):
         try:
-            for id_produto, quantidade in itens.items():
-                self.bd.cursor.execute("SELECT stock, preco, loja_id FROM produtos WHERE id = %s", (id_produto,))
-                produto_bd = self.bd.cursor.fetchone()
+            id_produto = int(id_produto)
+            quantidade = int(quantidade)
+        except (TypeError, ValueError):
+            return Mensagem.PARAMETROS_INVALIDOS
+        if quantidade <= 0:
+            return Mensagem.PARAMETROS_INVALIDOS
 
-                if produto_bd is None:
-                    self.bd.conexao.rollback()
-                    return Mensagem.PRODUTO_NAO_ENCONTRADO
-                
-                if produto_bd['stock'] < quantidade:
-                    self.bd.conexao.rollback()
-                    return Mensagem.STOCK_INSUFICIENTE
-
-                # Acontece na primeira iteração para definir a loja da encomenda
-                if id_loja_encomenda is None:
-                    id_loja_encomenda = produto_bd['loja_id']
-
-                # Garante que todos os produtos no carrinho são da mesma loja
-                elif id_loja_encomenda != produto_bd['loja_id']:
-                    self.bd.conexao.rollback()
-                    return Mensagem.ERRO_PROCESSAMENTO
-                
-                preco_unitario = float(produto_bd['preco'])
-                produtos_info.append((id_produto, quantidade, preco_unitario))
-                preco_total += preco_unitario * quantidade
+        def reservar():
+            # As reservas expiradas do utilizador são devolvidas já, para que o resultado não
+            # dependa de a limpeza periódica ter ou não corrido
+            self.bd.cursor.execute(
+                "SELECT id FROM reservas WHERE utilizador_id = %s AND expira_em <= NOW() FOR UPDATE",
+                (self.id,)
+            )
+            ids_expiradas = [linha['id'] for linha in self.bd.cursor.fetchall()]
+            if len(ids_expiradas) > 0:
+                Reserva.devolver(self.bd, ids_expiradas)
+
+            self.bd.cursor.execute("SELECT loja_id FROM produtos WHERE id = %s", (id_produto,))
+            produto = self.bd.cursor.fetchone()
+            if produto is None:
+                self.bd.conexao.rollback()
+                return Mensagem.PRODUTO_NAO_ENCONTRADO
+
+            # Uma encomenda é sempre de uma só loja
+            sql_loja = "SELECT p.loja_id FROM reservas r JOIN produtos p ON p.id = r.produto_id WHERE r.utilizador_id = %s LIMIT 1"
+            self.bd.cursor.execute(sql_loja, (self.id,))
+            reserva_existente = self.bd.cursor.fetchone()
+            if reserva_existente is not None and reserva_existente['loja_id'] != produto['loja_id']:
+                self.bd.conexao.rollback()
+                return Mensagem.ERRO_PROCESSAMENTO
+
+            # A condição stock >= quantidade torna a verificação e a reserva numa só operação
+            self.bd.cursor.execute(
+                "UPDATE produtos SET stock = stock - %s WHERE id = %s AND stock >= %s",
+                (quantidade, id_produto, quantidade)
+            )
+            if self.bd.cursor.rowcount == 0:
+                self.bd.conexao.rollback()
+                return Mensagem.STOCK_INSUFICIENTE
+
+            sql_reserva = (
+                "INSERT INTO reservas (utilizador_id, produto_id, quantidade, expira_em) "
+                "VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND) "
+                "ON DUPLICATE KEY UPDATE quantidade = quantidade + VALUES(quantidade)"
+            )
+            self.bd.cursor.execute(sql_reserva, (self.id, id_produto, quantidade, duracao_segundos))
+            # Qualquer alteração ao carrinho renova o prazo das reservas ainda válidas
+            self.bd.cursor.execute(
+                "UPDATE reservas SET expira_em = NOW() + INTERVAL %s SECOND WHERE utilizador_id = %s AND expira_em > NOW()",
+                (duracao_segundos, self.id)
+            )
+            self.bd.conexao.commit()
+            cache_catalogo_global.invalidar()  # O stock disponível mudou
+            return Mensagem.ADICIONADO
+
+        try:
+            return repetidor_transacoes_global.executar(self.bd, 'carrinho_adicionar', reservar)
+        except mysql.connector.Error:
+            self.bd.conexao.rollback()
+            return Mensagem.ERRO_GENERICO
 
-            sql_encomenda = "INSERT INTO encomendas (comprador_id, loja_id, estado, preco_total) VALUES (%s, %s, %s, %s)"
-            self.bd.cursor.execute(sql_encomenda, (self.id, id_loja_encomenda, estado_inicial, preco_total))
-            id_encomenda = self.bd.cursor.lastrowid # ID da encomenda recém-criada
+    def remover_do_carrinho(self, id_produto, quantidade=None):
+        # quantidade=None remove o produto inteiro do carrinho
+        try:
+            id_produto = int(id_produto)
+            if quantidade is not None:
+                quantidade = int(quantidade)
+                if quantidade <= 0:
+                    return Mensagem.PARAMETROS_INVALIDOS
+        except (TypeError, ValueError):
+            return Mensagem.PARAMETROS_INVALIDOS
 
-            for id_prod, quant, preco_un in produtos_info:
-                sql_item = "INSERT INTO itens_encomenda (encomenda_id, produto_id, quantidade, preco_unitario) VALUES (%s, %s, %s, %s)"
-                self.bd.cursor.execute(sql_item, (id_encomenda, id_prod, quant, preco_un))
-                self.bd.cursor.execute("UPDATE produtos SET stock = stock - %s WHERE id = %s", (quant, id_prod))
+        def libertar():
+            self.bd.cursor.execute(
+                "SELECT quantidade FROM reservas WHERE utilizador_id = %s AND produto_id = %s FOR UPDATE",
+                (self.id, id_produto)
+            )
+            reserva = self.bd.cursor.fetchone()
+            if reserva is None:
+                self.bd.conexao.rollback()
+                return Mensagem.NAO_ENCONTRADO
 
+            libertada = reserva['quantidade']
+            if quantidade is not None and quantidade < reserva['quantidade']:
+                libertada = quantidade
+                self.bd.cursor.execute(
+                    "UPDATE reservas SET quantidade = quantidade - %s WHERE utilizador_id = %s AND produto_id = %s",
+                    (libertada, self.id, id_produto)
+                )
+            else:
+                self.bd.cursor.execute(
+                    "DELETE FROM reservas WHERE utilizador_id = %s AND produto_id = %s",
+                    (self.id, id_produto)
+                )
+            self.bd.cursor.execute("UPDATE produtos SET stock = stock + %s WHERE id = %s", (libertada, id_produto))
             self.bd.conexao.commit()
-            
-            if estado_inicial == 'pendente':
-                return (Mensagem.PENDENTE, {'id_encomenda': id_encomenda, 'preco_total': preco_total})
+            cache_catalogo_global.invalidar()  # O stock disponível mudou
+            return Mensagem.REMOVIDO
 
-            return Mensagem.CONCLUIDA
+        try:
+            return repetidor_transacoes_global.executar(self.bd, 'carrinho_remover', libertar)
         except mysql.connector.Error:
             self.bd.conexao.rollback()
-            return Mensagem.ERRO_PROCESSAMENTO
+            return Mensagem.ERRO_GENERICO
+
+    def ver_carrinho(self):
+        sql = """
+            SELECT r.produto_id, pn.nome, r.quantidade, p.preco, r.expira_em
+            FROM reservas r
+            JOIN produtos p ON p.id = r.produto_id
+            JOIN nomes_produtos pn ON pn.id = p.nome_produto_id
+            WHERE r.utilizador_id = %s AND r.expira_em > NOW()
+            ORDER BY r.produto_id
+        """
+        try:
+            self.bd.cursor.execute(sql, (self.id,))
+            resultados = self.bd.cursor.fetchall()
+            for linha in resultados:
+                linha['preco'] = float(linha['preco'])
+                linha['expira_em'] = str(linha['expira_em'])
+            return resultados
+        except mysql.connector.Error:
+            return []
+
+    def finalizar_carrinho(self, chave_idempotencia=None):
+        return self._executar_encomenda(
+            'carrinho_finalizar',
+            lambda: self._converter_reservas(chave_idempotencia),
+            'pendente', chave_idempotencia
+        )
+
+    def _converter_reservas(self, chave_idempotencia):
+        # O stock já foi retirado ao reservar: basta criar a encomenda e apagar as reservas.
+        # O FOR UPDATE impede que a limpeza de reservas expiradas devolva este stock entretanto.
+        sql_reservas = """
+            SELECT r.id, r.produto_id, r.quantidade, p.preco, p.loja_id, r.expira_em <= NOW() AS expirada
+            FROM reservas r
+            JOIN produtos p ON p.id = r.produto_id
+            WHERE r.utilizador_id = %s
+            ORDER BY r.produto_id
+            FOR UPDATE
+        """
+        self.bd.cursor.execute(sql_reservas, (self.id,))
+        reservas = self.bd.cursor.fetchall()
+        if len(reservas) == 0:
+            self.bd.conexao.rollback()
+            return Mensagem.CARRINHO_VAZIO
+
+        # Nunca se finaliza só parte do carrinho: as reservas expiradas são devolvidas ao stock
+        # e o cliente revê o carrinho antes de voltar a finalizar
+        ids_expiradas = [reserva['id'] for reserva in reservas if reserva['expirada']]
+        if len(ids_expiradas) > 0:
+            Reserva.devolver(self.bd, ids_expiradas)
+            self.bd.conexao.commit()
+            cache_catalogo_global.invalidar()  # O stock disponível mudou
+            return Mensagem.RESERVAS_EXPIRADAS
+
+        id_loja = reservas[0]['loja_id']
+        preco_total = 0.0
+        produtos_info = []
+        for reserva in reservas:
+            if reserva['loja_id'] != id_loja:
+                self.bd.conexao.rollback()
+                return Mensagem.ERRO_PROCESSAMENTO
+            preco_unitario = float(reserva['preco'])
+            produtos_info.append((reserva['produto_id'], reserva['quantidade'], preco_unitario))
+            preco_total += preco_unitario * reserva['quantidade']
+
+        id_encomenda = self._inserir_encomenda(id_loja, produtos_info, preco_total, 'pendente', chave_idempotencia)
+
+        ids_produtos = [reserva['produto_id'] for reserva in reservas]
+        marcadores = ', '.join(['%s'] * len(ids_produtos))
+        self.bd.cursor.execute(
+            f"DELETE FROM reservas WHERE utilizador_id = %s AND produto_id IN ({marcadores})",
+            (self.id,) + tuple(ids_produtos)
+        )
+        self.bd.conexao.commit()
+        return self._resultado_encomenda(id_encomenda, preco_total, 'pendente')
 
     def ver_historico_compras(self):
         return self.ver_historico_pessoal()
@@ -516,6 +961,8 @@ class Cliente(Utilizador):
 
 # Vendedor herda de Cliente, pois um vendedor também pode ser um cliente.	
 class Vendedor(Cliente):
+    MAXIMO_ENCOMENDAS_EM_LOTE = 500  # Encomendas concluídas por concluir_encomendas_em_lote
+
     def __init__(self, id, bd):
         super().__init__(id, bd)
     
@@ -541,7 +988,8 @@ class Vendedor(Cliente):
         return None
 
     def _verificar_permissao_encomenda(self, id_encomenda):
-        self.bd.cursor.execute("SELECT loja_id, estado FROM encomendas WHERE id=%s", (id_encomenda,))
+        # FOR UPDATE: a encomenda fica bloqueada até ao fim da transação de quem a verifica
+        self.bd.cursor.execute("SELECT loja_id, estado FROM encomendas WHERE id=%s FOR UPDATE", (id_encomenda,))
         resultado = self.bd.cursor.fetchone()
         if resultado is None:
             return Mensagem.NAO_ENCONTRADO
@@ -560,20 +1008,105 @@ class Vendedor(Cliente):
         return Produto.atualizar_produto(self.bd, id_produto, novo_preco, novo_stock, nova_descricao, nova_categoria, novo_nome=novo_nome)
 
     def concluir_encomenda(self, id_encomenda):
-        permissao = self._verificar_permissao_encomenda(id_encomenda)
-        if permissao is not None:
-            return permissao # Retorna a mensagem de erro se a permissão falhar
-        try:
-            sql = "UPDATE encomendas SET estado=%s, vendedor_id=%s WHERE id=%s"
-            self.bd.cursor.execute(sql, ('concluida', self.id, id_encomenda))
+        def concluir():
+            # A verificação faz parte da transação (e de cada nova tentativa): entre ela e o
+            # UPDATE, nenhum outro pedido pode alterar a encomenda
+            permissao = self._verificar_permissao_encomenda(id_encomenda)
+            if permissao is not None:
+                self.bd.conexao.rollback()
+                return permissao # Retorna a mensagem de erro se a permissão falhar
+
+            sql = "UPDATE encomendas SET estado=%s, vendedor_id=%s WHERE id=%s AND estado='pendente' AND loja_id=%s"
+            self.bd.cursor.execute(sql, ('concluida', self.id, id_encomenda, self.id_loja))
+            concluidas = self.bd.cursor.rowcount
             self.bd.conexao.commit()
-            if self.bd.cursor.rowcount > 0:
+            if concluidas > 0:
                 return Mensagem.CONCLUIDA
             return Mensagem.ERRO_PROCESSAMENTO
+
+        try:
+            return repetidor_transacoes_global.executar(self.bd, 'concluir_encomenda', concluir)
         except mysql.connector.Error:
             self.bd.conexao.rollback()
             return Mensagem.ERRO_GENERICO
-    
+
+    def concluir_encomendas_em_lote(self, ids_encomendas=None, mais_antigas_que_horas=None):
+        return Vendedor.concluir_encomendas(self.bd, self.id, self.id_loja, ids_encomendas, mais_antigas_que_horas)
+
+    @staticmethod
+    def concluir_encomendas(bd, id_utilizador, id_loja, ids_encomendas=None, mais_antigas_que_horas=None):
+        # Conclui várias encomendas numa só transação: um SELECT ... FOR UPDATE verifica (e bloqueia)
+        # todas e um único UPDATE conclui as válidas. id_loja=None permite encomendas de qualquer
+        # loja (Admin). As encomendas são indicadas pelos ids ou por "pendentes há mais de X horas".
+        if (ids_encomendas is None) == (mais_antigas_que_horas is None):
+            return Mensagem.PARAMETROS_INVALIDOS
+
+        try:
+            if ids_encomendas is not None:
+                if not isinstance(ids_encomendas, list) or len(ids_encomendas) == 0:
+                    return Mensagem.PARAMETROS_INVALIDOS
+                ids_encomendas = sorted(set(int(id_encomenda) for id_encomenda in ids_encomendas))
+            else:
+                mais_antigas_que_horas = float(mais_antigas_que_horas)
+                if mais_antigas_que_horas < 0:
+                    return Mensagem.PARAMETROS_INVALIDOS
+        except (TypeError, ValueError):
+            return Mensagem.PARAMETROS_INVALIDOS
+
+        if ids_encomendas is not None and len(ids_encomendas) > Vendedor.MAXIMO_ENCOMENDAS_EM_LOTE:
+            return Mensagem.PARAMETROS_INVALIDOS
+
+        def concluir():
+            if ids_encomendas is not None:
+                marcadores = ', '.join(['%s'] * len(ids_encomendas))
+                sql = f"SELECT id, loja_id, estado FROM encomendas WHERE id IN ({marcadores}) ORDER BY id FOR UPDATE"
+                bd.cursor.execute(sql, tuple(ids_encomendas))
+            else:
+                # data_encomenda é preenchida pelo MySQL: a comparação usa o relógio do MySQL
+                sql = "SELECT id, loja_id, estado FROM encomendas WHERE estado = 'pendente' AND data_encomenda < NOW() - INTERVAL %s SECOND"
+                parametros = [int(mais_antigas_que_horas * 3600)]
+                if id_loja is not None:
+                    sql += " AND loja_id = %s"
+                    parametros.append(id_loja)
+                sql += " ORDER BY id LIMIT %s FOR UPDATE"
+                parametros.append(Vendedor.MAXIMO_ENCOMENDAS_EM_LOTE)
+                bd.cursor.execute(sql, tuple(parametros))
+
+            encomendas = {}
+            for linha in bd.cursor.fetchall():
+                encomendas[linha['id']] = linha
+
+            resultados = {}
+            a_concluir = []
+            for id_encomenda in (ids_encomendas if ids_encomendas is not None else sorted(encomendas)):
+                encomenda = encomendas.get(id_encomenda)
+                if encomenda is None:
+                    resultados[id_encomenda] = Mensagem.NAO_ENCONTRADO
+                elif id_loja is not None and encomenda['loja_id'] != id_loja:
+                    resultados[id_encomenda] = Mensagem.ERRO_PERMISSAO
+                elif encomenda['estado'] != 'pendente':
+                    resultados[id_encomenda] = Mensagem.ERRO_PROCESSAMENTO
+                else:
+                    resultados[id_encomenda] = Mensagem.CONCLUIDA
+                    a_concluir.append(id_encomenda)
+
+            if len(a_concluir) > 0:
+                marcadores = ', '.join(['%s'] * len(a_concluir))
+                sql = f"UPDATE encomendas SET estado = 'concluida', vendedor_id = %s WHERE id IN ({marcadores}) AND estado = 'pendente'"
+                bd.cursor.execute(sql, (id_utilizador,) + tuple(a_concluir))
+            bd.conexao.commit()
+
+            return (Mensagem.SUCESSO, [
+                {'id_encomenda': id_encomenda, 'resultado': str(resultado)}
+                for id_encomenda, resultado in resultados.items()
+            ])
+
+        try:
+            return repetidor_transacoes_global.executar(bd, 'concluir_encomendas_em_lote', concluir)
+        except mysql.connector.Error:
+            bd.conexao.rollback()
+            return Mensagem.ERRO_GENERICO
+
     def listar_encomendas(self, filtro_estado=None):
         try:
             sql = """
@@ -742,6 +1275,7 @@ class Admin(Cliente):
             sql = f"UPDATE lojas SET {','.join(campos)} WHERE id=%s"
             self.bd.cursor.execute(sql, tuple(valores))
             self.bd.conexao.commit()
+            cache_catalogo_global.invalidar()  # As listagens de produtos incluem o nome da loja
 
             if self.bd.cursor.rowcount > 0: # Se alguma linha foi afetada
                 return Mensagem.ATUALIZADO
@@ -791,17 +1325,25 @@ class Admin(Cliente):
 
     def concluir_encomenda(self, id_encomenda):
         # O Admin pode concluir qualquer encomenda de qualquer loja.
-        try:
+        def concluir():
             sql = "UPDATE encomendas SET estado=%s, vendedor_id=%s WHERE id=%s AND estado='pendente'"
             self.bd.cursor.execute(sql, ('concluida', self.id, id_encomenda))
+            concluidas = self.bd.cursor.rowcount
             self.bd.conexao.commit()
-            if self.bd.cursor.rowcount > 0:
+            if concluidas > 0:
                 return Mensagem.CONCLUIDA
             return Mensagem.ERRO_PROCESSAMENTO
+
+        try:
+            return repetidor_transacoes_global.executar(self.bd, 'concluir_encomenda', concluir)
         except mysql.connector.Error:
             self.bd.conexao.rollback()
             return Mensagem.ERRO_GENERICO
 
+    def concluir_encomendas_em_lote(self, ids_encomendas=None, mais_antigas_que_horas=None):
+        # O Admin pode concluir encomendas de qualquer loja.
+        return Vendedor.concluir_encomendas(self.bd, self.id, None, ids_encomendas, mais_antigas_que_horas)
+
     def ver_historico_global(self):
         sql = """
             SELECT encomendas.data_encomenda, utilizadores.nome_utilizador as cliente, nomes_produtos.nome as produto, itens_encomenda.quantidade, itens_encomenda.preco_unitario, lojas.nome as loja, encomendas.estado
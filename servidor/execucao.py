@@ -0,0 +1,77 @@
+import queue
+import threading
+from concurrent.futures import Future
+from servidor.configuracao import ConfiguracaoServidor
+
+class ErroServidorOcupado(Exception):
+    pass
+
+# Separa o atendimento das ligações da execução dos comandos: um número fixo de threads
+# executa os pedidos e uma fila limitada fica à frente delas. Com a fila cheia o pedido é
+# recusado de imediato, em vez de todos os clientes ficarem mais lentos.
+class ExecutorPedidos:
+    def __init__(self, trabalhadores=None, tamanho_fila=None):
+        if trabalhadores is None:
+            trabalhadores = ConfiguracaoServidor.TRABALHADORES_PEDIDOS
+        if tamanho_fila is None:
+            tamanho_fila = ConfiguracaoServidor.TAMANHO_FILA_PEDIDOS
+
+        self.trabalhadores = trabalhadores
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.pedidos_recusados = 0
+
+    def iniciar(self):
+        with self._lock:
+            if len(self._threads) > 0:
+                return
+            for indice in range(self.trabalhadores):
+                thread = threading.Thread(target=self._trabalhar, name=f"trabalhador_pedidos_{indice}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submeter(self, funcao, *argumentos):
+        futuro = Future()
+        try:
+            self._fila.put_nowait((futuro, funcao, argumentos))
+        except queue.Full:
+            with self._lock:
+                self.pedidos_recusados += 1
+            raise ErroServidorOcupado()
+        return futuro
+
+    def _trabalhar(self):
+        while True:
+            item = self._fila.get()
+            if item is None: # Sinal de paragem
+                break
+            
+            futuro, funcao, argumentos = item
+            if not futuro.set_running_or_notify_cancel():
+                continue # Cancelado enquanto estava na fila
+            try:
+                futuro.set_result(funcao(*argumentos))
+            except BaseException as erro:
+                futuro.set_exception(erro)
+
+    def parar(self):
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+        
+        # Os pedidos já na fila são executados antes do sinal de paragem
+        for _ in threads:
+            self._fila.put(None)
+        for thread in threads:
+            thread.join()
+
+    def estatisticas(self):
+        return {
+            'trabalhadores': self.trabalhadores,
+            'pedidos_em_fila': self._fila.qsize(),
+            'tamanho_fila': self._fila.maxsize,
+            'pedidos_recusados': self.pedidos_recusados
+        }
+
+executor_pedidos_global = ExecutorPedidos()
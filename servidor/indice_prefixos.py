@@ -0,0 +1,98 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+# Índice em memória, ordenado, dos valores de uma coluna (ex: nomes_produtos.nome), para
+# sugerir valores por prefixo sem consultar o MySQL: a procura é uma pesquisa binária
+# seguida da leitura de no máximo `limite` entradas, seja qual for o tamanho da tabela.
+# É carregado da base de dados no primeiro uso e atualizado quando se insere um valor novo.
+class IndicePrefixos:
+    def __init__(self, tabela, coluna):
+        self.tabela = tabela
+        self.coluna = coluna
+        self.ttl_segundos = None  # None = não volta a carregar (definido no modo multi-processo)
+        self._chaves = []  # valores normalizados, ordenados
+        self._valores = []  # valor original na mesma posição de _chaves
+        self._carregado_em = None  # instante monotónico do último carregamento
+        self._inseridos_durante_carga = None  # lista enquanto um carregamento está a decorrer
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalizar(texto):
+        # Sem distinção de maiúsculas nem de acentos: "acucar" encontra "Açúcar"
+        decomposto = unicodedata.normalize('NFKD', str(texto).strip().casefold())
+        return ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+
+    def _precisa_carregar(self):
+        if self._carregado_em is None:
+            return True
+        return self.ttl_segundos is not None and time.monotonic() - self._carregado_em >= self.ttl_segundos
+
+    def _carregar(self, bd):
+        with self._lock:
+            self._inseridos_durante_carga = []
+
+        bd.cursor.execute(f"SELECT {self.coluna} AS valor FROM {self.tabela}")
+        valores = set(linha['valor'] for linha in bd.cursor.fetchall())
+
+        with self._lock:
+            # Valores inseridos depois da consulta ter começado podem não vir no resultado
+            valores.update(self._inseridos_durante_carga or ())
+            self._inseridos_durante_carga = None
+            pares = sorted((IndicePrefixos.normalizar(valor), valor) for valor in valores)
+            self._chaves = [chave for chave, _ in pares]
+            self._valores = [valor for _, valor in pares]
+            self._carregado_em = time.monotonic()
+
+    def adicionar(self, valor):
+        with self._lock:
+            if self._inseridos_durante_carga is not None:
+                self._inseridos_durante_carga.append(valor)
+            if self._carregado_em is None:
+                return  # Ainda não foi carregado: o valor virá com o carregamento
+            chave = IndicePrefixos.normalizar(valor)
+            posicao = bisect.bisect_left(self._chaves, chave)
+            while posicao < len(self._chaves) and self._chaves[posicao] == chave:
+                if self._valores[posicao] == valor:
+                    return
+                posicao += 1
+            self._chaves.insert(posicao, chave)
+            self._valores.insert(posicao, valor)
+
+    def invalidar(self):
+        # O próximo pedido volta a carregar o índice (ex: um lote anulado inseriu valores)
+        with self._lock:
+            self._carregado_em = None
+
+    def sugerir(self, bd, prefixo, limite):
+        if self._precisa_carregar():
+            self._carregar(bd)
+
+        chave_prefixo = IndicePrefixos.normalizar(prefixo)
+        with self._lock:
+            posicao = bisect.bisect_left(self._chaves, chave_prefixo)
+            correspondencias = []
+            while posicao < len(self._chaves) and len(correspondencias) < limite:
+                if not self._chaves[posicao].startswith(chave_prefixo):
+                    break
+                correspondencias.append(self._valores[posicao])
+                posicao += 1
+
+        # Uma correspondência exata aparece primeiro; as restantes ficam por ordem alfabética
+        for indice, valor in enumerate(correspondencias):
+            if IndicePrefixos.normalizar(valor) == chave_prefixo:
+                correspondencias.insert(0, correspondencias.pop(indice))
+                break
+        return correspondencias
+
+    def estatisticas(self):
+        with self._lock:
+            return {'valores': len(self._chaves), 'carregado': self._carregado_em is not None}
+
+# Um índice por tabela de valores partilhados pelos produtos (ver Produto._obter_ou_criar_id)
+indices_prefixos_global = {
+    'nomes_produtos': IndicePrefixos('nomes_produtos', 'nome'),
+    'categorias': IndicePrefixos('categorias', 'nome'),
+    'descricoes': IndicePrefixos('descricoes', 'texto')
+}
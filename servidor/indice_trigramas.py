@@ -0,0 +1,132 @@
+import threading
+import time
+from servidor.indice_prefixos import IndicePrefixos
+
+# Índice invertido de trigramas (sequências de 3 caracteres) dos nomes de produtos, para a
+# pesquisa por parte do nome sem um LIKE '%termo%' na base de dados. Um nome que contém o
+# termo contém todos os trigramas do termo: a interseção das listas desses trigramas dá os
+# candidatos, que são depois confirmados e ordenados por relevância em memória.
+class IndiceTrigramas:
+    def __init__(self, tabela, coluna):
+        self.tabela = tabela
+        self.coluna = coluna
+        self.ttl_segundos = None  # None = não volta a carregar (definido no modo multi-processo)
+        self._nomes = {}  # id -> (nome, nome normalizado)
+        self._trigramas = {}  # trigrama -> set de ids
+        self._carregado_em = None
+        self._inseridos_durante_carga = None  # lista de (id, nome) enquanto um carregamento decorre
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def trigramas(texto_normalizado):
+        trigramas = set()
+        for inicio in range(len(texto_normalizado) - 2):
+            trigramas.add(texto_normalizado[inicio:inicio + 3])
+        return trigramas
+
+    def _precisa_carregar(self):
+        if self._carregado_em is None:
+            return True
+        return self.ttl_segundos is not None and time.monotonic() - self._carregado_em >= self.ttl_segundos
+
+    def carregar(self, bd):
+        with self._lock:
+            self._inseridos_durante_carga = []
+
+        bd.cursor.execute(f"SELECT id, {self.coluna} AS valor FROM {self.tabela}")
+        linhas = [(linha['id'], linha['valor']) for linha in bd.cursor.fetchall()]
+
+        nomes = {}
+        trigramas = {}
+        with self._lock:
+            # Nomes inseridos depois da consulta ter começado podem não vir no resultado
+            linhas.extend(self._inseridos_durante_carga or ())
+            self._inseridos_durante_carga = None
+
+        for id_nome, nome in linhas:
+            IndiceTrigramas._indexar(nomes, trigramas, id_nome, nome)
+
+        with self._lock:
+            self._nomes = nomes
+            self._trigramas = trigramas
+            self._carregado_em = time.monotonic()
+
+    @staticmethod
+    def _indexar(nomes, trigramas, id_nome, nome):
+        normalizado = IndicePrefixos.normalizar(nome)
+        nomes[id_nome] = (nome, normalizado)
+        for trigrama in IndiceTrigramas.trigramas(normalizado):
+            trigramas.setdefault(trigrama, set()).add(id_nome)
+
+    def adicionar(self, id_nome, nome):
+        with self._lock:
+            if self._inseridos_durante_carga is not None:
+                self._inseridos_durante_carga.append((id_nome, nome))
+            if self._carregado_em is None:
+                return  # Ainda não foi carregado: o nome virá com o carregamento
+            IndiceTrigramas._indexar(self._nomes, self._trigramas, id_nome, nome)
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado_em = None
+
+    def procurar(self, bd, termo):
+        # Devolve [(id do nome, nome)] dos nomes que contêm o termo, do mais para o menos relevante
+        if self._precisa_carregar():
+            self.carregar(bd)
+
+        termo_normalizado = IndicePrefixos.normalizar(termo)
+        trigramas_termo = IndiceTrigramas.trigramas(termo_normalizado)
+
+        with self._lock:
+            if len(trigramas_termo) == 0:
+                # Termo com menos de 3 caracteres: não há trigramas, verificam-se todos os nomes
+                candidatos = self._nomes.keys()
+            else:
+                listas = []
+                for trigrama in trigramas_termo:
+                    lista = self._trigramas.get(trigrama)
+                    if lista is None:
+                        return []
+                    listas.append(lista)
+                # A interseção começa pela lista mais curta
+                listas.sort(key=len)
+                candidatos = set(listas[0])
+                for lista in listas[1:]:
+                    candidatos &= lista
+                    if len(candidatos) == 0:
+                        return []
+
+            encontrados = []
+            for id_nome in candidatos:
+                nome, normalizado = self._nomes[id_nome]
+                posicao = normalizado.find(termo_normalizado)
+                if posicao >= 0:
+                    encontrados.append((IndiceTrigramas._relevancia(normalizado, termo_normalizado, posicao), id_nome, nome))
+
+        encontrados.sort()
+        return [(id_nome, nome) for _, id_nome, nome in encontrados]
+
+    @staticmethod
+    def _relevancia(normalizado, termo, posicao):
+        # Ordenação: nome igual ao termo, depois começado pelo termo, depois com uma palavra
+        # começada pelo termo, e por fim o resto; em cada grupo, os nomes mais curtos primeiro
+        if normalizado == termo:
+            grupo = 0
+        elif posicao == 0:
+            grupo = 1
+        elif not normalizado[posicao - 1].isalnum():
+            grupo = 2
+        else:
+            grupo = 3
+        return (grupo, len(normalizado), normalizado)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'nomes': len(self._nomes),
+                'trigramas': len(self._trigramas),
+                'carregado': self._carregado_em is not None
+            }
+
+indice_trigramas_global = IndiceTrigramas('nomes_produtos', 'nome')
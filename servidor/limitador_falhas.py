@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from servidor.configuracao import ConfiguracaoServidor
+
+# Conta as falhas de autenticação por endereço do cliente e por nome de utilizador, numa
+# janela de tempo fixa. Depois de FALHAS_AUTENTICACAO_MAXIMO falhas, novas tentativas dessa
+# origem são recusadas sem consultar o MySQL até a janela terminar.
+class LimitadorFalhas:
+    def __init__(self, maximo_falhas=None, janela_segundos=None, maximo_entradas=None):
+        if maximo_falhas is None:
+            maximo_falhas = ConfiguracaoServidor.FALHAS_AUTENTICACAO_MAXIMO
+        if janela_segundos is None:
+            janela_segundos = ConfiguracaoServidor.FALHAS_AUTENTICACAO_JANELA_SEGUNDOS
+        if maximo_entradas is None:
+            maximo_entradas = ConfiguracaoServidor.FALHAS_AUTENTICACAO_MAXIMO_ENTRADAS
+
+        self.maximo_falhas = maximo_falhas
+        self.janela_segundos = janela_segundos
+        self.maximo_entradas = maximo_entradas
+        self._falhas = OrderedDict()  # ('endereco' | 'utilizador', valor) -> (falhas, início da janela)
+        self._lock = threading.Lock()
+        self.tentativas_bloqueadas = 0
+
+    @staticmethod
+    def _chaves(endereco, nome_utilizador):
+        chaves = []
+        if endereco is not None:
+            chaves.append(('endereco', endereco))
+        if nome_utilizador is not None:
+            chaves.append(('utilizador', nome_utilizador))
+        return chaves
+
+    def _falhas_na_janela(self, chave, agora):
+        entrada = self._falhas.get(chave)
+        if entrada is None:
+            return 0
+
+        falhas, inicio_janela = entrada
+        if agora - inicio_janela >= self.janela_segundos:
+            del self._falhas[chave]
+            return 0
+        return falhas
+
+    def bloqueado(self, endereco=None, nome_utilizador=None):
+        agora = time.monotonic()
+        with self._lock:
+            for chave in self._chaves(endereco, nome_utilizador):
+                if self._falhas_na_janela(chave, agora) >= self.maximo_falhas:
+                    self.tentativas_bloqueadas += 1
+                    return True
+        return False
+
+    def registar_falha(self, endereco=None, nome_utilizador=None):
+        agora = time.monotonic()
+        with self._lock:
+            for chave in self._chaves(endereco, nome_utilizador):
+                falhas = self._falhas_na_janela(chave, agora)
+                if falhas == 0:
+                    self._falhas[chave] = (1, agora)
+                else:
+                    self._falhas[chave] = (falhas + 1, self._falhas[chave][1])
+                self._falhas.move_to_end(chave)
+
+            # Limite de memória: esquece as origens mais antigas
+            while len(self._falhas) > self.maximo_entradas:
+                self._falhas.popitem(last=False)
+
+    def registar_sucesso(self, nome_utilizador):
+        with self._lock:
+            self._falhas.pop(('utilizador', nome_utilizador), None)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'origens_com_falhas': len(self._falhas),
+                'tentativas_bloqueadas': self.tentativas_bloqueadas
+            }
+
+limitador_falhas_global = LimitadorFalhas()
@@ -0,0 +1,184 @@
+import threading
+from mysql.connector import Error
+import consola
+
+class ErroMigracao(Exception):
+    pass
+
+# O MySQL confirma cada DDL de imediato (o rollback não o desfaz): se o processo morrer a meio
+# de uma migração, ela volta a ser executada no arranque seguinte. Por isso cada comando tem de
+# poder ser repetido: CREATE ... IF NOT EXISTS, ou um ALTER protegido por uma verificação no
+# information_schema (ver _se_nao_existir_indice e _se_nao_existir_coluna).
+def _se_nao_existir_indice(tabela, indice, comando):
+    verificacao = (
+        "SELECT COUNT(*) AS existe FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s"
+    )
+    return (verificacao, (tabela, indice), comando)
+
+def _se_nao_existir_coluna(tabela, coluna, comando):
+    verificacao = (
+        "SELECT COUNT(*) AS existe FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s"
+    )
+    return (verificacao, (tabela, coluna), comando)
+
+# Lista ordenada de migrações: (versão, descrição, comandos SQL).
+# Cada comando é um SQL ou (verificação, parâmetros, SQL), executado só se a verificação der 0.
+# Uma migração aplicada nunca deve ser alterada; alterações novas entram numa versão nova.
+MIGRACOES = [
+    (1, "Estrutura inicial", [
+        "CREATE TABLE IF NOT EXISTS categorias (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(50) UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS nomes_produtos (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(100) UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS descricoes (id INT AUTO_INCREMENT PRIMARY KEY, texto TEXT)",
+        "CREATE TABLE IF NOT EXISTS lojas (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(50) UNIQUE, localizacao VARCHAR(100))",
+        
+        """CREATE TABLE IF NOT EXISTS utilizadores (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nome_utilizador VARCHAR(50) UNIQUE,
+            palavra_passe VARCHAR(255),
+            cargo ENUM('admin', 'vendedor', 'cliente'),
+            loja_id INT NULL,
+            FOREIGN KEY (loja_id) REFERENCES lojas(id)
+        )""",
+        
+        """CREATE TABLE IF NOT EXISTS sessoes (
+            token CHAR(64) PRIMARY KEY,
+            nome_utilizador VARCHAR(50),
+            palavra_passe VARCHAR(255),
+            data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+        
+        """CREATE TABLE IF NOT EXISTS produtos (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            loja_id INT,
+            nome_produto_id INT,
+            categoria_id INT,
+            descricao_id INT,
+            preco DECIMAL(10, 2),
+            stock INT,
+            FOREIGN KEY (loja_id) REFERENCES lojas(id),
+            FOREIGN KEY (nome_produto_id) REFERENCES nomes_produtos(id),
+            FOREIGN KEY (categoria_id) REFERENCES categorias(id),
+            FOREIGN KEY (descricao_id) REFERENCES descricoes(id),
+            UNIQUE KEY unique_prod_store (loja_id, nome_produto_id)
+        )""",
+        
+        """CREATE TABLE IF NOT EXISTS encomendas (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            comprador_id INT,
+            loja_id INT,
+            vendedor_id INT NULL,
+            estado ENUM('pendente', 'concluida') DEFAULT 'pendente',
+            preco_total DECIMAL(10,2) DEFAULT 0,
+            data_encomenda DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (comprador_id) REFERENCES utilizadores(id),
+            FOREIGN KEY (loja_id) REFERENCES lojas(id),
+            FOREIGN KEY (vendedor_id) REFERENCES utilizadores(id)
+        )""",
+        
+        """CREATE TABLE IF NOT EXISTS itens_encomenda (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            encomenda_id INT,
+            produto_id INT,
+            quantidade INT,
+            preco_unitario DECIMAL(10,2),
+            FOREIGN KEY (encomenda_id) REFERENCES encomendas(id) ON DELETE CASCADE,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id),
+            UNIQUE KEY unique_product_per_order (encomenda_id, produto_id)
+        )""",
+    ]),
+    (2, "Índice para a limpeza de sessões expiradas", [
+        _se_nao_existir_indice('sessoes', 'idx_sessoes_data_criacao',
+            "ALTER TABLE sessoes ADD INDEX idx_sessoes_data_criacao (data_criacao)"),
+    ]),
+    (3, "Chave de idempotência das encomendas", [
+        # Única por comprador: um pedido repetido com a mesma chave encontra a encomenda original
+        _se_nao_existir_coluna('encomendas', 'chave_idempotencia',
+            "ALTER TABLE encomendas ADD COLUMN chave_idempotencia VARCHAR(64) NULL"),
+        _se_nao_existir_indice('encomendas', 'unique_chave_idempotencia',
+            "ALTER TABLE encomendas ADD UNIQUE KEY unique_chave_idempotencia (comprador_id, chave_idempotencia)"),
+    ]),
+    (4, "Reservas de stock do carrinho", [
+        """CREATE TABLE IF NOT EXISTS reservas (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            utilizador_id INT NOT NULL,
+            produto_id INT NOT NULL,
+            quantidade INT NOT NULL,
+            expira_em DATETIME NOT NULL,
+            FOREIGN KEY (utilizador_id) REFERENCES utilizadores(id) ON DELETE CASCADE,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_reserva_utilizador_produto (utilizador_id, produto_id),
+            INDEX idx_reservas_expira_em (expira_em)
+        )""",
+    ]),
+]
+
+class GestorMigracoes:
+    NOME_LOCK = 'sistema_vendas_migracoes'
+    TEMPO_ESPERA_LOCK_SEGUNDOS = 30
+
+    # Serializa as migrações dentro do processo; o GET_LOCK do MySQL serializa entre processos
+    _lock_processo = threading.Lock()
+
+    def __init__(self, bd):
+        self.bd = bd
+
+    def _criar_tabela_versoes(self):
+        self.bd.cursor.execute("""CREATE TABLE IF NOT EXISTS schema_versao (
+            versao INT PRIMARY KEY,
+            descricao VARCHAR(100),
+            data_aplicacao DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""")
+
+    def versao_atual(self):
+        self.bd.cursor.execute("SELECT COALESCE(MAX(versao), 0) AS versao FROM schema_versao")
+        return self.bd.cursor.fetchone()['versao']
+
+    def _obter_lock(self):
+        self.bd.cursor.execute("SELECT GET_LOCK(%s, %s) AS obtido", (GestorMigracoes.NOME_LOCK, GestorMigracoes.TEMPO_ESPERA_LOCK_SEGUNDOS))
+        resultado = self.bd.cursor.fetchone()
+        return resultado is not None and resultado['obtido'] == 1
+
+    def _libertar_lock(self):
+        try:
+            self.bd.cursor.execute("SELECT RELEASE_LOCK(%s) AS libertado", (GestorMigracoes.NOME_LOCK,))
+            self.bd.cursor.fetchone()
+        except Error:
+            pass
+
+    def aplicar(self):
+        with GestorMigracoes._lock_processo:
+            if self._obter_lock() is False:
+                raise ErroMigracao("Não foi possível obter o lock das migrações.")
+            
+            aplicadas = 0
+            try:
+                self._criar_tabela_versoes()
+                versao = self.versao_atual()
+
+                for numero, descricao, comandos in MIGRACOES:
+                    if numero <= versao:
+                        continue
+                    
+                    try:
+                        for comando in comandos:
+                            if isinstance(comando, tuple):
+                                verificacao, parametros, comando = comando
+                                self.bd.cursor.execute(verificacao, parametros)
+                                if self.bd.cursor.fetchone()['existe'] > 0:
+                                    continue  # Já aplicado por uma execução interrompida
+                            self.bd.cursor.execute(comando)
+                        self.bd.cursor.execute("INSERT INTO schema_versao (versao, descricao) VALUES (%s, %s)", (numero, descricao))
+                        self.bd.conexao.commit()
+                    except Error as erro_sql:
+                        self.bd.conexao.rollback()
+                        consola.erro(f"Erro ao aplicar migração {numero} ({descricao}): {erro_sql}")
+                        raise ErroMigracao(f"Migração {numero} falhou: {erro_sql}")
+                    
+                    aplicadas += 1
+                    consola.info_adicional(f"Migração {numero} aplicada: {descricao}")
+            finally:
+                self._libertar_lock()
+
+            return aplicadas
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import signal
+from enums import Cores
+from servidor.configuracao import ConfiguracaoServidor
+from servidor.protocolo import Protocolo
+from servidor.execucao import executor_pedidos_global, ErroServidorOcupado
+from servidor.sessao_ligacao import SessaoLigacao
+import consola
+
+# Motor alternativo ao ThreadingTCPServer: todas as ligações partilham um único ciclo de eventos,
+# por isso um terminal parado não ocupa nenhuma thread. O trabalho bloqueante (MySQL) corre
+# no ExecutorPedidos partilhado, com um número limitado de threads.
+class ServidorAsyncio:
+    def __init__(self, endereco, porta, reutilizar_porta=False):
+        self.endereco = endereco
+        self.porta = porta
+        self.reutilizar_porta = reutilizar_porta  # SO_REUSEPORT, usado no modo multi-processo
+        self._ligacoes = {}  # tarefa da ligação -> True enquanto executa um pedido
+        self._encerrando = False
+
+    async def _enviar_pacote(self, escritor, pacote_resposta):
+        escritor.write(Protocolo.serializar_pacote(pacote_resposta))
+        await escritor.drain()
+
+    async def _responder(self, escritor, pedido, sessao_ligacao):
+        try:
+            futuro = executor_pedidos_global.submeter(Protocolo.responder_pedido, pedido, sessao_ligacao)
+            pacote_resposta = await asyncio.wrap_future(futuro)
+        except ErroServidorOcupado:
+            pacote_resposta = Protocolo.pacote_servidor_ocupado(pedido)
+        await self._enviar_pacote(escritor, pacote_resposta)
+
+    async def _responder_com_id(self, escritor, pedido, sessao_ligacao):
+        # Corre numa tarefa própria: os erros de escrita não têm a quem ser propagados
+        try:
+            await self._responder(escritor, pedido, sessao_ligacao)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    async def _tratar_cliente(self, leitor, escritor):
+        endereco_cliente = escritor.get_extra_info('peername')
+        tarefa = asyncio.current_task()
+        self._ligacoes[tarefa] = False
+        pedidos_em_curso = set()  # Tarefas dos pedidos com 'id' desta ligação
+        sessao_ligacao = SessaoLigacao(endereco_cliente[0] if endereco_cliente else None)
+
+        try:
+            # Loop para processar múltiplos comandos na mesma conexão
+            while not self._encerrando:
+                try:
+                    linha_bytes = await leitor.readline()
+                except ValueError:
+                    # Linha maior do que o limite do StreamReader
+                    await self._enviar_pacote(escritor, Protocolo.criar_pacote(False, erro='Pedido demasiado grande.'))
+                    break
+
+                # Cliente fechou a conexão
+                if not linha_bytes:
+                    break
+
+                try:
+                    pedido = Protocolo.interpretar_pedido(linha_bytes)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    await self._enviar_pacote(escritor, Protocolo.criar_pacote(False, erro='Formato JSON inválido.'))
+                    break
+
+                if pedido is None:
+                    break
+
+                self._ligacoes[tarefa] = True
+                if 'id' in pedido:
+                    # Pedidos com 'id' correm em paralelo e respondem pela ordem em que terminam
+                    if len(pedidos_em_curso) >= ConfiguracaoServidor.PEDIDOS_SIMULTANEOS_POR_LIGACAO:
+                        await asyncio.wait(pedidos_em_curso, return_when=asyncio.FIRST_COMPLETED)
+                    tarefa_pedido = asyncio.create_task(self._responder_com_id(escritor, pedido, sessao_ligacao))
+                    pedidos_em_curso.add(tarefa_pedido)
+                    tarefa_pedido.add_done_callback(pedidos_em_curso.discard)
+                else:
+                    # Sem 'id' o cliente espera as respostas pela ordem dos pedidos
+                    if len(pedidos_em_curso) > 0:
+                        await asyncio.wait(pedidos_em_curso)
+                    await self._responder(escritor, pedido, sessao_ligacao)
+                self._ligacoes[tarefa] = False
+
+        except (ConnectionResetError, BrokenPipeError):
+            # Cliente desconectou abruptamente
+            pass
+        except asyncio.CancelledError:
+            # Ligação cancelada pelo encerramento do servidor
+            pass
+        except Exception as e:
+            consola.erro(f"Erro na ligação com {endereco_cliente}: {e}")
+        finally:
+            # As respostas aos pedidos ainda em curso têm de sair antes de a ligação fechar
+            if len(pedidos_em_curso) > 0:
+                try:
+                    await asyncio.wait(pedidos_em_curso)
+                except asyncio.CancelledError:
+                    for tarefa_pedido in pedidos_em_curso:
+                        tarefa_pedido.cancel()
+            self._ligacoes.pop(tarefa, None)
+            escritor.close()
+            try:
+                await escritor.wait_closed()
+            except Exception:
+                pass
+
+    async def _servir(self):
+        servidor = await asyncio.start_server(
+            self._tratar_cliente,
+            self.endereco,
+            self.porta,
+            reuse_address=True,
+            reuse_port=self.reutilizar_porta,
+            limit=ConfiguracaoServidor.TAMANHO_MAXIMO_PEDIDO
+        )
+
+        print(f'{Cores.VERDE}Servidor online em {self.endereco}:{self.porta} (asyncio){Cores.NORMAL}')
+        print(f'{Cores.CIANO}Pressione Ctrl+C para encerrar.{Cores.NORMAL}')
+
+        # O SIGTERM (enviado pelo supervisor no modo multi-processo) termina o ciclo de eventos
+        # de forma ordenada, em vez de interromper uma callback a meio.
+        encerrar = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, encerrar.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows não suporta add_signal_handler
+            pass
+
+        try:
+            await encerrar.wait()
+        finally:
+            # Também corre quando o Ctrl+C cancela esta tarefa
+            servidor.close()
+            await self._drenar_ligacoes()
+            await servidor.wait_closed()
+
+    async def _drenar_ligacoes(self):
+        self._encerrando = True
+
+        # Ligações à espera do cliente deixam de ler (as que têm pedidos com 'id' em curso
+        # ainda enviam essas respostas antes de fechar)
+        for tarefa, em_pedido in list(self._ligacoes.items()):
+            if not em_pedido:
+                tarefa.cancel()
+
+        # As restantes terminam os pedidos atuais, até ao prazo de encerramento
+        if len(self._ligacoes) > 0:
+            _, pendentes = await asyncio.wait(list(self._ligacoes), timeout=ConfiguracaoServidor.ENCERRAMENTO_PRAZO_SEGUNDOS)
+            if len(pendentes) > 0:
+                consola.aviso(f"{len(pendentes)} ligação(ões) com pedidos que não terminaram dentro do prazo de encerramento.")
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+        if len(self._ligacoes) > 0:
+            await asyncio.gather(*self._ligacoes, return_exceptions=True)
+
+    def executar(self):
+        asyncio.run(self._servir())
@@ -0,0 +1,152 @@
+import threading
+import time
+from contextlib import contextmanager
+import consola
+from servidor.base_de_dados import GestorBaseDados, ErroConexaoBD
+from servidor.configuracao import ConfiguracaoServidor
+
+class PoolConexoes:
+    def __init__(self, tamanho_maximo=None, tempo_espera_segundos=None):
+        if tamanho_maximo is None:
+            tamanho_maximo = ConfiguracaoServidor.POOL_TAMANHO_MAXIMO
+        if tempo_espera_segundos is None:
+            tempo_espera_segundos = ConfiguracaoServidor.POOL_TEMPO_ESPERA_SEGUNDOS
+
+        self.tamanho_maximo = tamanho_maximo
+        self.tempo_espera_segundos = tempo_espera_segundos
+        self._livres = []  # Lista de (gestor, instante_devolucao); usada como pilha para reutilizar as conexões mais recentes
+        self._total = 0  # Conexões abertas, livres ou emprestadas
+        self._condicao = threading.Condition()
+
+    def _criar_gestor(self, tentativas_maximas, preparar_esquema=False, silencioso=True):
+        gestor = GestorBaseDados(
+            host=ConfiguracaoServidor.BD_ENDERECO,
+            utilizador=ConfiguracaoServidor.BD_UTILIZADOR,
+            palavra_passe=ConfiguracaoServidor.BD_PALAVRA_PASSE,
+            nome_banco=ConfiguracaoServidor.BD_NOME
+        )
+        gestor.conectar(tentativas_maximas=tentativas_maximas, preparar_esquema=preparar_esquema, silencioso=silencioso)
+        return gestor
+
+    @staticmethod
+    def _fechar_gestor(gestor):
+        try:
+            if gestor.conexao is not None:
+                gestor.conexao.close()
+        except Exception:
+            pass
+
+    def _conexao_saudavel(self, gestor, instante_devolucao):
+        if gestor.conexao is None:
+            return False
+        
+        # Evita um ping por pedido: só testa conexões que estiveram paradas algum tempo
+        if time.monotonic() - instante_devolucao < ConfiguracaoServidor.POOL_VERIFICAR_APOS_SEGUNDOS:
+            return True
+        try:
+            return gestor.conexao.is_connected()
+        except Exception:
+            return False
+
+    def obter(self):
+        limite = time.monotonic() + self.tempo_espera_segundos
+
+        while True:
+            gestor = None
+            instante_devolucao = None
+            with self._condicao:
+                while True:
+                    if len(self._livres) > 0:
+                        gestor, instante_devolucao = self._livres.pop()
+                        break
+
+                    # Ainda há espaço: reserva o lugar e abre a conexão fora do lock
+                    if self._total < self.tamanho_maximo:
+                        self._total += 1
+                        break
+
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise ErroConexaoBD("Não há conexões livres na pool.")
+                    self._condicao.wait(restante)
+
+            if gestor is None:
+                try:
+                    return self._criar_gestor(ConfiguracaoServidor.POOL_TENTATIVAS_CONEXAO)
+                except Exception:
+                    self._libertar_lugar()
+                    raise
+
+            if self._conexao_saudavel(gestor, instante_devolucao):
+                return gestor
+
+            # Conexão morta (ex: wait_timeout do MySQL): descarta e tenta outra
+            self._fechar_gestor(gestor)
+            self._libertar_lugar()
+
+    def devolver(self, gestor, descartar=False):
+        if descartar is False:
+            try:
+                # Termina qualquer transação pendente para o próximo pedido começar limpo
+                gestor.conexao.rollback()
+            except Exception:
+                descartar = True
+
+        if descartar is True:
+            self._fechar_gestor(gestor)
+            self._libertar_lugar()
+            return
+
+        with self._condicao:
+            self._livres.append((gestor, time.monotonic()))
+            self._condicao.notify()
+
+    def _libertar_lugar(self):
+        with self._condicao:
+            self._total -= 1
+            self._condicao.notify()
+
+    @contextmanager
+    def emprestar(self):
+        # Empréstimo por pedido: a conexão volta à pool assim que o bloco termina
+        gestor = self.obter()
+        try:
+            yield gestor
+        finally:
+            self.devolver(gestor)
+
+    def verificar_ligacao(self, tentativas_maximas=10):
+        # Abre a primeira conexão (com várias tentativas), aplica as migrações pendentes
+        # uma única vez e deixa a conexão na pool já pronta a usar
+        with self._condicao:
+            self._total += 1
+        try:
+            # Só a verificação do arranque mostra o progresso e a ajuda do XAMPP na consola
+            gestor = self._criar_gestor(tentativas_maximas, preparar_esquema=True, silencioso=False)
+        except Exception:
+            self._libertar_lugar()
+            raise
+        self.devolver(gestor)
+
+    def estatisticas(self):
+        with self._condicao:
+            return {
+                'tamanho_maximo': self.tamanho_maximo,
+                'conexoes_abertas': self._total,
+                'conexoes_livres': len(self._livres)
+            }
+
+    def fechar(self):
+        with self._condicao:
+            livres = self._livres
+            self._livres = []
+            self._total -= len(livres)
+            self._condicao.notify_all()
+
+        for gestor, _ in livres:
+            self._fechar_gestor(gestor)
+
+        if ConfiguracaoServidor.MODO_DEPURACAO is True:
+            consola.info_adicional(f"Pool de conexões fechada ({len(livres)} conexões).")
+
+pool_conexoes_global = PoolConexoes()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+from enums import Mensagem
+from servidor.base_de_dados import ErroConexaoBD
+from servidor.configuracao import ConfiguracaoServidor
+from servidor.pool_conexoes import pool_conexoes_global
+from servidor.comandos import ProcessadorComandos, gestor_comandos_global
+import consola
+
+# Resultado cujo JSON já foi gerado (ex: a lista de comandos do 'help'): os bytes são
+# colocados diretamente na resposta, sem voltar a serializar o conteúdo.
+class ResultadoSerializado:
+    def __init__(self, valor, dados):
+        self.valor = valor  # Conteúdo original, usado se tiver de ser serializado de novo (ex: dentro de um lote)
+        self.dados = dados  # JSON do conteúdo, em bytes UTF-8
+
+def _converter_para_json(objeto):
+    if isinstance(objeto, ResultadoSerializado):
+        return objeto.valor
+    # Recurso para serializar tipos não-padrão (como datetime)
+    return str(objeto)
+
+# Protocolo partilhado pelos motores do servidor (threading e asyncio):
+# cada pedido e cada resposta é um objeto JSON numa linha terminada por '\n'.
+class Protocolo:
+    @staticmethod
+    def criar_pacote(sucesso, resultado=None, erro=None):
+        pacote_resposta = {'ok': sucesso}
+        if resultado is not None:
+            pacote_resposta['resultado'] = resultado
+        if erro is not None:
+            pacote_resposta['erro'] = erro
+        return pacote_resposta
+
+    @staticmethod
+    def associar_id(pedido, pacote_resposta):
+        # O 'id' opcional do pedido é devolvido tal como veio, para o cliente poder associar
+        # a resposta ao pedido quando tem vários pedidos em curso na mesma ligação.
+        if 'id' in pedido:
+            pacote_resposta['id'] = pedido['id']
+        return pacote_resposta
+
+    @staticmethod
+    def pacote_servidor_ocupado(pedido):
+        pacote_resposta = Protocolo.criar_pacote(False, erro=str(Mensagem.SERVIDOR_OCUPADO))
+        pacote_resposta['tentar_novamente_em'] = ConfiguracaoServidor.SEGUNDOS_TENTAR_NOVAMENTE
+        return Protocolo.associar_id(pedido, pacote_resposta)
+
+    @staticmethod
+    def serializar_pacote(pacote_resposta):
+        resultado = pacote_resposta.get('resultado')
+        if isinstance(resultado, ResultadoSerializado):
+            # Serializa o resto do pacote e acrescenta o resultado já em JSON antes do '}' final
+            restante = {}
+            for chave, valor in pacote_resposta.items():
+                if chave != 'resultado':
+                    restante[chave] = valor
+            cabecalho = json.dumps(restante, ensure_ascii=False, default=_converter_para_json)
+            mensagem_bytes = cabecalho[:-1].encode('utf-8') + b', "resultado": ' + resultado.dados + b'}\n'
+        else:
+            mensagem_serializada = json.dumps(pacote_resposta, ensure_ascii=False, default=_converter_para_json) + '\n'
+            mensagem_bytes = mensagem_serializada.encode('utf-8')
+
+        if ConfiguracaoServidor.MODO_DEPURACAO is True:
+            consola.info_adicional(f">> {mensagem_bytes.decode('utf-8')}")
+        return mensagem_bytes
+
+    @staticmethod
+    def interpretar_pedido(linha_bytes):
+        # Lança json.JSONDecodeError se a linha não for JSON válido
+        dados = json.loads(linha_bytes.decode('utf-8'))
+        
+        if not isinstance(dados, dict):
+            return None
+        
+        if ConfiguracaoServidor.MODO_DEPURACAO is True:
+            consola.info_adicional(f"<< {dados}")
+        return dados
+
+    @staticmethod
+    def pacote_do_resultado(comando, resultado):
+        mensagens_sucesso = comando.mensagens_sucesso
+
+        if mensagens_sucesso is None:
+            mensagens_sucesso = []
+
+        match resultado:
+            # Caso em que o resultado é diretamente uma Mensagem
+            case Mensagem() as mensagem_resultado:
+                if mensagem_resultado in mensagens_sucesso:
+                    return Protocolo.criar_pacote(True, resultado=str(mensagem_resultado))
+                return Protocolo.criar_pacote(False, erro=str(mensagem_resultado))
+
+            # Caso em que o resultado é uma tupla (Mensagem, dados)
+            case (Mensagem() as mensagem_resultado, conteudo_resultado):
+                if mensagem_resultado in mensagens_sucesso:
+                    return Protocolo.criar_pacote(True, resultado=conteudo_resultado)
+                return Protocolo.criar_pacote(False, erro=str(mensagem_resultado)) # Mensagem de erro
+
+            # Qualquer outro tipo de resultado é considerado sucesso direto
+            case _:
+                return Protocolo.criar_pacote(True, resultado=resultado)
+
+    @staticmethod
+    def pacote_condicional(pacote_resposta, versao_conhecida):
+        # A versão é um hash do resultado serializado. Se o cliente já tem essa versão, recebe
+        # só a confirmação e reutiliza a sua cópia; senão recebe o resultado e a nova versão.
+        resultado = pacote_resposta.get('resultado')
+        if isinstance(resultado, ResultadoSerializado):
+            dados = resultado.dados
+        else:
+            dados = json.dumps(resultado, ensure_ascii=False, default=_converter_para_json).encode('utf-8')
+            resultado = ResultadoSerializado(resultado, dados)
+        versao = hashlib.sha1(dados).hexdigest()[:16]
+
+        if versao_conhecida == versao:
+            return {'ok': True, 'nao_modificado': True, 'versao': versao}
+
+        pacote_resposta['resultado'] = resultado  # Já serializado: não volta a ser codificado no envio
+        pacote_resposta['versao'] = versao
+        return pacote_resposta
+
+    @staticmethod
+    def responder_pedido(pedido, sessao_ligacao=None):
+        # Executa um pedido já interpretado e devolve o pacote de resposta.
+        # É bloqueante (usa MySQL), por isso os motores chamam-no através do ExecutorPedidos.
+        # sessao_ligacao guarda o utilizador já autenticado na ligação de onde veio o pedido.
+        return Protocolo.associar_id(pedido, Protocolo._executar_pedido(pedido, sessao_ligacao))
+
+    @staticmethod
+    def _executar_pedido(pedido, sessao_ligacao):
+        acao = pedido.get('acao')
+        parametros = pedido.get('parametros', {})
+
+        try:
+            with pool_conexoes_global.emprestar() as gestor_bd:
+                comando, resultado = ProcessadorComandos.processar_pedido(
+                    gestor_bd,
+                    gestor_comandos_global,
+                    acao,
+                    parametros,
+                    sessao_ligacao
+                )
+
+            if comando is None:
+                return Protocolo.criar_pacote(False, erro='Comando não encontrado.')
+
+            pacote_resposta = Protocolo.pacote_do_resultado(comando, resultado)
+            if comando.condicional and pacote_resposta['ok'] is True and isinstance(parametros, dict):
+                return Protocolo.pacote_condicional(pacote_resposta, parametros.get('versao_conhecida'))
+            return pacote_resposta
+
+        except ErroConexaoBD:
+            return Protocolo.criar_pacote(False, erro='Falha crítica na base de dados.')
+        except Exception as e:
+            return Protocolo.criar_pacote(False, erro=f"Erro inesperado no servidor: {e}")
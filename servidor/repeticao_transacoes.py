@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+import mysql.connector
+from servidor.configuracao import ConfiguracaoServidor
+
+# Repete uma transação que o MySQL anulou por deadlock (1213) ou por esperar demasiado por
+# um bloqueio (1205). Nos dois casos a transação pode simplesmente voltar a ser executada:
+# entre tentativas é feito rollback e espera-se um tempo aleatório, que cresce a cada
+# tentativa, para que as transações em conflito não voltem a colidir ao mesmo tempo.
+class RepetidorTransacoes:
+    ERROS_REPETIVEIS = (1213, 1205)  # ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+    def __init__(self, tentativas_maximas=None, espera_base_segundos=None, espera_maxima_segundos=None):
+        if tentativas_maximas is None:
+            tentativas_maximas = ConfiguracaoServidor.TRANSACOES_TENTATIVAS_MAXIMAS
+        if espera_base_segundos is None:
+            espera_base_segundos = ConfiguracaoServidor.TRANSACOES_ESPERA_BASE_SEGUNDOS
+        if espera_maxima_segundos is None:
+            espera_maxima_segundos = ConfiguracaoServidor.TRANSACOES_ESPERA_MAXIMA_SEGUNDOS
+
+        self.tentativas_maximas = tentativas_maximas
+        self.espera_base_segundos = espera_base_segundos
+        self.espera_maxima_segundos = espera_maxima_segundos
+        self._contadores = {}  # operação -> {'repeticoes', 'desistencias'}
+        self._lock = threading.Lock()
+
+    def _contar(self, operacao, contador):
+        with self._lock:
+            contadores = self._contadores.setdefault(operacao, {'repeticoes': 0, 'desistencias': 0})
+            contadores[contador] += 1
+
+    def executar(self, bd, operacao, funcao):
+        # funcao faz a transação completa (incluindo o commit) e devolve o resultado.
+        # Dentro de um lote transacional não se repete nada: o MySQL já anulou o lote inteiro,
+        # não só esta operação, e o lote tem de terminar como anulado.
+        tentativas = self.tentativas_maximas
+        if getattr(bd, 'em_transacao', False):
+            tentativas = 1
+
+        for tentativa in range(1, tentativas + 1):
+            try:
+                return funcao()
+            except mysql.connector.Error as erro:
+                bd.conexao.rollback()
+                if erro.errno not in RepetidorTransacoes.ERROS_REPETIVEIS:
+                    raise
+                if tentativa == tentativas:
+                    self._contar(operacao, 'desistencias')
+                    raise
+
+                self._contar(operacao, 'repeticoes')
+                espera_maxima = min(self.espera_maxima_segundos, self.espera_base_segundos * 2 ** (tentativa - 1))
+                time.sleep(random.uniform(0, espera_maxima))
+
+    def estatisticas(self):
+        with self._lock:
+            return {operacao: dict(contadores) for operacao, contadores in self._contadores.items()}
+
+repetidor_transacoes_global = RepetidorTransacoes()
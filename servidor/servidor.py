@@ -2,14 +2,26 @@ import json
 import socketserver
 import threading
 import socket
-import select
 import os
 import time
 import warnings
 from servidor.base_de_dados import GestorBaseDados, ErroConexaoBD
-from enums import Mensagem, Cores
+from servidor.pool_conexoes import pool_conexoes_global
+from servidor.migracoes import ErroMigracao
+from servidor.protocolo import Protocolo
+from servidor.execucao import executor_pedidos_global, ErroServidorOcupado
+from servidor.agendador import agendador_tarefas_global
+from servidor.entidades import Sessao, Reserva
+from servidor.cache_sessoes import cache_sessoes_global
+from servidor.cache_catalogo import cache_catalogo_global
+from servidor.indice_prefixos import indices_prefixos_global
+from servidor.indice_trigramas import indice_trigramas_global
+from servidor.motor_asyncio import ServidorAsyncio
+from servidor.supervisor import SupervisorProcessos
+from servidor.encerramento import ControloEncerramento
+from servidor.sessao_ligacao import SessaoLigacao
+from enums import Cores
 from servidor.configuracao import ConfiguracaoServidor
-from servidor.comandos import ProcessadorComandos, gestor_comandos_global
 import consola
 
 def carregar_dados_exemplo():
@@ -33,17 +45,6 @@ def carregar_dados_exemplo():
         
         consola.info_adicional(f"Carregando SQL de: {caminho_sql}")
         
-        bd = GestorBaseDados()
-        try:
-            bd.conectar()
-        except ErroConexaoBD:
-            consola.erro("Erro ao conectar à base de dados.")
-            return False
-        
-        if bd.cursor is None or bd.conexao is None:
-            consola.erro("Cursor ou conexão da base de dados não estão disponíveis.")
-            return False
-        
         try:
             with open(caminho_sql, 'r', encoding='utf-8') as arquivo:
                 conteudo_sql = arquivo.read()
@@ -56,17 +57,23 @@ def carregar_dados_exemplo():
         total_comandos = len([c for c in comandos if c.strip()])
         executados = 0
         
-        for i, comando in enumerate(comandos):
-            comando = comando.strip()
-            if len(comando) > 0:
-                try:
-                    consola.info_adicional(f"Executando comando {i+1}/{total_comandos}...")
-                    bd.cursor.execute(comando)
-                    executados += 1
-                except Exception as e:
-                    consola.aviso(f"Aviso ao executar comando SQL: {e}")
-        
-        bd.conexao.commit()
+        try:
+            with pool_conexoes_global.emprestar() as bd:
+                for i, comando in enumerate(comandos):
+                    comando = comando.strip()
+                    if len(comando) > 0:
+                        try:
+                            consola.info_adicional(f"Executando comando {i+1}/{total_comandos}...")
+                            bd.cursor.execute(comando)
+                            executados += 1
+                        except Exception as e:
+                            consola.aviso(f"Aviso ao executar comando SQL: {e}")
+                
+                bd.conexao.commit()
+        except ErroConexaoBD:
+            consola.erro("Erro ao conectar à base de dados.")
+            return False
+
         consola.sucesso(f"Dados de exemplo carregados com sucesso! ({executados} comandos executados)")
         return True
         
@@ -76,157 +83,188 @@ def carregar_dados_exemplo():
         traceback.print_exc()
         return False
 
-class GestorPedidosTCP(socketserver.StreamRequestHandler):
-    # Flag de classe para sinalizar shutdown
-    servidor_encerrando = False
-    
-    def _enviar_resposta(self, sucesso, resultado=None, erro=None):
-        pacote_resposta = {'ok': sucesso}
-        if resultado is not None:
-            pacote_resposta['resultado'] = resultado
-        if erro is not None:
-            pacote_resposta['erro'] = erro
-        
+def remover_sessoes_expiradas():
+    with pool_conexoes_global.emprestar() as bd:
+        removidas = Sessao.remover_expiradas(bd, ConfiguracaoServidor.SESSOES_LIMPEZA_TAMANHO_LOTE)
+    if removidas > 0 and ConfiguracaoServidor.MODO_DEPURACAO is True:
+        consola.info_adicional(f"{removidas} sessões expiradas removidas.")
+    return {'sessoes_removidas': removidas}
+
+def devolver_reservas_expiradas():
+    with pool_conexoes_global.emprestar() as bd:
+        removidas = Reserva.remover_expiradas(bd, ConfiguracaoServidor.RESERVAS_LIMPEZA_TAMANHO_LOTE)
+    if removidas > 0 and ConfiguracaoServidor.MODO_DEPURACAO is True:
+        consola.info_adicional(f"{removidas} reservas de carrinho expiradas devolvidas ao stock.")
+    return {'reservas_removidas': removidas}
+
+def registar_tarefas_periodicas():
+    agendador_tarefas_global.registar(
+        'remover_sessoes_expiradas',
+        remover_sessoes_expiradas,
+        ConfiguracaoServidor.SESSOES_LIMPEZA_INTERVALO_SEGUNDOS
+    )
+    agendador_tarefas_global.registar(
+        'devolver_reservas_expiradas',
+        devolver_reservas_expiradas,
+        ConfiguracaoServidor.RESERVAS_LIMPEZA_INTERVALO_SEGUNDOS
+    )
+
+class GestorPedidosTCP(socketserver.BaseRequestHandler):
+    def setup(self):
+        # O ControloEncerramento é criado por _executar_motor_threading e pendurado no servidor
+        self.controlo_encerramento = self.server.controlo_encerramento
+        self.seletor = self.controlo_encerramento.criar_seletor(self.request)
+        self.buffer = bytearray()
+        self.sessao_ligacao = SessaoLigacao(self.client_address[0])
+        # Pedidos com 'id' correm em paralelo e respondem quando terminam (nas threads do
+        # ExecutorPedidos), por isso o envio é protegido por um lock.
+        self.lock_envio = threading.Lock()
+        # O envio é feito por threads do ExecutorPedidos: um cliente que deixa de ler as respostas
+        # não pode prender uma dessas threads, por isso o sendall tem um prazo (ver _enviar_pacote)
+        self.request.settimeout(ConfiguracaoServidor.ENVIO_PRAZO_SEGUNDOS)
+        self.condicao_pedidos = threading.Condition()
+        self.pedidos_em_curso = 0
+
+    def finish(self):
+        # As respostas aos pedidos ainda em curso têm de sair antes de o socket ser fechado
+        self._aguardar_pedidos(0)
+        self.seletor.close()
+
+    def _enviar_pacote(self, pacote_resposta):
         try:
-            # O `default=str` é um recurso para serializar tipos não-padrão (como datetime).
-            mensagem_serializada = json.dumps(pacote_resposta, ensure_ascii=False, default=str) + '\n'
-            if ConfiguracaoServidor.MODO_DEPURACAO is True:
-                consola.info_adicional(f">> {mensagem_serializada}")
-            self.wfile.write(mensagem_serializada.encode('utf-8'))
-            self.wfile.flush()
+            with self.lock_envio:
+                self.request.sendall(Protocolo.serializar_pacote(pacote_resposta))
+        except socket.timeout:
+            # Parte da resposta pode já ter saído, por isso a ligação não pode continuar a ser usada
+            consola.erro(f"O cliente {self.client_address} não está a ler as respostas. A ligação vai ser fechada.")
+            self._fechar_ligacao()
         except Exception as e:
             consola.erro(f"Erro ao enviar resposta para {self.client_address}: {e}")
 
-    def _ler_pedido(self):
+    def _fechar_ligacao(self):
+        # O shutdown acorda o seletor de handle() (o recv devolve vazio e o ciclo termina) e faz
+        # falhar logo os envios das respostas que ainda estejam em curso
         try:
-            # Usa select para verificar se há dados disponíveis com timeout de 1 segundo
-            # Isso permite verificar a flag de shutdown periodicamente
-            pronto, _, _ = select.select([self.request], [], [], 1.0)
-            
-            if not pronto:
-                # Timeout - nenhum dado disponível ainda
-                return 'TIMEOUT'
-            
-            # Há dados disponíveis, agora podemos ler com segurança
-            linha_bytes = self.rfile.readline()
-            if not linha_bytes:
-                return 'DESCONECTADO'
-            
-            dados = json.loads(linha_bytes.decode('utf-8'))
-            
-            if not isinstance(dados, dict):
-                return None
-            
-            if ConfiguracaoServidor.MODO_DEPURACAO is True:
-                consola.info_adicional(f"<< {dados}")
-            return dados
-        except json.JSONDecodeError as e:
-            self._enviar_resposta(False, erro='Formato JSON inválido.')
-            return None
-        except Exception as e:
-            return 'DESCONECTADO'
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
-    def handle(self):
-        # Não define timeout no socket - select() em _ler_pedido() cuida do timeout
-        # Isso evita o problema de "cannot read from timed out object"
-        
-        gestor_bd = GestorBaseDados()
+    def _aguardar_pedidos(self, maximo_em_curso):
+        with self.condicao_pedidos:
+            self.condicao_pedidos.wait_for(lambda: self.pedidos_em_curso <= maximo_em_curso)
+
+    def _submeter_pedido_com_id(self, pedido):
+        # Limita os pedidos simultâneos de uma ligação para um cliente não ocupar o executor todo
+        self._aguardar_pedidos(ConfiguracaoServidor.PEDIDOS_SIMULTANEOS_POR_LIGACAO - 1)
         try:
-            gestor_bd.conectar()
-        except ErroConexaoBD:
-            self._enviar_resposta(False, erro='Falha crítica na base de dados.')
+            futuro = executor_pedidos_global.submeter(Protocolo.responder_pedido, pedido, self.sessao_ligacao)
+        except ErroServidorOcupado:
+            self._enviar_pacote(Protocolo.pacote_servidor_ocupado(pedido))
             return
-        
+
+        with self.condicao_pedidos:
+            self.pedidos_em_curso += 1
+        self.controlo_encerramento.iniciar_pedido()
+        futuro.add_done_callback(self._pedido_terminado)
+
+    def _pedido_terminado(self, futuro):
         try:
-            # Loop para processar múltiplos comandos na mesma conexão
-            while not GestorPedidosTCP.servidor_encerrando:
+            self._enviar_pacote(futuro.result())
+        finally:
+            with self.condicao_pedidos:
+                self.pedidos_em_curso -= 1
+                self.condicao_pedidos.notify_all()
+            self.controlo_encerramento.terminar_pedido()
+
+    def _enviar_resposta(self, sucesso, resultado=None, erro=None):
+        self._enviar_pacote(Protocolo.criar_pacote(sucesso, resultado, erro))
+
+    def _ler_pedido(self):
+        # Devolve o próximo pedido (dict) ou None quando a ligação deve terminar.
+        # Lê do socket para um buffer próprio: assim, se o cliente enviar várias linhas de uma vez,
+        # nenhuma fica "escondida" num buffer que o seletor não vê.
+        while True:
+            fim_linha = self.buffer.find(b'\n')
+            if fim_linha != -1:
+                linha_bytes = bytes(self.buffer[:fim_linha + 1])
+                del self.buffer[:fim_linha + 1]
                 try:
-                    pedido = self._ler_pedido()
-                    
-                    # Timeout - continua aguardando
-                    if pedido == 'TIMEOUT':
-                        continue
-                    
-                    # Cliente fechou a conexão
-                    if pedido == 'DESCONECTADO' or pedido is None:
-                        break
-                    
-                    # pedido é um dict válido
-                    acao = pedido.get('acao')
-                    parametros = pedido.get('parametros', {})
+                    return Protocolo.interpretar_pedido(linha_bytes)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    self._enviar_resposta(False, erro='Formato JSON inválido.')
+                    return None
 
-                    try:
-                        resultado = ProcessadorComandos.processar_pedido(
-                            gestor_bd,
-                            gestor_comandos_global,
-                            acao,
-                            parametros
-                        )
-
-                        comando = gestor_comandos_global.obter(acao)
-
-                        if comando is None:
-                            self._enviar_resposta(
-                                False,
-                                erro='Comando não encontrado.'
-                            )
-                            continue
-
-                        mensagens_sucesso = comando.mensagens_sucesso
-
-                        if mensagens_sucesso is None:
-                            mensagens_sucesso = []
-
-                        match resultado:
-                            # Caso em que o resultado é diretamente uma Mensagem
-                            case Mensagem() as mensagem_resultado:
-                                if mensagem_resultado in mensagens_sucesso:
-                                    self._enviar_resposta(True,resultado=str(mensagem_resultado))
-                                else:
-                                    self._enviar_resposta(False,erro=str(mensagem_resultado))
-
-                            # Caso em que o resultado é uma tupla (Mensagem, dados)
-                            case (Mensagem() as mensagem_resultado, conteudo_resultado):
-                                if mensagem_resultado in mensagens_sucesso:
-                                    self._enviar_resposta(
-                                        True,
-                                        resultado=conteudo_resultado
-                                    )
-                                else: # Mensagem de erro
-                                    self._enviar_resposta(False, erro=str(mensagem_resultado))
-
-                            # Qualquer outro tipo de resultado é considerado sucesso direto
-                            case _:
-                                self._enviar_resposta(True, resultado=resultado)
-
-                    except Exception as e:
-                        self._enviar_resposta(False, erro=f"Erro inesperado no servidor: {e}")
-                        # Continua processando outros comandos mesmo após erro
+            if len(self.buffer) > ConfiguracaoServidor.TAMANHO_MAXIMO_PEDIDO:
+                self._enviar_resposta(False, erro='Pedido demasiado grande.')
+                return None
+
+            # Sem timeout: a thread só acorda quando o cliente envia dados ou o servidor encerra
+            self.seletor.select()
+            if self.controlo_encerramento.encerrando:
+                return None
+
+            try:
+                dados = self.request.recv(65536)
+            except OSError:
+                return None
+
+            # Cliente fechou a conexão
+            if not dados:
+                return None
+            self.buffer += dados
+
+    def handle(self):
+        # A conexão à base de dados é emprestada pela pool apenas durante cada pedido,
+        # por isso clientes parados não ocupam conexões MySQL.
+        
+        # Loop para processar múltiplos comandos na mesma conexão
+        while not self.controlo_encerramento.encerrando:
+            try:
+                pedido = self._ler_pedido()
+                if pedido is None:
+                    break
                 
-                except socket.timeout:
-                    # Timeout - verifica flag de shutdown e continua aguardando
+                # pedido é um dict válido; a execução é feita pelas threads do ExecutorPedidos
+                # e os erros no processamento são devolvidos no próprio pacote.
+                # Um pedido já lido é sempre respondido, mesmo que o servidor comece a encerrar.
+                if 'id' in pedido:
+                    self._submeter_pedido_com_id(pedido)
                     continue
-                except (ConnectionResetError, BrokenPipeError):
-                    # Cliente desconectou abruptamente
-                    break
-                except KeyboardInterrupt:
-                    # Servidor está sendo encerrado
-                    raise  # Re-lança para o handler externo
-                except Exception:
-                    # Outro erro - fecha a conexão
-                    break
-                    
-        finally:
-            # Fecha a conexão com o banco de dados ao finalizar
-            if gestor_bd.conexao:
-                gestor_bd.conexao.close()
+
+                # Sem 'id' o cliente espera as respostas pela ordem dos pedidos
+                self._aguardar_pedidos(0)
+                with self.controlo_encerramento.pedido_em_curso():
+                    try:
+                        futuro = executor_pedidos_global.submeter(Protocolo.responder_pedido, pedido, self.sessao_ligacao)
+                        self._enviar_pacote(futuro.result())
+                    except ErroServidorOcupado:
+                        self._enviar_pacote(Protocolo.pacote_servidor_ocupado(pedido))
+            
+            except (ConnectionResetError, BrokenPipeError):
+                # Cliente desconectou abruptamente
+                break
+            except Exception:
+                # Outro erro - fecha a conexão
+                break
 
 class UtilitariosServidor:
     @staticmethod
     def limpar_base_dados_depuracao():
         if not ConfiguracaoServidor.MODO_DEPURACAO: return
         try:
-            bd = GestorBaseDados(limpar_base_dados=True)
+            pool_conexoes_global.fechar()
+            cache_sessoes_global.limpar()
+            cache_catalogo_global.invalidar()
+            for indice in indices_prefixos_global.values():
+                indice.invalidar()
+            indice_trigramas_global.invalidar()
+            bd = GestorBaseDados(
+                host=ConfiguracaoServidor.BD_ENDERECO,
+                utilizador=ConfiguracaoServidor.BD_UTILIZADOR,
+                palavra_passe=ConfiguracaoServidor.BD_PALAVRA_PASSE,
+                nome_banco=ConfiguracaoServidor.BD_NOME,
+                limpar_base_dados=True
+            )
             if bd.conectar():
                 consola.sucesso('Base de dados limpa e recriada com sucesso!')
             else:
@@ -304,7 +342,7 @@ class UtilitariosServidor:
         finally:
             sock.close()
 
-def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False, funcoes_atalhos=None):
+def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False, funcoes_atalhos=None, motor='threading', processos=1):
     ConfiguracaoServidor.MODO_DEPURACAO = depuracao
     consola.info_adicional("A verificar as configurações do servidor...")
     if UtilitariosServidor.verificar_porta_ocupada(endereco, porta):
@@ -313,12 +351,10 @@ def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False,
     
     # Verificar conexão com a base de dados antes de iniciar o servidor
     consola.info_adicional("A verificar conexão com a base de dados...")
-    bd_teste = GestorBaseDados()
     try:
-        bd_teste.conectar()
-        if bd_teste.conexao:
-            bd_teste.conexao.close()
-    except ErroConexaoBD as e:
+        # A primeira conexão fica na pool, pronta para o primeiro cliente
+        pool_conexoes_global.verificar_ligacao()
+    except (ErroConexaoBD, ErroMigracao) as e:
         # O método conectar() já mostrou as mensagens de erro detalhadas
         # via exibir_erro_conexao() durante as tentativas
         consola.erro("\nServidor não pode iniciar sem conexão com a base de dados.")
@@ -332,6 +368,25 @@ def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False,
     if dados_exemplo_bd:
         carregar_dados_exemplo()
 
+    if processos > 1:
+        if SupervisorProcessos.suportado():
+            # Cada trabalhador abre as suas próprias conexões: nenhuma conexão MySQL pode atravessar o fork
+            pool_conexoes_global.fechar()
+            cache_sessoes_global.ttl_maximo_segundos = ConfiguracaoServidor.CACHE_SESSOES_TTL_MULTIPROCESSO_SEGUNDOS
+            cache_catalogo_global.ttl_segundos = ConfiguracaoServidor.CACHE_CATALOGO_TTL_MULTIPROCESSO_SEGUNDOS
+            for indice in indices_prefixos_global.values():
+                indice.ttl_segundos = ConfiguracaoServidor.SUGESTOES_TTL_MULTIPROCESSO_SEGUNDOS
+            indice_trigramas_global.ttl_segundos = ConfiguracaoServidor.SUGESTOES_TTL_MULTIPROCESSO_SEGUNDOS
+            # As tarefas periódicas só precisam de correr num dos trabalhadores
+            supervisor = SupervisorProcessos(
+                processos,
+                lambda indice: _executar_motor(endereco, porta, motor, reutilizar_porta=True, tarefas_periodicas=(indice == 0))
+            )
+            supervisor.executar()
+            print(f"{Cores.VERDE}Servidor encerrado com sucesso.{Cores.NORMAL}")
+            return
+        consola.aviso("O modo multi-processo requer fork e SO_REUSEPORT (ex: Linux). A usar um único processo.")
+
     # Iniciar threads para cada função de atalho fornecida
     if funcoes_atalhos is None:
         funcoes_atalhos = []
@@ -342,14 +397,55 @@ def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False,
     for func in funcoes_atalhos:
         threading.Thread(target=func, daemon=True).start()
     
+    _executar_motor(endereco, porta, motor)
+
+def carregar_indice_pesquisa():
+    # Construído no arranque para a primeira pesquisa não pagar o carregamento; se a base de
+    # dados ainda não estiver disponível, é construído na primeira pesquisa
+    try:
+        with pool_conexoes_global.emprestar() as bd:
+            indice_trigramas_global.carregar(bd)
+    except Exception as erro:
+        consola.aviso(f"Índice de pesquisa não carregado no arranque: {erro}")
+
+def _executar_motor(endereco, porta, motor, reutilizar_porta=False, tarefas_periodicas=True):
+    executor_pedidos_global.iniciar()
+    carregar_indice_pesquisa()
+    if tarefas_periodicas:
+        registar_tarefas_periodicas()
+        agendador_tarefas_global.iniciar()
+    try:
+        match motor:
+            case 'asyncio':
+                _executar_motor_asyncio(endereco, porta, reutilizar_porta)
+            case _:
+                _executar_motor_threading(endereco, porta, reutilizar_porta)
+    finally:
+        agendador_tarefas_global.parar()
+        executor_pedidos_global.parar()
+        pool_conexoes_global.fechar()
+
+def _executar_motor_threading(endereco, porta, reutilizar_porta=False):
+    servidor = None
     try:
         # ThreadingTCPServer cria uma nova thread para cada ligação de cliente.
-        servidor = socketserver.ThreadingTCPServer((endereco, porta), GestorPedidosTCP)
+        novo_servidor = socketserver.ThreadingTCPServer((endereco, porta), GestorPedidosTCP, bind_and_activate=False)
         # Permite que o servidor reinicie e reutilize o mesmo endereço imediatamente.
-        servidor.allow_reuse_address = True
+        # (Tem de ser definido antes do bind para ter efeito.)
+        novo_servidor.allow_reuse_address = True
+        # No modo multi-processo vários processos ligam-se à mesma porta.
+        novo_servidor.allow_reuse_port = reutilizar_porta
+        novo_servidor.controlo_encerramento = ControloEncerramento()
         # As threads dos clientes são marcadas como 'daemon' para que não impeçam
         # o programa principal de sair.
-        servidor.daemon_threads = True
+        novo_servidor.daemon_threads = True
+        try:
+            novo_servidor.server_bind()
+            novo_servidor.server_activate()
+        except Exception:
+            novo_servidor.server_close()
+            raise
+        servidor = novo_servidor
         
         print(f'{Cores.VERDE}Servidor online em {endereco}:{porta}{Cores.NORMAL}')
         print(f'{Cores.CIANO}Pressione Ctrl+C para encerrar.{Cores.NORMAL}')
@@ -363,23 +459,44 @@ def executar_servidor(endereco, porta, depuracao=False, dados_exemplo_bd=False,
         consola.limpar()
         print(f"{Cores.VERMELHO}{Cores.NEGRITO}Erro fatal: {e}{Cores.NORMAL}")
     finally:
-        if 'servidor' in locals() and servidor:
+        if servidor is not None:
             print(f"{Cores.AMARELO}A encerrar servidor...{Cores.NORMAL}")
-            # Sinaliza todas as threads para encerrarem
-            GestorPedidosTCP.servidor_encerrando = True
-            # Aguarda um pouco para threads detectarem a flag (select tem timeout de 1s)
-            time.sleep(1.5)
+            controlo_encerramento = servidor.controlo_encerramento
+            # Acorda todas as ligações: as paradas fecham logo, as ocupadas terminam o pedido atual
+            controlo_encerramento.sinalizar()
             servidor.shutdown()
             servidor.server_close()
-            # Reseta o flag para próxima execução
-            GestorPedidosTCP.servidor_encerrando = False
+
+            pedidos_pendentes = controlo_encerramento.aguardar_pedidos(ConfiguracaoServidor.ENCERRAMENTO_PRAZO_SEGUNDOS)
+            if pedidos_pendentes > 0:
+                consola.aviso(f"{pedidos_pendentes} pedido(s) não terminaram dentro do prazo de encerramento.")
+            controlo_encerramento.fechar()
             print(f"{Cores.VERDE}Servidor encerrado com sucesso.{Cores.NORMAL}")
 
-def iniciar(endereco=None, porta=None, depuracao=False, dados_exemplo_bd=False):
+def _executar_motor_asyncio(endereco, porta, reutilizar_porta=False):
+    try:
+        ServidorAsyncio(endereco, porta, reutilizar_porta).executar()
+    except KeyboardInterrupt:
+        consola.limpar()
+        print(f"{Cores.ROXO}Servidor encerrado manualmente.{Cores.NORMAL}")
+    except Exception as e:
+        consola.limpar()
+        print(f"{Cores.VERMELHO}{Cores.NEGRITO}Erro fatal: {e}{Cores.NORMAL}")
+    finally:
+        # Ao sair, asyncio.run() já cancelou as ligações abertas
+        print(f"{Cores.VERDE}Servidor encerrado com sucesso.{Cores.NORMAL}")
+
+def iniciar(endereco=None, porta=None, depuracao=False, dados_exemplo_bd=False, motor=None, processos=None):
     # Esconde avisos que podem ocorrer no shutdown do threading.
     warnings.filterwarnings("ignore", category=DeprecationWarning)
     
     host = endereco or ConfiguracaoServidor.ENDERECO_PADRAO
     port = porta or ConfiguracaoServidor.PORTA_PADRAO
+    motor = motor or ConfiguracaoServidor.MOTOR_PADRAO
+    processos = processos or ConfiguracaoServidor.PROCESSOS_TRABALHADORES
+
+    if motor not in ConfiguracaoServidor.MOTORES_DISPONIVEIS:
+        consola.erro(f"Motor '{motor}' desconhecido. Opções: {', '.join(ConfiguracaoServidor.MOTORES_DISPONIVEIS)}")
+        return
     
-    executar_servidor(host, port, depuracao, dados_exemplo_bd)
\ No newline at end of file
+    executar_servidor(host, port, depuracao, dados_exemplo_bd, motor=motor, processos=processos)
\ No newline at end of file
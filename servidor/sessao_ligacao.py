@@ -0,0 +1,30 @@
+import time
+from servidor.configuracao import ConfiguracaoServidor
+
+# Utilizador autenticado associado a uma ligação TCP. Depois da primeira validação do token,
+# os pedidos seguintes com o mesmo token não voltam a consultar as tabelas sessoes/utilizadores
+# até a associação expirar (fim da sessão ou SESSAO_LIGACAO_REVALIDAR_SEGUNDOS, o que vier primeiro)
+# ou até um comando que altera o utilizador a invalidar.
+class SessaoLigacao:
+    def __init__(self, endereco=None):
+        self.endereco = endereco  # IP do cliente, usado para limitar as falhas de autenticação
+        # (token, dados do utilizador, instante monotónico em que deixa de valer).
+        # É substituído de uma só vez, porque pedidos da mesma ligação podem correr em paralelo.
+        self._associacao = None
+
+    def obter(self, token):
+        associacao = self._associacao
+        if associacao is None:
+            return None
+
+        token_associado, dados_utilizador, valida_ate = associacao
+        if token_associado != token or time.monotonic() >= valida_ate:
+            return None
+        return dados_utilizador
+
+    def associar(self, token, dados_utilizador, segundos_restantes_sessao):
+        segundos = min(segundos_restantes_sessao, ConfiguracaoServidor.SESSAO_LIGACAO_REVALIDAR_SEGUNDOS)
+        self._associacao = (token, dados_utilizador, time.monotonic() + segundos)
+
+    def invalidar(self):
+        self._associacao = None
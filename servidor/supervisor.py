@@ -0,0 +1,105 @@
+import os
+import signal
+import socket
+import time
+from servidor.configuracao import ConfiguracaoServidor
+import consola
+
+def _sinal_para_keyboard_interrupt(numero_sinal, frame):
+    raise KeyboardInterrupt
+
+def _sinal_para_saida(numero_sinal, frame):
+    raise SystemExit(0)
+
+# Modo multi-processo: o supervisor cria N processos trabalhadores (fork), cada um com o seu
+# próprio servidor ligado à mesma porta com SO_REUSEPORT; o sistema operativo distribui as
+# ligações entre eles. O supervisor não atende clientes: reinicia trabalhadores que morram e
+# coordena o encerramento.
+class SupervisorProcessos:
+    def __init__(self, numero_processos, executar_trabalhador):
+        self.numero_processos = numero_processos
+        self.executar_trabalhador = executar_trabalhador  # Função chamada no processo filho com o índice do trabalhador
+        self._filhos = {}  # pid -> (índice, instante de arranque)
+
+    @staticmethod
+    def suportado():
+        return hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+    def _lancar(self, indice):
+        pid = os.fork()
+        if pid == 0:
+            # Processo filho: o Ctrl+C do terminal chega a todo o grupo de processos, por isso
+            # o filho ignora-o e espera pelo SIGTERM do supervisor para encerrar.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, _sinal_para_saida)
+            codigo_saida = 0
+            try:
+                self.executar_trabalhador(indice)
+            except SystemExit:
+                pass
+            except BaseException as erro:
+                consola.erro(f"Processo trabalhador {indice} terminou com erro: {erro}")
+                codigo_saida = 1
+            finally:
+                # os._exit evita que o filho execute o código de limpeza do supervisor
+                os._exit(codigo_saida)
+
+        self._filhos[pid] = (indice, time.monotonic())
+
+    def executar(self):
+        sinal_anterior = signal.signal(signal.SIGTERM, _sinal_para_keyboard_interrupt)
+        try:
+            for indice in range(self.numero_processos):
+                self._lancar(indice)
+            consola.sucesso(f"Supervisor ativo com {self.numero_processos} processos trabalhadores (pid {os.getpid()}).")
+
+            while len(self._filhos) > 0:
+                pid, estado = os.wait()
+                if pid not in self._filhos:
+                    continue
+
+                indice, instante_arranque = self._filhos.pop(pid)
+                consola.aviso(f"Processo trabalhador {indice} (pid {pid}) terminou (estado {estado}). A reiniciar...")
+
+                # Evita um ciclo de reinícios se o trabalhador morrer logo ao arrancar
+                tempo_vida = time.monotonic() - instante_arranque
+                if tempo_vida < ConfiguracaoServidor.PROCESSOS_ESPERA_REINICIO_SEGUNDOS:
+                    time.sleep(ConfiguracaoServidor.PROCESSOS_ESPERA_REINICIO_SEGUNDOS - tempo_vida)
+                self._lancar(indice)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._encerrar()
+            signal.signal(signal.SIGTERM, sinal_anterior)
+
+    def _encerrar(self):
+        if len(self._filhos) == 0:
+            return
+
+        consola.aviso(f"A encerrar {len(self._filhos)} processos trabalhadores...")
+        for pid in self._filhos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        limite = time.monotonic() + ConfiguracaoServidor.PROCESSOS_PRAZO_ENCERRAMENTO_SEGUNDOS
+        while len(self._filhos) > 0 and time.monotonic() < limite:
+            for pid in list(self._filhos):
+                try:
+                    pid_terminado, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    pid_terminado = pid
+                if pid_terminado != 0:
+                    self._filhos.pop(pid, None)
+            time.sleep(0.05)
+
+        # Quem não terminou dentro do prazo é terminado à força
+        for pid in list(self._filhos):
+            consola.aviso(f"Processo trabalhador (pid {pid}) não terminou a tempo. A forçar...")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._filhos.pop(pid, None)
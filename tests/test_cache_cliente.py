@@ -0,0 +1,55 @@
+import unittest
+from cliente.rede_cliente import ClienteRede
+from cliente.sessao_cliente import Sessao
+
+class ServidorFalso:
+    # Responde a listar_lojas com as lojas que o cargo do utilizador autenticado pode ver
+    LOJAS_POR_TOKEN = {
+        'token_admin': [{'id': 1, 'nome': 'Loja A'}, {'id': 2, 'nome': 'Loja interna'}],
+        'token_cliente': [{'id': 1, 'nome': 'Loja A'}]
+    }
+
+    def __init__(self):
+        self.pedidos = []
+
+    def trocar_mensagem(self, acao, parametros=None):
+        self.pedidos.append((acao, dict(parametros or {})))
+        lojas = ServidorFalso.LOJAS_POR_TOKEN[parametros['token_sessao']]
+        return {'ok': True, 'resultado': lojas, 'versao': str(len(lojas))}
+
+class TestCacheClienteUtilizadores(unittest.TestCase):
+    def setUp(self):
+        self.sessao = Sessao.__new__(Sessao)
+        self.sessao.nome_utilizador = None
+        self.sessao.cargo = None
+        self.sessao.token_sessao = None
+        self.sessao.tokens_locais = {}
+        self.rede = ClienteRede('localhost', 0, sessao=self.sessao)
+        self.rede.conectado = True
+        self.servidor = ServidorFalso()
+        self.rede._trocar_mensagem = self.servidor.trocar_mensagem
+
+    def _listar_lojas(self):
+        return self.rede.enviar_comando('listar_lojas', self.sessao.obter_credenciais())
+
+    def test_outro_utilizador_nao_recebe_listagem_em_cache(self):
+        self.sessao.iniciar_sessao('admin', 'admin', 'token_admin')
+        self.assertEqual(len(self._listar_lojas()['resultado']), 2)
+
+        self.sessao.encerrar_sessao()
+        self.sessao.iniciar_sessao('cliente', 'cliente', 'token_cliente')
+        resposta = self._listar_lojas()
+
+        self.assertEqual(resposta['resultado'], [{'id': 1, 'nome': 'Loja A'}])
+        self.assertEqual(len(self.servidor.pedidos), 2)
+        # O pedido do segundo utilizador não é condicional à versão recebida pelo primeiro
+        self.assertNotIn('versao_conhecida', self.servidor.pedidos[1][1])
+
+    def test_mesmo_utilizador_usa_cache(self):
+        self.sessao.iniciar_sessao('cliente', 'cliente', 'token_cliente')
+        self._listar_lojas()
+        self._listar_lojas()
+        self.assertEqual(len(self.servidor.pedidos), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+from servidor.cache_sessoes import CacheSessoes
+from servidor.entidades import Sessao
+
+class RelogioFalso:
+    # Substitui o módulo time nos módulos testados: o tempo só avança quando o teste quer
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+class CursorFalso:
+    def __init__(self):
+        self.consultas = []
+
+    def execute(self, consulta, parametros=None):
+        self.consultas.append((consulta, parametros))
+
+class ConexaoFalsa:
+    def commit(self):
+        pass
+
+class BaseDadosFalsa:
+    def __init__(self):
+        self.cursor = CursorFalso()
+        self.conexao = ConexaoFalsa()
+
+def utilizador(id_utilizador):
+    return {'id': id_utilizador, 'nome_utilizador': f'utilizador{id_utilizador}', 'cargo': 'cliente', 'loja_id': None}
+
+class TestCacheSessoes(unittest.TestCase):
+    def setUp(self):
+        self.relogio = RelogioFalso()
+        patcher = mock.patch('servidor.cache_sessoes.time', self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = CacheSessoes(tamanho_maximo=2)
+
+    def test_entrada_expira_com_a_sessao(self):
+        self.cache.guardar('token', utilizador(1), 60)
+        self.relogio.avancar(59)
+        self.assertEqual(self.cache.obter('token'), (utilizador(1), 1))
+        self.relogio.avancar(1)
+        self.assertIsNone(self.cache.obter('token'))
+        self.assertEqual(self.cache.estatisticas()['entradas'], 0)
+
+    def test_ttl_maximo_limita_a_duracao(self):
+        cache = CacheSessoes(tamanho_maximo=2, ttl_maximo_segundos=10)
+        cache.guardar('token', utilizador(1), 3600)
+        self.relogio.avancar(10)
+        self.assertIsNone(cache.obter('token'))
+
+    def test_sai_a_entrada_menos_usada(self):
+        self.cache.guardar('a', utilizador(1), 60)
+        self.cache.guardar('b', utilizador(2), 60)
+        self.cache.obter('a')  # 'b' passa a ser a menos usada
+        self.cache.guardar('c', utilizador(3), 60)
+
+        self.assertIsNone(self.cache.obter('b'))
+        self.assertIsNotNone(self.cache.obter('a'))
+        self.assertIsNotNone(self.cache.obter('c'))
+
+    def test_remover_utilizador_remove_todos_os_seus_tokens(self):
+        self.cache.guardar('a', utilizador(1), 60)
+        self.cache.guardar('b', utilizador(1), 60)
+        self.cache.remover_utilizador(1)
+        self.assertIsNone(self.cache.obter('a'))
+        self.assertIsNone(self.cache.obter('b'))
+
+    def test_encerrar_sessao_remove_o_token_da_cache(self):
+        cache = CacheSessoes()
+        with mock.patch('servidor.entidades.cache_sessoes_global', cache):
+            cache.guardar('token', utilizador(1), 60)
+            sessao = Sessao(BaseDadosFalsa())
+            sessao.token = 'token'
+            sessao.encerrar()
+        self.assertIsNone(cache.obter('token'))
+        self.assertEqual(sessao.bd.cursor.consultas, [("DELETE FROM sessoes WHERE token = %s", ('token',))])
+
+if __name__ == '__main__':
+    unittest.main()
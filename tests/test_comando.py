@@ -0,0 +1,27 @@
+import unittest
+from servidor.comando import Comando
+
+class TestComandoExecutar(unittest.TestCase):
+    ARGUMENTOS = ('bd', 'utilizador', 'parametros', 'gestor', 'sessao')
+
+    def test_acao_recebe_apenas_os_argumentos_que_declara(self):
+        def acao(parametros, base_de_dados):
+            return parametros, base_de_dados
+        self.assertEqual(Comando('teste', acao).executar(*self.ARGUMENTOS), ('parametros', 'bd'))
+
+    def test_acao_sem_argumentos(self):
+        self.assertEqual(Comando('teste', lambda: 'ok').executar(*self.ARGUMENTOS), 'ok')
+
+    def test_acao_com_kwargs_recebe_todos(self):
+        def acao(**argumentos):
+            return argumentos
+        self.assertEqual(Comando('teste', acao).executar(*self.ARGUMENTOS), {
+            'base_de_dados': 'bd',
+            'utilizador_atual': 'utilizador',
+            'parametros': 'parametros',
+            'gestor_comandos': 'gestor',
+            'sessao_ligacao': 'sessao'
+        })
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import sqlite3
+import unittest
+from enums import Mensagem
+from servidor.entidades import Cliente, Reserva, Utilizador
+
+class CursorFalso:
+    # Regista as consultas e devolve, por ordem, os resultados preparados pelo teste
+    def __init__(self, resultados, rowcount=0):
+        self.resultados = list(resultados)
+        self.rowcount = rowcount
+        self.lastrowid = 77
+        self.consultas = []
+
+    def execute(self, consulta, parametros=None):
+        self.consultas.append((' '.join(consulta.split()), parametros))
+
+    def fetchall(self):
+        return self.resultados.pop(0)
+
+    def fetchone(self):
+        resultado = self.resultados.pop(0)
+        return resultado[0] if len(resultado) > 0 else None
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class BaseDadosFalsa:
+    def __init__(self, resultados, rowcount=0):
+        self.cursor = CursorFalso(resultados, rowcount)
+        self.conexao = ConexaoFalsa()
+        self.em_transacao = False
+
+def criar_cliente(bd):
+    return Utilizador.reconstruir(bd, {'id': 5, 'nome_utilizador': 'ana', 'cargo': 'cliente', 'loja_id': None})
+
+def para_sqlite(sql):
+    return sql.replace('%s', '?')
+
+class TestSqlEncomenda(unittest.TestCase):
+    # As consultas são executadas num SQLite em memória (com '?' em vez de '%s') para
+    # verificar que os marcadores e os parâmetros correspondem e o efeito é o esperado
+    def setUp(self):
+        self.sqlite = sqlite3.connect(':memory:')
+        self.sqlite.execute("CREATE TABLE produtos (id INTEGER PRIMARY KEY, stock INTEGER)")
+        self.sqlite.execute("CREATE TABLE itens_encomenda (encomenda_id INTEGER, produto_id INTEGER, quantidade INTEGER, preco_unitario REAL)")
+        self.sqlite.executemany("INSERT INTO produtos VALUES (?, ?)", [(1, 10), (2, 5), (3, 1)])
+
+    def _stock(self):
+        return dict(self.sqlite.execute("SELECT id, stock FROM produtos"))
+
+    def test_bloquear_produtos(self):
+        sql, parametros = Cliente._sql_bloquear_produtos([1, 2, 3])
+        self.assertIn("WHERE id IN (%s, %s, %s) ORDER BY id FOR UPDATE", sql)
+        self.assertEqual(parametros, (1, 2, 3))
+
+    def test_inserir_itens_num_so_insert(self):
+        sql, parametros = Cliente._sql_inserir_itens(77, [(1, 2, 1.5), (3, 1, 4.0)])
+        self.sqlite.execute(para_sqlite(sql), parametros)
+        self.assertEqual(
+            self.sqlite.execute("SELECT * FROM itens_encomenda ORDER BY produto_id").fetchall(),
+            [(77, 1, 2, 1.5), (77, 3, 1, 4.0)]
+        )
+
+    def test_retirar_stock_de_todos_os_produtos(self):
+        sql, parametros = Cliente._sql_retirar_stock([1, 2], {1: 3, 2: 5})
+        cursor = self.sqlite.execute(para_sqlite(sql), parametros)
+        self.assertEqual(cursor.rowcount, 2)
+        self.assertEqual(self._stock(), {1: 7, 2: 0, 3: 1})
+
+    def test_retirar_stock_nao_atualiza_produto_sem_stock(self):
+        # O rowcount menor que o número de produtos é o que faz a encomenda ser anulada
+        sql, parametros = Cliente._sql_retirar_stock([1, 3], {1: 3, 3: 2})
+        cursor = self.sqlite.execute(para_sqlite(sql), parametros)
+        self.assertEqual(cursor.rowcount, 1)
+        self.assertEqual(self._stock()[3], 1)
+
+class TestRealizarEncomenda(unittest.TestCase):
+    PRODUTOS = [
+        {'id': 1, 'stock': 10, 'preco': 2.5, 'loja_id': 1},
+        {'id': 2, 'stock': 1, 'preco': 4.0, 'loja_id': 1}
+    ]
+
+    def _consultas(self, bd, inicio):
+        return [consulta for consulta, _ in bd.cursor.consultas if consulta.startswith(inicio)]
+
+    def test_encomenda_registada_com_um_numero_fixo_de_consultas(self):
+        bd = BaseDadosFalsa([self.PRODUTOS], rowcount=2)
+        resultado = criar_cliente(bd).realizar_encomenda({'2': 1, '1': 4})
+
+        self.assertEqual(resultado, (Mensagem.PENDENTE, {'id_encomenda': 77, 'preco_total': 14.0}))
+        self.assertEqual(len(bd.cursor.consultas), 4)
+        self.assertEqual(bd.cursor.consultas[0][1], (1, 2))  # Bloqueados por ordem de id
+        self.assertEqual(bd.conexao.commits, 1)
+
+    def test_stock_insuficiente_anula_a_encomenda_inteira(self):
+        bd = BaseDadosFalsa([self.PRODUTOS])
+        resultado = criar_cliente(bd).realizar_encomenda({'1': 1, '2': 2})
+
+        self.assertEqual(resultado, Mensagem.STOCK_INSUFICIENTE)
+        self.assertEqual(self._consultas(bd, 'INSERT'), [])
+        self.assertEqual(self._consultas(bd, 'UPDATE'), [])
+        self.assertEqual((bd.conexao.commits, bd.conexao.rollbacks), (0, 1))
+
+    def test_update_incompleto_anula_a_encomenda(self):
+        # O stock mudou entre a leitura e o UPDATE: só uma das linhas foi atualizada
+        bd = BaseDadosFalsa([self.PRODUTOS], rowcount=1)
+        resultado = criar_cliente(bd).realizar_encomenda({'1': 1, '2': 1})
+
+        self.assertEqual(resultado, Mensagem.STOCK_INSUFICIENTE)
+        self.assertEqual((bd.conexao.commits, bd.conexao.rollbacks), (0, 1))
+
+    def test_produtos_de_lojas_diferentes(self):
+        produtos = [dict(self.PRODUTOS[0]), dict(self.PRODUTOS[1], loja_id=2)]
+        bd = BaseDadosFalsa([produtos])
+        self.assertEqual(criar_cliente(bd).realizar_encomenda({'1': 1, '2': 1}), Mensagem.ERRO_PROCESSAMENTO)
+        self.assertEqual(self._consultas(bd, 'INSERT'), [])
+
+    def test_produto_inexistente(self):
+        bd = BaseDadosFalsa([self.PRODUTOS[:1]])
+        self.assertEqual(criar_cliente(bd).realizar_encomenda({'1': 1, '9': 1}), Mensagem.PRODUTO_NAO_ENCONTRADO)
+        self.assertEqual(bd.conexao.rollbacks, 1)
+
+class TestFinalizarCarrinho(unittest.TestCase):
+    def _reserva(self, id_reserva, id_produto, expirada=0, loja_id=1):
+        return {'id': id_reserva, 'produto_id': id_produto, 'quantidade': 2, 'preco': 3.0, 'loja_id': loja_id, 'expirada': expirada}
+
+    def test_carrinho_com_reserva_expirada_e_recusado_por_inteiro(self):
+        bd = BaseDadosFalsa([[self._reserva(10, 1), self._reserva(11, 2, expirada=1), self._reserva(12, 3)]])
+        resultado = criar_cliente(bd).finalizar_carrinho()
+
+        self.assertEqual(resultado, Mensagem.RESERVAS_EXPIRADAS)
+        consultas = bd.cursor.consultas
+        # Nenhuma encomenda é criada e só a reserva expirada é devolvida ao stock e apagada
+        self.assertFalse(any(consulta.startswith('INSERT') for consulta, _ in consultas))
+        self.assertTrue(consultas[1][0].startswith('UPDATE produtos p JOIN'))
+        self.assertEqual(consultas[1][1], (11,))
+        self.assertEqual(consultas[2], ("DELETE FROM reservas WHERE id IN (%s)", (11,)))
+        self.assertEqual(len(consultas), 3)
+        self.assertEqual(bd.conexao.commits, 1)
+
+    def test_carrinho_valido_e_convertido_numa_encomenda(self):
+        bd = BaseDadosFalsa([[self._reserva(10, 1), self._reserva(12, 3)]])
+        resultado = criar_cliente(bd).finalizar_carrinho()
+
+        self.assertEqual(resultado, (Mensagem.PENDENTE, {'id_encomenda': 77, 'preco_total': 12.0}))
+        self.assertEqual(bd.cursor.consultas[2][1], (77, 1, 2, 3.0, 77, 3, 2, 3.0))
+        self.assertEqual(bd.cursor.consultas[3][1], (5, 1, 3))  # Apaga as reservas convertidas
+        self.assertEqual(bd.conexao.commits, 1)
+
+    def test_carrinho_vazio(self):
+        bd = BaseDadosFalsa([[]])
+        self.assertEqual(criar_cliente(bd).finalizar_carrinho(), Mensagem.CARRINHO_VAZIO)
+        self.assertEqual(bd.conexao.commits, 0)
+
+    def test_reservas_de_lojas_diferentes(self):
+        bd = BaseDadosFalsa([[self._reserva(10, 1), self._reserva(12, 3, loja_id=2)]])
+        self.assertEqual(criar_cliente(bd).finalizar_carrinho(), Mensagem.ERRO_PROCESSAMENTO)
+        self.assertFalse(any(consulta.startswith('INSERT') for consulta, _ in bd.cursor.consultas))
+        self.assertEqual((bd.conexao.commits, bd.conexao.rollbacks), (0, 1))
+
+class TestRemoverReservasExpiradas(unittest.TestCase):
+    def test_devolve_em_lotes_ate_faltar_um_lote_completo(self):
+        bd = BaseDadosFalsa([[{'id': 1}, {'id': 2}], [{'id': 3}]])
+        self.assertEqual(Reserva.remover_expiradas(bd, tamanho_lote=2), 3)
+
+        devolvidas = [parametros for consulta, parametros in bd.cursor.consultas if consulta.startswith('DELETE')]
+        self.assertEqual(devolvidas, [(1, 2), (3,)])
+        self.assertEqual(bd.conexao.commits, 2)  # Um commit por lote
+
+    def test_sem_reservas_expiradas(self):
+        bd = BaseDadosFalsa([[]])
+        self.assertEqual(Reserva.remover_expiradas(bd, tamanho_lote=2), 0)
+        self.assertEqual(len(bd.cursor.consultas), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from servidor.indice_prefixos import IndicePrefixos
+
+class CursorFalso:
+    def __init__(self, linhas):
+        self.linhas = linhas
+        self.consultas = 0
+
+    def execute(self, consulta, parametros=None):
+        self.consultas += 1
+
+    def fetchall(self):
+        return list(self.linhas)
+
+class BaseDadosFalsa:
+    # Só o necessário para IndicePrefixos._carregar: um cursor com as linhas da tabela
+    def __init__(self, valores):
+        self.cursor = CursorFalso([{'valor': valor} for valor in valores])
+
+class TestIndicePrefixos(unittest.TestCase):
+    def setUp(self):
+        self.bd = BaseDadosFalsa(['Arroz', 'Açúcar', 'Azeite', 'Água', 'Bolacha', 'Açúcar mascavado'])
+        self.indice = IndicePrefixos('nomes_produtos', 'nome')
+
+    def test_normalizar_ignora_maiusculas_acentos_e_espacos(self):
+        self.assertEqual(IndicePrefixos.normalizar('  AÇÚCAR '), 'acucar')
+
+    def test_sugere_por_prefixo_ordenado_pelo_valor_normalizado(self):
+        self.assertEqual(self.indice.sugerir(self.bd, 'a', 10), ['Açúcar', 'Açúcar mascavado', 'Água', 'Arroz', 'Azeite'])
+
+    def test_prefixo_sem_acentos_encontra_valor_acentuado(self):
+        self.assertEqual(self.indice.sugerir(self.bd, 'ACU', 10), ['Açúcar', 'Açúcar mascavado'])
+
+    def test_correspondencia_exata_aparece_primeiro(self):
+        self.bd = BaseDadosFalsa(['Sal grosso', 'Sal'])
+        self.assertEqual(self.indice.sugerir(self.bd, 'sal', 10), ['Sal', 'Sal grosso'])
+
+    def test_limite_de_sugestoes(self):
+        self.assertEqual(len(self.indice.sugerir(self.bd, 'a', 2)), 2)
+
+    def test_prefixo_sem_correspondencias(self):
+        self.assertEqual(self.indice.sugerir(self.bd, 'x', 10), [])
+        # O prefixo vazio devolve todos os valores (até ao limite)
+        self.assertEqual(len(self.indice.sugerir(self.bd, '', 10)), 6)
+
+    def test_carrega_uma_so_vez(self):
+        self.indice.sugerir(self.bd, 'a', 10)
+        self.indice.sugerir(self.bd, 'b', 10)
+        self.assertEqual(self.bd.cursor.consultas, 1)
+
+    def test_adicionar_depois_de_carregado(self):
+        self.indice.sugerir(self.bd, 'a', 10)
+        self.indice.adicionar('Aveia')
+        self.indice.adicionar('Aveia')  # Valores repetidos não são duplicados
+        self.assertEqual(self.indice.sugerir(self.bd, 'av', 10), ['Aveia'])
+        self.assertEqual(self.indice.estatisticas(), {'valores': 7, 'carregado': True})
+
+    def test_adicionar_antes_de_carregar_espera_pelo_carregamento(self):
+        self.indice.adicionar('Aveia')
+        self.assertEqual(self.indice.estatisticas(), {'valores': 0, 'carregado': False})
+        # O valor ainda não está na "tabela" falsa: só aparece se vier no carregamento
+        self.assertEqual(self.indice.sugerir(self.bd, 'av', 10), [])
+
+    def test_invalidar_volta_a_carregar(self):
+        self.indice.sugerir(self.bd, 'a', 10)
+        self.indice.invalidar()
+        self.indice.sugerir(self.bd, 'a', 10)
+        self.assertEqual(self.bd.cursor.consultas, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from servidor.indice_trigramas import IndiceTrigramas
+
+class CursorFalso:
+    def __init__(self, linhas):
+        self.linhas = linhas
+        self.consultas = 0
+
+    def execute(self, consulta, parametros=None):
+        self.consultas += 1
+
+    def fetchall(self):
+        return list(self.linhas)
+
+class BaseDadosFalsa:
+    # Só o necessário para IndiceTrigramas.carregar: um cursor com (id, nome) da tabela
+    def __init__(self, nomes):
+        self.cursor = CursorFalso([{'id': id_nome, 'valor': nome} for id_nome, nome in nomes.items()])
+
+class TestIndiceTrigramas(unittest.TestCase):
+    def setUp(self):
+        self.bd = BaseDadosFalsa({
+            1: 'Leite',
+            2: 'Leite meio-gordo',
+            3: 'Doce de leite',
+            4: 'Chocoleite',
+            5: 'Pão',
+            6: 'Açúcar'
+        })
+        self.indice = IndiceTrigramas('nomes_produtos', 'nome')
+
+    def _ids(self, termo):
+        return [id_nome for id_nome, _ in self.indice.procurar(self.bd, termo)]
+
+    def test_trigramas(self):
+        self.assertEqual(IndiceTrigramas.trigramas('leite'), {'lei', 'eit', 'ite'})
+        self.assertEqual(IndiceTrigramas.trigramas('pa'), set())
+
+    def test_encontra_termo_em_qualquer_posicao_por_relevancia(self):
+        # Igual ao termo, começado pelo termo, palavra começada pelo termo, resto
+        self.assertEqual(self._ids('leite'), [1, 2, 3, 4])
+
+    def test_ignora_maiusculas_e_acentos(self):
+        self.assertEqual(self._ids('ACUCAR'), [6])
+        self.assertEqual(self._ids('pão'), [5])
+
+    def test_todos_os_trigramas_presentes_mas_sem_o_termo(self):
+        # 'leite' e 'meio' têm os trigramas, mas nenhum nome contém 'eitemei'
+        self.assertEqual(self._ids('eitemei'), [])
+
+    def test_trigrama_inexistente(self):
+        self.assertEqual(self._ids('xyz'), [])
+
+    def test_termo_com_menos_de_tres_caracteres_verifica_todos_os_nomes(self):
+        self.assertEqual(self._ids('pa'), [5])
+        self.assertEqual(self._ids('do'), [3, 2])
+
+    def test_adicionar_depois_de_carregado(self):
+        self.indice.procurar(self.bd, 'leite')
+        self.indice.adicionar(7, 'Leite de aveia')
+        self.assertEqual(self._ids('aveia'), [7])
+        self.assertEqual(self.bd.cursor.consultas, 1)
+
+    def test_invalidar_volta_a_carregar(self):
+        self.indice.procurar(self.bd, 'leite')
+        self.indice.invalidar()
+        self.indice.procurar(self.bd, 'leite')
+        self.assertEqual(self.bd.cursor.consultas, 2)
+
+if __name__ == '__main__':
+    unittest.main()
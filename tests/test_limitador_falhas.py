@@ -0,0 +1,137 @@
+import datetime
+import unittest
+from unittest import mock
+from enums import Mensagem
+from servidor.cache_sessoes import CacheSessoes
+from servidor.configuracao import ConfiguracaoServidor
+from servidor.entidades import Sessao
+from servidor.limitador_falhas import LimitadorFalhas
+
+class RelogioFalso:
+    # Substitui o módulo time nos módulos testados: o tempo só avança quando o teste quer
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+class CursorFalso:
+    def __init__(self, sessoes):
+        self.sessoes = sessoes  # token -> linha devolvida pela consulta do token
+        self.consultas = 0
+        self._resultado = None
+
+    def execute(self, consulta, parametros=None):
+        self.consultas += 1
+        linha = self.sessoes.get(parametros[0])
+        self._resultado = None if linha is None else dict(linha)
+
+    def fetchone(self):
+        return self._resultado
+
+class BaseDadosFalsa:
+    def __init__(self, sessoes):
+        self.cursor = CursorFalso(sessoes)
+
+class TestLimitadorFalhas(unittest.TestCase):
+    def setUp(self):
+        self.relogio = RelogioFalso()
+        patcher = mock.patch('servidor.limitador_falhas.time', self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limitador = LimitadorFalhas(maximo_falhas=3, janela_segundos=60, maximo_entradas=100)
+
+    def _falhar(self, vezes, endereco=None, nome_utilizador=None):
+        for _ in range(vezes):
+            self.limitador.registar_falha(endereco=endereco, nome_utilizador=nome_utilizador)
+
+    def test_bloqueia_ao_atingir_o_maximo(self):
+        self._falhar(2, endereco='10.0.0.1')
+        self.assertFalse(self.limitador.bloqueado(endereco='10.0.0.1'))
+        self._falhar(1, endereco='10.0.0.1')
+        self.assertTrue(self.limitador.bloqueado(endereco='10.0.0.1'))
+        # Outros endereços não são afetados
+        self.assertFalse(self.limitador.bloqueado(endereco='10.0.0.2'))
+
+    def test_bloqueio_termina_com_a_janela(self):
+        self._falhar(3, endereco='10.0.0.1')
+        self.relogio.avancar(59)
+        self.assertTrue(self.limitador.bloqueado(endereco='10.0.0.1'))
+        self.relogio.avancar(1)
+        self.assertFalse(self.limitador.bloqueado(endereco='10.0.0.1'))
+
+    def test_janela_conta_desde_a_primeira_falha(self):
+        self._falhar(2, endereco='10.0.0.1')
+        self.relogio.avancar(60)
+        self._falhar(2, endereco='10.0.0.1')
+        self.assertFalse(self.limitador.bloqueado(endereco='10.0.0.1'))
+
+    def test_bloqueio_por_utilizador_e_sucesso(self):
+        self._falhar(3, endereco='10.0.0.1', nome_utilizador='ana')
+        # O utilizador fica bloqueado a partir de qualquer endereço
+        self.assertTrue(self.limitador.bloqueado(endereco='10.0.0.9', nome_utilizador='ana'))
+        self.limitador.registar_sucesso('ana')
+        self.assertFalse(self.limitador.bloqueado(nome_utilizador='ana'))
+        # O sucesso não desbloqueia o endereço
+        self.assertTrue(self.limitador.bloqueado(endereco='10.0.0.1'))
+
+    def test_limite_de_entradas_esquece_as_mais_antigas(self):
+        limitador = LimitadorFalhas(maximo_falhas=1, janela_segundos=60, maximo_entradas=2)
+        for endereco in ('a', 'b', 'c'):
+            limitador.registar_falha(endereco=endereco)
+        self.assertFalse(limitador.bloqueado(endereco='a'))
+        self.assertTrue(limitador.bloqueado(endereco='c'))
+
+class TestResolverTokenBloqueado(unittest.TestCase):
+    ENDERECO = '10.0.0.1'
+
+    def setUp(self):
+        self.relogio = RelogioFalso()
+        self.cache = CacheSessoes()
+        self.limitador = LimitadorFalhas(maximo_falhas=3, janela_segundos=60, maximo_entradas=100)
+        for alvo, valor in (
+            ('servidor.cache_sessoes.time', self.relogio),
+            ('servidor.limitador_falhas.time', self.relogio),
+            ('servidor.entidades.cache_sessoes_global', self.cache),
+            ('servidor.entidades.limitador_falhas_global', self.limitador)
+        ):
+            patcher = mock.patch(alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.bd = BaseDadosFalsa({
+            'valido': {'id': 1, 'nome_utilizador': 'ana', 'cargo': 'cliente', 'loja_id': None, 'data_criacao': datetime.datetime.now()}
+        })
+
+    def _bloquear_endereco(self):
+        for numero in range(3):
+            self.assertIsNone(Sessao.resolver_token(self.bd, f'invalido{numero}', self.ENDERECO))
+        self.assertTrue(self.limitador.bloqueado(endereco=self.ENDERECO))
+
+    def test_token_invalido_de_endereco_bloqueado_e_recusado(self):
+        self._bloquear_endereco()
+        self.assertIs(Sessao.resolver_token(self.bd, 'outro', self.ENDERECO), Mensagem.DEMASIADAS_TENTATIVAS)
+        # Também os tokens já na cache negativa
+        self.assertIs(Sessao.resolver_token(self.bd, 'invalido0', self.ENDERECO), Mensagem.DEMASIADAS_TENTATIVAS)
+
+    def test_sessao_valida_passa_de_endereco_bloqueado(self):
+        self._bloquear_endereco()
+        dados_utilizador, segundos_restantes = Sessao.resolver_token(self.bd, 'valido', self.ENDERECO)
+        self.assertEqual(dados_utilizador['nome_utilizador'], 'ana')
+        self.assertGreater(segundos_restantes, 0)
+
+    def test_token_na_cache_negativa_nao_consulta_a_base_de_dados(self):
+        Sessao.resolver_token(self.bd, 'invalido', self.ENDERECO)
+        Sessao.resolver_token(self.bd, 'invalido', self.ENDERECO)
+        self.assertEqual(self.bd.cursor.consultas, 1)
+
+        # Passado o prazo da cache negativa o token volta a ser procurado
+        self.relogio.avancar(ConfiguracaoServidor.CACHE_TOKENS_INVALIDOS_SEGUNDOS)
+        Sessao.resolver_token(self.bd, 'invalido', self.ENDERECO)
+        self.assertEqual(self.bd.cursor.consultas, 2)
+
+if __name__ == '__main__':
+    unittest.main()
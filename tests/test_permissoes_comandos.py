@@ -0,0 +1,51 @@
+import unittest
+from types import SimpleNamespace
+from servidor.comandos import GestorComandos
+
+# As listas de cargos usadas pela verificação de permissões antes das máscaras de bits
+NIVEIS_PERMISSAO = {
+    'cliente': ['cliente', 'vendedor', 'admin'],
+    'vendedor': ['vendedor', 'admin'],
+    'admin': ['admin']
+}
+
+def permitido_pelas_listas(permissao_minima, utilizador):
+    if permissao_minima is None:
+        return True
+    if utilizador is None:
+        return False
+    return getattr(utilizador, 'cargo', None) in NIVEIS_PERMISSAO.get(permissao_minima, [])
+
+class TestPermissoesComandos(unittest.TestCase):
+    def setUp(self):
+        self.gestor = GestorComandos()
+        # Sem utilizador, cada cargo conhecido, um utilizador sem cargo e um cargo desconhecido
+        self.utilizadores = [None, SimpleNamespace(), SimpleNamespace(cargo='desconhecido')]
+        for cargo in GestorComandos.CARGOS:
+            self.utilizadores.append(SimpleNamespace(cargo=cargo))
+
+    def test_mascaras_correspondem_as_listas_de_cargos(self):
+        self.assertGreater(len(self.gestor.comandos), 0)
+        for comando in self.gestor.comandos.values():
+            for utilizador in self.utilizadores:
+                with self.subTest(comando=comando.nome, cargo=getattr(utilizador, 'cargo', None)):
+                    self.assertEqual(
+                        self.gestor.pode_executar(comando, utilizador),
+                        permitido_pelas_listas(comando.permissao_minima, utilizador)
+                    )
+
+    def test_comandos_por_cargo_correspondem_a_pode_executar(self):
+        for cargo in GestorComandos.CARGOS + ('desconhecido',):
+            utilizador = SimpleNamespace(cargo=cargo)
+            esperados = [comando for comando in self.gestor.comandos.values() if permitido_pelas_listas(comando.permissao_minima, utilizador)]
+            with self.subTest(cargo=cargo):
+                self.assertEqual(self.gestor.comandos_por_cargo(cargo), esperados)
+
+    def test_cada_cargo_tem_um_bit_proprio(self):
+        bits = list(GestorComandos.BIT_CARGO.values())
+        self.assertEqual(len(set(bits)), len(bits))
+        for bit in bits:
+            self.assertEqual(bit & (bit - 1), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import socket
+import threading
+import time
+import unittest
+from cliente.rede_cliente import ClienteRede
+
+class ServidorLento:
+    # Responde a cada pedido com a própria ação; a ação 'lento' demora mais do que o timeout do cliente
+    ESPERA_LENTO_SEGUNDOS = 0.5
+
+    def __init__(self):
+        self.socket_escuta = socket.create_server(('127.0.0.1', 0))
+        self.porta = self.socket_escuta.getsockname()[1]
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    def _aceitar(self):
+        while True:
+            try:
+                ligacao, _ = self.socket_escuta.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._atender, args=(ligacao,), daemon=True).start()
+
+    def _atender(self, ligacao):
+        with ligacao, ligacao.makefile('rb') as leitor:
+            for linha in leitor:
+                acao = json.loads(linha)['acao']
+                if acao == 'lento':
+                    time.sleep(ServidorLento.ESPERA_LENTO_SEGUNDOS)
+                try:
+                    ligacao.sendall((json.dumps({'ok': True, 'resultado': acao}) + '\n').encode('utf-8'))
+                except OSError:
+                    return
+
+    def fechar(self):
+        self.socket_escuta.close()
+
+class TestTempoEsgotado(unittest.TestCase):
+    def setUp(self):
+        self.servidor = ServidorLento()
+        self.rede = ClienteRede('127.0.0.1', self.servidor.porta)
+        self.rede.timeout = 0.2
+        self.assertTrue(self.rede.conectar())
+
+    def tearDown(self):
+        self.rede.desconectar()
+        self.servidor.fechar()
+
+    def test_resposta_atrasada_nao_e_entregue_ao_pedido_seguinte(self):
+        resposta = self.rede.enviar_comando('lento')
+        self.assertTrue(resposta.get('tempo_esgotado'))
+
+        time.sleep(ServidorLento.ESPERA_LENTO_SEGUNDOS)
+        self.assertEqual(self.rede.enviar_comando('rapido')['resultado'], 'rapido')
+
+    def test_resposta_atrasada_nao_e_entregue_a_pedidos_com_id(self):
+        ids = self.rede.enviar_pedidos([('lento', None)])
+        self.assertTrue(self.rede.recolher_respostas(ids)[ids[0]].get('tempo_esgotado'))
+
+        time.sleep(ServidorLento.ESPERA_LENTO_SEGUNDOS)
+        self.assertEqual(self.rede.enviar_comandos([('rapido', None)])[0]['resultado'], 'rapido')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import socket
+import threading
+import time
+import unittest
+from servidor.servidor import GestorPedidosTCP
+
+class TestEnvioParaClienteQueNaoLe(unittest.TestCase):
+    def setUp(self):
+        self.servidor, self.cliente = socket.socketpair()
+        self.servidor.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        self.cliente.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.servidor.settimeout(0.2)  # O prazo que setup() aplica com ENVIO_PRAZO_SEGUNDOS
+        self.addCleanup(self.servidor.close)
+        self.addCleanup(self.cliente.close)
+
+        self.gestor = GestorPedidosTCP.__new__(GestorPedidosTCP)
+        self.gestor.request = self.servidor
+        self.gestor.client_address = ('127.0.0.1', 0)
+        self.gestor.lock_envio = threading.Lock()
+
+    def test_envio_bloqueado_termina_e_fecha_a_ligacao(self):
+        pacote = {'ok': True, 'resultado': 'x' * (4 * 1024 * 1024)}
+        inicio = time.monotonic()
+        self.gestor._enviar_pacote(pacote)
+        self.assertLess(time.monotonic() - inicio, 5)
+
+        # A ligação foi fechada: novos envios falham logo e o cliente recebe o fim da ligação
+        with self.assertRaises(OSError):
+            self.servidor.sendall(b'{}\n')
+        self.cliente.settimeout(5)
+        while self.cliente.recv(65536):
+            pass
+
+if __name__ == '__main__':
+    unittest.main()